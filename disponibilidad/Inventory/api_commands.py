@@ -6,9 +6,15 @@ from base import (
     Resource, request, q
 )
 
-from updater import process_reservation
-from datetime import datetime
-from heartbeat import start_heartbeat
+from reservation_consumer import apply_command, enqueue_reservation, new_command
+from updater import upsert_inventory
+from inventory_cache import invalidate_range
+from inventory_feed import next_version, publish_changes
+from reservation_status import RESERVATION_COMMANDS, mark_pending
+from datetime import datetime, timedelta
+import os
+from heartbeat import SERVICE_ID, start_heartbeat
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 
 class HotelResource(Resource):
@@ -74,32 +80,139 @@ class InventoryResource(Resource):
         )
 
         db.session.add(inventory)
+        db.session.flush()
+        version = next_version()
         db.session.commit()
 
+        invalidate_range(inventory.room_type_id, inventory.rate_plan_id,
+                         inventory.date, inventory.date + timedelta(days=1))
+        publish_changes(inventory.room_type_id, inventory.rate_plan_id, version,
+                        {inventory.date: inventory.available_quantity})
+
         return inventory_item_schema.dump(inventory), 201
 
 
+# Tope de noches por carga masiva (10 años).
+MAX_BULK_DAYS = 3660
+
+
+def _bulk_quantity(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError("quantity must be a non-negative integer")
+    return value
+
+
+def _bulk_days(data):
+    # Acepta {"days": [{"date", "quantity"}, ...]} o un rango
+    # {"start_date", "end_date", "quantity"} con salida exclusiva.
+    if "days" in data:
+        return [
+            (datetime.strptime(day["date"], "%Y-%m-%d").date(),
+             _bulk_quantity(day["quantity"]))
+            for day in data["days"]
+        ]
+
+    start = datetime.strptime(data["start_date"], "%Y-%m-%d").date()
+    end = datetime.strptime(data["end_date"], "%Y-%m-%d").date()
+    quantity = _bulk_quantity(data["quantity"])
+
+    if end <= start:
+        raise ValueError("end_date must be after start_date")
+
+    return [(start + timedelta(days=i), quantity) for i in range((end - start).days)]
+
+
+def _bulk_target_error(room_type_id, rate_plan_id):
+    # Se valida antes de la carga: una FK inexistente fallaría recién en el
+    # INSERT, con la transacción ya abierta.
+    for name, value in (("room_type_id", room_type_id), ("rate_plan_id", rate_plan_id)):
+        if isinstance(value, bool) or not isinstance(value, int):
+            return {"error": f"{name} must be an integer"}, 400
+
+    rate_plan = db.session.get(RatePlan, rate_plan_id)
+    if rate_plan is not None and rate_plan.room_type_id == room_type_id:
+        return None
+    if db.session.get(RoomType, room_type_id) is None:
+        return {"error": "Unknown room type"}, 404
+    if rate_plan is None:
+        return {"error": "Unknown rate plan"}, 404
+    return {"error": "Rate plan does not belong to room type"}, 400
+
+
+class InventoryBulkResource(Resource):
+
+    def post(self):
+
+        data = request.json or {}
+        room_type_id = data.get("room_type_id")
+        rate_plan_id = data.get("rate_plan_id")
+
+        if not room_type_id or not rate_plan_id:
+            return {"error": "Missing parameters"}, 400
+
+        error = _bulk_target_error(room_type_id, rate_plan_id)
+        if error is not None:
+            return error
+
+        try:
+            days = _bulk_days(data)
+        except KeyError as exc:
+            return {"error": f"Missing parameter: {exc.args[0]}"}, 400
+        except (TypeError, ValueError) as exc:
+            return {"error": str(exc)}, 400
+
+        if not days:
+            return {"error": "Empty calendar"}, 400
+        if len(days) > MAX_BULK_DAYS:
+            return {"error": f"At most {MAX_BULK_DAYS} days per request"}, 400
+
+        counts = upsert_inventory(room_type_id, rate_plan_id, days)
+
+        return {"room_type_id": room_type_id, "rate_plan_id": rate_plan_id, **counts}, 200
+
+
+# "batch": cola de comandos que aplica reservation_consumer.py en lotes.
+# "rq": un job de RQ por reserva.
+RESERVATION_MODE = os.getenv("RESERVATION_MODE", "batch")
+
+RESERVATION_FIELDS = ("room_type_id", "rate_plan_id", "start_date", "end_date")
+
+
 class ReservationResource(Resource):
 
     def post(self):
 
-        data = request.json
+        data = request.json or {}
+
+        if not all(data.get(field) for field in RESERVATION_FIELDS):
+            return {"error": "Missing parameters"}, 400
+
+        if RESERVATION_MODE == "rq":
+            command = new_command(data)
+            mark_pending(q.connection, command)
+            q.enqueue(apply_command, command, job_id=command["command_id"])
+        else:
+            command = enqueue_reservation(q.connection, data)
+
+        RESERVATION_COMMANDS.labels(SERVICE_ID).inc()
+
+        return {
+            "message": "Reservation processing",
+            "command_id": command["command_id"],
+            "status_url": f"/api-queries/reservations/{command['command_id']}"
+        }, 202
 
-        q.enqueue(
-            process_reservation,
-            data['room_type_id'],
-            data['rate_plan_id'],
-            data['start_date'],
-            data['end_date']
-        )
 
-        return {"message": "Reservation processing"}, 202
+@app.route("/metrics")
+def metrics():
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
 
 api.add_resource(HotelResource, '/api-commands/hotels')
 api.add_resource(RoomTypeResource, '/api-commands/room-types')
 api.add_resource(RatePlanResource, '/api-commands/rate-plans')
 api.add_resource(InventoryResource, '/api-commands/inventory')
+api.add_resource(InventoryBulkResource, '/api-commands/inventory/bulk')
 api.add_resource(ReservationResource, '/api-commands/reservations')
 
 
@@ -4,10 +4,15 @@ from base import (
     hotel_schema, room_type_schema,
     rate_plan_schema,
     inventory_item_schema, inventory_items_schema,
-    Resource, request
+    Resource, request, q
 )
-from heartbeat import start_heartbeat
-from datetime import datetime
+from heartbeat import SERVICE_ID, start_heartbeat
+from reservation_status import get_status
+from inventory_cache import RANGE_CACHE_REQUESTS, cached_range
+from availability_projection import AvailabilityProjection
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from datetime import datetime, timedelta
+import json
 
 
 class HotelListResource(Resource):
@@ -49,22 +54,125 @@ class InventoryByRangeResource(Resource):
         if not all([room_type_id, rate_plan_id, start_date, end_date]):
             return {"error": "Missing parameters"}, 400
 
-        start = datetime.strptime(start_date, "%Y-%m-%d").date()
-        end = datetime.strptime(end_date, "%Y-%m-%d").date()
-
-        inventory = (
-            InventoryItem.query
-            .filter(
-                InventoryItem.room_type_id == room_type_id,
-                InventoryItem.rate_plan_id == rate_plan_id,
-                InventoryItem.date >= start,
-                InventoryItem.date < end
+        try:
+            # Ids normalizados: "01" y "1" comparten entrada de cache.
+            room_type_id = int(room_type_id)
+            rate_plan_id = int(rate_plan_id)
+            start = datetime.strptime(start_date, "%Y-%m-%d").date()
+            end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        except ValueError:
+            return {"error": "Invalid parameters"}, 400
+
+        def load():
+            inventory = (
+                InventoryItem.query
+                .filter(
+                    InventoryItem.room_type_id == room_type_id,
+                    InventoryItem.rate_plan_id == rate_plan_id,
+                    InventoryItem.date >= start,
+                    InventoryItem.date < end
+                )
+                .order_by(InventoryItem.date)
+                .all()
             )
-            .order_by(InventoryItem.date)
-            .all()
+            return json.dumps(inventory_items_schema.dump(inventory))
+
+        result, etag, body = cached_range(
+            room_type_id, rate_plan_id, start, end, request.if_none_match, load
         )
+        RANGE_CACHE_REQUESTS.labels(SERVICE_ID, result).inc()
+
+        response = app.response_class(body, status=304 if body is None else 200,
+                                      mimetype="application/json")
+        if etag is not None:
+            response.headers["ETag"] = etag
+            # El cliente puede guardar la respuesta pero debe revalidarla.
+            response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Cache"] = result
+
+        return response
+
+
+projection = AvailabilityProjection()
+
+
+def _availability_ids():
+    return int(request.args["room_type_id"]), int(request.args["rate_plan_id"])
+
+
+class AvailabilityMinResource(Resource):
+
+    def get(self):
+
+        try:
+            room_type_id, rate_plan_id = _availability_ids()
+            start = datetime.strptime(request.args["start_date"], "%Y-%m-%d").date()
+            end = datetime.strptime(request.args["end_date"], "%Y-%m-%d").date()
+        except KeyError:
+            return {"error": "Missing parameters"}, 400
+        except ValueError:
+            return {"error": "Invalid parameters"}, 400
+
+        if end <= start:
+            return {"error": "end_date must be after start_date"}, 400
+        if not projection.ready:
+            return {"error": "Availability projection loading"}, 503
+
+        minimum, missing = projection.min_available(room_type_id, rate_plan_id, start, end)
+
+        return {
+            "room_type_id": room_type_id,
+            "rate_plan_id": rate_plan_id,
+            "start_date": str(start),
+            "end_date": str(end),
+            "min_available": minimum,
+            "missing_nights": missing
+        }
+
+
+class AvailabilityCalendarResource(Resource):
+
+    def get(self):
+
+        try:
+            room_type_id, rate_plan_id = _availability_ids()
+            start = datetime.strptime(request.args["month"], "%Y-%m").date()
+        except KeyError:
+            return {"error": "Missing parameters"}, 400
+        except ValueError:
+            return {"error": "Invalid parameters"}, 400
+
+        if not projection.ready:
+            return {"error": "Availability projection loading"}, 503
+
+        end = (start + timedelta(days=32)).replace(day=1)
+
+        return {
+            "room_type_id": room_type_id,
+            "rate_plan_id": rate_plan_id,
+            "month": start.strftime("%Y-%m"),
+            "start_date": str(start),
+            # Un saldo por noche del mes; null si no hay inventario cargado.
+            "available": projection.calendar(room_type_id, rate_plan_id, start, end)
+        }
+
+
+class ReservationStatusResource(Resource):
+
+    def get(self, command_id):
+        # pending hasta que el consumidor la aplica; luego applied, rejected
+        # (con motivo y fechas) o failed.
+        status = get_status(q.connection, command_id)
+
+        if status is None:
+            return {"error": "Unknown reservation"}, 404
+
+        return status
+
 
-        return inventory_items_schema.dump(inventory)
+@app.route("/metrics")
+def metrics():
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
 
 api.add_resource(HotelListResource, '/api-queries/hotels')
@@ -74,8 +182,15 @@ api.add_resource(RatePlanByRoomTypeResource,
                  '/api-queries/room-types/<int:room_type_id>/rate-plans')
 api.add_resource(InventoryByRangeResource,
                  '/api-queries/inventory')
+api.add_resource(AvailabilityMinResource,
+                 '/api-queries/availability/min')
+api.add_resource(AvailabilityCalendarResource,
+                 '/api-queries/availability/calendar')
+api.add_resource(ReservationStatusResource,
+                 '/api-queries/reservations/<string:command_id>')
 
 
 if __name__ == '__main__':
     start_heartbeat()
+    projection.start()
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
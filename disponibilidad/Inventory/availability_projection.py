@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from itertools import groupby
+
+import numpy as np
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+
+from base import app, db, q, InventoryItem
+from inventory_feed import FEED_CHANNEL
+
+
+# Cada cuánto se recarga todo desde Postgres para corregir mensajes perdidos.
+RESYNC_SECONDS = int(os.getenv("INVENTORY_PROJECTION_RESYNC_SECONDS", "300"))
+RETRY_SECONDS = 1.0
+
+# Noche sin fila en inventory_item: no se puede reservar.
+MISSING = -1
+
+
+class Calendar:
+    # Disponibilidad de un room type y rate plan: `quantities[i]` es el saldo
+    # de la noche `origin + i` y `versions[i]` la versión del feed que lo
+    # escribió (0 si viene de la carga completa).
+
+    def __init__(self, origin, quantities):
+        self.origin = origin
+        self.quantities = quantities
+        self.versions = np.zeros(len(quantities), dtype=np.int64)
+
+    def _offset(self, night):
+        return (night - self.origin).days
+
+    def extend(self, first, last):
+        # Agranda los arreglos para cubrir las noches [first, last].
+        end = self.origin + timedelta(days=len(self.quantities))
+        start = min(first, self.origin)
+        end = max(last + timedelta(days=1), end)
+        size = (end - start).days
+        if start == self.origin and size == len(self.quantities):
+            return
+
+        shift = (self.origin - start).days
+        quantities = np.full(size, MISSING, dtype=np.int32)
+        versions = np.zeros(size, dtype=np.int64)
+        quantities[shift:shift + len(self.quantities)] = self.quantities
+        versions[shift:shift + len(self.versions)] = self.versions
+        self.origin, self.quantities, self.versions = start, quantities, versions
+
+    def apply(self, version, nights, quantities):
+        # Saldos absolutos: una noche solo cambia si el mensaje es más nuevo
+        # que lo que ya tiene, así un mensaje atrasado no pisa uno posterior.
+        self.extend(min(nights), max(nights))
+        offsets = np.fromiter((self._offset(night) for night in nights),
+                              dtype=np.int64, count=len(nights))
+        newer = self.versions[offsets] < version
+        self.quantities[offsets[newer]] = quantities[newer]
+        self.versions[offsets[newer]] = version
+
+    def window(self, start, end):
+        # Saldos de [start, end); vista sin copia si el rango está cargado.
+        low = self._offset(start)
+        high = self._offset(end)
+        if low >= 0 and high <= len(self.quantities):
+            return self.quantities[low:high]
+
+        values = np.full(high - low, MISSING, dtype=np.int32)
+        first = max(low, 0)
+        last = min(high, len(self.quantities))
+        if first < last:
+            values[first - low:last - low] = self.quantities[first:last]
+        return values
+
+
+class AvailabilityProjection:
+    # Proyección en memoria de inventory_item para las réplicas de consulta.
+    # Se carga completa con una consulta y se mantiene al día con el feed que
+    # publica el lado de comandos (inventory_feed.py).
+
+    def __init__(self, client=None, channel=FEED_CHANNEL, resync_seconds=RESYNC_SECONDS):
+        self.client = client if client is not None else q.connection
+        self.channel = channel
+        self.resync_seconds = resync_seconds
+        self.calendars = {}
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        with app.app_context():
+            rows = (
+                db.session.query(
+                    InventoryItem.room_type_id,
+                    InventoryItem.rate_plan_id,
+                    InventoryItem.date,
+                    InventoryItem.available_quantity
+                )
+                .order_by(
+                    InventoryItem.room_type_id,
+                    InventoryItem.rate_plan_id,
+                    InventoryItem.date
+                )
+                .all()
+            )
+
+        calendars = {}
+        for key, group in groupby(rows, key=lambda row: (row[0], row[1])):
+            group = list(group)
+            origin = group[0][2]
+            offsets = np.fromiter(((row[2] - origin).days for row in group),
+                                  dtype=np.int64, count=len(group))
+            quantities = np.full(offsets[-1] + 1, MISSING, dtype=np.int32)
+            quantities[offsets] = [row[3] for row in group]
+            calendars[key] = Calendar(origin, quantities)
+
+        with self._lock:
+            self.calendars = calendars
+            self.ready = True
+        return len(rows)
+
+    def apply(self, message):
+        key = (message["room_type_id"], message["rate_plan_id"])
+        days = message["days"]
+        if not days:
+            return
+        nights = [date.fromisoformat(night) for night in days]
+        quantities = np.fromiter(days.values(), dtype=np.int32, count=len(days))
+
+        with self._lock:
+            calendar = self.calendars.get(key)
+            if calendar is None:
+                calendar = Calendar(min(nights), np.empty(0, dtype=np.int32))
+                self.calendars[key] = calendar
+            calendar.apply(message["version"], nights, quantities)
+
+    def min_available(self, room_type_id, rate_plan_id, start, end):
+        # Retorna (mínimo, noches sin inventario) de [start, end); si falta
+        # alguna noche el mínimo es 0.
+        with self._lock:
+            calendar = self.calendars.get((room_type_id, rate_plan_id))
+            if calendar is None:
+                return 0, (end - start).days
+            values = calendar.window(start, end)
+            missing = int(np.count_nonzero(values == MISSING))
+            return (0 if missing else int(values.min())), missing
+
+    def calendar(self, room_type_id, rate_plan_id, start, end):
+        # Un saldo por noche de [start, end), None donde no hay inventario.
+        with self._lock:
+            calendar = self.calendars.get((room_type_id, rate_plan_id))
+            if calendar is None:
+                values = []
+            else:
+                values = calendar.window(start, end).tolist()
+        if not values:
+            return [None] * (end - start).days
+        return [None if value == MISSING else value for value in values]
+
+    def run(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Suscribirse antes de cargar: lo publicado durante la carga
+                # queda en el socket y se aplica después.
+                pubsub.subscribe(self.channel)
+                print(f"[Projection] {self.load()} noches cargadas")
+                resync_at = time.monotonic() + self.resync_seconds
+
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        try:
+                            self.apply(json.loads(message["data"]))
+                        except (KeyError, TypeError, ValueError) as exc:
+                            print(f"[Projection] mensaje inválido: {exc}")
+                    if time.monotonic() >= resync_at:
+                        self.load()
+                        resync_at = time.monotonic() + self.resync_seconds
+
+            except (RedisError, SQLAlchemyError) as exc:
+                # Se siguen sirviendo los saldos conocidos; al reconectar se
+                # recarga todo porque el feed no guarda lo publicado.
+                print(f"[Projection] {exc}; reintentando en {RETRY_SECONDS}s")
+                time.sleep(RETRY_SECONDS)
+            finally:
+                pubsub.close()
+
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import uuid
+from datetime import date, timedelta
+
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+
+from base import q
+
+
+CACHE_TTL_SECONDS = int(os.getenv("INVENTORY_CACHE_TTL_SECONDS", "300"))
+CACHE_PREFIX = "inventory_cache:"
+VERSION_PREFIX = "inventory_version:"
+# Identifica la "vida" de los contadores: si Redis se vacía y las versiones
+# vuelven a 0, cambia la época y un ETag viejo no puede coincidir por error.
+EPOCH_KEY = "inventory_cache_epoch"
+
+HIT = "hit"
+MISS = "miss"
+NOT_MODIFIED = "not_modified"
+BYPASS = "bypass"
+
+RANGE_CACHE_REQUESTS = Counter(
+    "inventory_range_cache_requests",
+    "Consultas de inventario por rango según el resultado del cache",
+    ["replica", "result"],
+)
+
+
+def _client():
+    return q.connection
+
+
+def _months(start, end):
+    # Meses ("YYYY-MM") que tocan las noches de [start, end).
+    months = []
+    current = date(start.year, start.month, 1)
+    while current < end:
+        months.append(f"{current.year:04d}-{current.month:02d}")
+        current = (current + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def version_key(room_type_id, rate_plan_id, month):
+    return f"{VERSION_PREFIX}{room_type_id}:{rate_plan_id}:{month}"
+
+
+def range_tag(room_type_id, rate_plan_id, start, end):
+    # Versión de un rango: época más la versión de cada mes que cubre. Solo
+    # requiere un MGET; cambia exactamente cuando una escritura toca alguno
+    # de esos meses para este room type y rate plan.
+    client = _client()
+    months = _months(start, end)
+    values = client.mget(
+        [EPOCH_KEY] + [version_key(room_type_id, rate_plan_id, month) for month in months]
+    )
+    epoch = values[0]
+    if epoch is None:
+        client.set(EPOCH_KEY, uuid.uuid4().hex, nx=True)
+        epoch = client.get(EPOCH_KEY)
+    versions = ",".join(
+        value.decode() if isinstance(value, bytes) else str(value or 0)
+        for value in values[1:]
+    )
+    epoch = epoch.decode() if isinstance(epoch, bytes) else str(epoch)
+    raw = f"{epoch}|{room_type_id}|{rate_plan_id}|{start}|{end}|{versions}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached_range(room_type_id, rate_plan_id, start, end, if_none_match, load):
+    # Read-through: retorna (resultado, etag, cuerpo JSON o None si es 304).
+    # `load()` consulta Postgres y retorna el cuerpo ya serializado; solo se
+    # llama en un miss. Si Redis no responde se sirve directo de Postgres.
+    try:
+        tag = range_tag(room_type_id, rate_plan_id, start, end)
+    except RedisError:
+        return BYPASS, None, load()
+
+    etag = f'"{tag}"'
+    # `if_none_match` es el ETags de Werkzeug: compara sin comillas.
+    if tag in if_none_match:
+        return NOT_MODIFIED, etag, None
+
+    key = CACHE_PREFIX + tag
+    try:
+        body = _client().get(key)
+    except RedisError:
+        return BYPASS, etag, load()
+    if body is not None:
+        return HIT, etag, body
+
+    body = load()
+    try:
+        _client().set(key, body, ex=CACHE_TTL_SECONDS)
+    except RedisError:
+        pass
+    return MISS, etag, body
+
+
+def invalidate_range(room_type_id, rate_plan_id, start, end):
+    # Llamar después del commit de una escritura sobre las noches [start, end):
+    # sube la versión de cada mes afectado y los rangos cacheados que lo
+    # incluyen dejan de usarse (expiran solos por TTL). Si Redis falla, el
+    # cache puede servir datos viejos hasta CACHE_TTL_SECONDS.
+    months = _months(start, end)
+    if not months:
+        return
+    try:
+        pipe = _client().pipeline(transaction=False)
+        for month in months:
+            pipe.incr(version_key(room_type_id, rate_plan_id, month))
+        pipe.execute()
+    except RedisError as exc:
+        print(f"[Cache] no se pudo invalidar {room_type_id}/{rate_plan_id}: {exc}")
@@ -0,0 +1,46 @@
+import json
+import os
+
+from redis.exceptions import RedisError
+
+from base import q
+
+
+# Canal de Redis donde el lado de comandos publica los saldos nuevos después
+# de cada commit; las réplicas de consulta lo usan para su proyección.
+FEED_CHANNEL = os.getenv("INVENTORY_FEED_CHANNEL", "inventory_changes")
+FEED_VERSION_KEY = "inventory_feed_version"
+
+
+def _client():
+    return q.connection
+
+
+def next_version():
+    # Llamar dentro de la transacción, con las filas ya bloqueadas o escritas:
+    # dos escrituras sobre la misma noche obtienen versiones en el mismo orden
+    # en que hacen commit, aunque después publiquen en otro orden.
+    try:
+        return _client().incr(FEED_VERSION_KEY)
+    except RedisError as exc:
+        print(f"[Feed] no se pudo obtener versión: {exc}")
+        return None
+
+
+def publish_changes(room_type_id, rate_plan_id, version, quantities):
+    # Llamar después del commit. `quantities` es {fecha: saldo absoluto}; con
+    # saldos absolutos y versión por noche, aplicar un mensaje repetido o
+    # atrasado no corrompe la proyección. Si Redis falla, las réplicas se
+    # corrigen en su próxima recarga completa.
+    if version is None or not quantities:
+        return
+    message = json.dumps({
+        "room_type_id": int(room_type_id),
+        "rate_plan_id": int(rate_plan_id),
+        "version": version,
+        "days": {str(night): quantity for night, quantity in sorted(quantities.items())},
+    })
+    try:
+        _client().publish(FEED_CHANNEL, message)
+    except RedisError as exc:
+        print(f"[Feed] no se pudo publicar {room_type_id}/{rate_plan_id}: {exc}")
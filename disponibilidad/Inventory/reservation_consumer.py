@@ -0,0 +1,317 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+import redis
+from prometheus_client import start_http_server
+
+from heartbeat import SERVICE_ID
+from reservation_status import FAILED, mark_pending, observe_outcomes, store_outcomes
+from updater import process_reservations, purge_applied
+
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+RESERVATION_QUEUE = os.getenv("RESERVATION_QUEUE", "reservation_commands")
+METRICS_PORT = int(os.getenv("RESERVATION_METRICS_PORT", "9105"))
+
+# Máximo de comandos por lote y cuánto se espera a que el lote se llene
+# después de recibir el primero.
+BATCH_SIZE = int(os.getenv("RESERVATION_BATCH_SIZE", "200"))
+LINGER_SECONDS = float(os.getenv("RESERVATION_LINGER_SECONDS", "0.01"))
+POLL_TIMEOUT_SECONDS = 1.0
+# Intentos por comando ante errores de base de datos antes de marcarlo failed.
+MAX_ATTEMPTS = int(os.getenv("RESERVATION_MAX_ATTEMPTS", "3"))
+# Pausa tras un error de Redis o Postgres antes de volver a consumir.
+RETRY_SECONDS = 1.0
+# Días que se conservan los registros de applied_reservation.
+APPLIED_RETENTION_DAYS = int(os.getenv("RESERVATION_APPLIED_RETENTION_DAYS", "7"))
+PURGE_INTERVAL_SECONDS = 3600
+# Vigencia de la marca de vida de cada consumidor; una lista "processing" cuyo
+# dueño no la renovó en este plazo se devuelve a la cola.
+LIVENESS_TTL_SECONDS = int(os.getenv("RESERVATION_CONSUMER_TTL_SECONDS", "30"))
+
+COMMAND_FIELDS = ("command_id", "room_type_id", "rate_plan_id", "start_date", "end_date",
+                  "enqueued_at", "attempts")
+
+# Mueve hasta N comandos de la cola a la lista "processing" del consumidor en
+# un solo paso: si el proceso cae a mitad de un lote, los comandos no se
+# pierden y se devuelven a la cola al reiniciar.
+_CLAIM_SCRIPT = """
+local items = redis.call('LPOP', KEYS[1], ARGV[1])
+if not items then
+    return {}
+end
+redis.call('RPUSH', KEYS[2], unpack(items))
+return items
+"""
+
+# Devuelve a la cabeza de la cola lo que quedó en "processing", en orden. Con
+# KEYS[3] (marca de vida del dueño) no hace nada si el dueño sigue vivo.
+_RECOVER_SCRIPT = """
+if KEYS[3] and redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = #items, 1, -1 do
+    redis.call('LPUSH', KEYS[1], items[i])
+end
+redis.call('DEL', KEYS[2])
+return #items
+"""
+
+
+def default_consumer_id():
+    # Único por proceso: las réplicas de un mismo servicio comparten SERVICE_ID.
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def new_command(data):
+    return {
+        "command_id": uuid.uuid4().hex,
+        "room_type_id": data["room_type_id"],
+        "rate_plan_id": data["rate_plan_id"],
+        "start_date": data["start_date"],
+        "end_date": data["end_date"],
+        "replica": SERVICE_ID,
+        "enqueued_at": time.time(),
+        "attempts": 0,
+    }
+
+
+def enqueue_reservation(client, data):
+    # El estado "pending" y el comando se escriben juntos: la consulta de
+    # estado nunca ve un comando encolado sin registro.
+    command = new_command(data)
+    pipe = client.pipeline(transaction=True)
+    mark_pending(pipe, command)
+    pipe.rpush(RESERVATION_QUEUE, json.dumps(command))
+    pipe.execute()
+    return command
+
+
+def apply_command(command):
+    # Job de RQ para RESERVATION_MODE=rq: aplica un solo comando y guarda su
+    # resultado igual que el consumidor por lotes.
+    from rq import get_current_job
+
+    client = get_current_job().connection
+    try:
+        result = process_reservations(
+            command["room_type_id"],
+            command["rate_plan_id"],
+            [(command["start_date"], command["end_date"])],
+            [command["command_id"]]
+        )[0]
+    except Exception as exc:
+        result = {"status": FAILED, "error": str(exc), "attempts": 1}
+    pipe = client.pipeline(transaction=True)
+    documents = store_outcomes(pipe, [command], {command["command_id"]: result}, SERVICE_ID)
+    pipe.execute()
+    observe_outcomes(documents)
+    return result
+
+
+class ReservationConsumer:
+
+    def __init__(self, client, queue=RESERVATION_QUEUE, batch_size=BATCH_SIZE,
+                 linger_seconds=LINGER_SECONDS, consumer_id=None):
+        self.client = client
+        self.queue = queue
+        self.consumer_id = consumer_id or default_consumer_id()
+        self.processing_prefix = f"{queue}:processing:"
+        self.processing = self.processing_prefix + self.consumer_id
+        self.alive = self.alive_key(self.consumer_id)
+        # Entradas reclamadas que no son un comando válido.
+        self.dead = f"{queue}:dead"
+        self.batch_size = max(1, batch_size)
+        self.linger_seconds = linger_seconds
+        self._claim = client.register_script(_CLAIM_SCRIPT)
+        self._recover = client.register_script(_RECOVER_SCRIPT)
+        self.running = True
+        self._next_purge = 0.0
+        self._next_recover = 0.0
+
+    def alive_key(self, consumer_id):
+        return f"{self.queue}:consumer:{consumer_id}"
+
+    def heartbeat(self):
+        self.client.set(self.alive, 1, ex=LIVENESS_TTL_SECONDS)
+
+    def _beat(self):
+        while self.running:
+            try:
+                self.heartbeat()
+            except redis.RedisError as exc:
+                print(f"[Reservations] no se pudo renovar {self.alive}: {exc}")
+            time.sleep(LIVENESS_TTL_SECONDS / 3)
+
+    def recover(self):
+        # Devuelve a la cola la lista propia (tras un error) y las de
+        # consumidores cuya marca de vida venció.
+        recovered = self._recover(keys=[self.queue, self.processing])
+        for key in self.client.scan_iter(match=self.processing_prefix + "*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            consumer_id = key[len(self.processing_prefix):]
+            if consumer_id == self.consumer_id:
+                continue
+            recovered += self._recover(
+                keys=[self.queue, key, self.alive_key(consumer_id)]
+            )
+        return recovered
+
+    def claim_batch(self):
+        # Espera el primer comando y luego junta hasta `batch_size` durante
+        # `linger_seconds`; con tráfico bajo el lote sale con lo que haya.
+        claimed = self._claim(keys=[self.queue, self.processing], args=[self.batch_size])
+        if not claimed:
+            first = self.client.blmove(
+                self.queue, self.processing, POLL_TIMEOUT_SECONDS, "LEFT", "RIGHT"
+            )
+            if first is None:
+                return []
+            claimed = [first]
+
+        deadline = time.monotonic() + self.linger_seconds
+        while len(claimed) < self.batch_size and time.monotonic() < deadline:
+            more = self._claim(
+                keys=[self.queue, self.processing],
+                args=[self.batch_size - len(claimed)]
+            )
+            if more:
+                claimed.extend(more)
+            else:
+                time.sleep(min(0.001, max(0.0, deadline - time.monotonic())))
+
+        return self.parse(claimed)
+
+    def parse(self, claimed):
+        # Una entrada ilegible se mueve a la lista dead: si quedara en
+        # processing, cada reinicio la devolvería a la cola y volvería a fallar.
+        commands = []
+        invalid = []
+        for raw in claimed:
+            try:
+                command = json.loads(raw)
+                if not isinstance(command, dict) or not all(f in command for f in COMMAND_FIELDS):
+                    raise ValueError("faltan campos")
+            except ValueError as exc:
+                print(f"[Reservations] comando inválido enviado a {self.dead}: {exc}")
+                invalid.append(raw)
+            else:
+                commands.append(command)
+
+        if invalid:
+            pipe = self.client.pipeline(transaction=True)
+            for raw in invalid:
+                pipe.rpush(self.dead, raw)
+                pipe.lrem(self.processing, 1, raw)
+            pipe.execute()
+        return commands
+
+    def apply_batch(self, commands):
+        # Agrupa por (room_type_id, rate_plan_id) conservando el orden de
+        # llegada dentro de cada grupo; cada grupo es una transacción.
+        groups = {}
+        for command in commands:
+            key = (command["room_type_id"], command["rate_plan_id"])
+            groups.setdefault(key, []).append(command)
+
+        outcomes = {}
+        retry = []
+        for (room_type_id, rate_plan_id), group in groups.items():
+            try:
+                results = process_reservations(
+                    room_type_id,
+                    rate_plan_id,
+                    [(command["start_date"], command["end_date"]) for command in group],
+                    [command["command_id"] for command in group]
+                )
+            except Exception as exc:
+                print(f"[Reservations] grupo {room_type_id}/{rate_plan_id} falló: {exc}")
+                for command in group:
+                    command["attempts"] += 1
+                    if command["attempts"] < MAX_ATTEMPTS:
+                        retry.append(command)
+                    else:
+                        outcomes[command["command_id"]] = {
+                            "status": FAILED,
+                            "error": str(exc),
+                            "attempts": command["attempts"],
+                        }
+                continue
+
+            for command, result in zip(group, results):
+                outcomes[command["command_id"]] = result
+
+        return outcomes, retry
+
+    def record(self, commands, outcomes, retry):
+        # Resultados, reintentos y vaciado de "processing" en una sola
+        # transacción de Redis.
+        pipe = self.client.pipeline(transaction=True)
+        documents = store_outcomes(pipe, commands, outcomes, self.consumer_id)
+        for command in retry:
+            pipe.rpush(self.queue, json.dumps(command))
+        pipe.delete(self.processing)
+        pipe.execute()
+        observe_outcomes(documents)
+
+    def run_once(self):
+        commands = self.claim_batch()
+        if not commands:
+            return 0
+        outcomes, retry = self.apply_batch(commands)
+        self.record(commands, outcomes, retry)
+        return len(commands)
+
+    def purge(self):
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+        purged = purge_applied(APPLIED_RETENTION_DAYS)
+        if purged:
+            print(f"[Reservations] {purged} registros de applied_reservation eliminados")
+
+    def run(self):
+        self.heartbeat()
+        threading.Thread(target=self._beat, daemon=True).start()
+        try:
+            self._loop()
+        finally:
+            # Al salir limpio no hay que esperar el TTL para liberar la lista.
+            self.running = False
+            self.client.delete(self.alive)
+
+    def _loop(self):
+        needs_recover = True
+        while self.running:
+            try:
+                # Entre lotes la lista propia está vacía: también se revisan
+                # periódicamente las de consumidores caídos.
+                if needs_recover or time.monotonic() >= self._next_recover:
+                    recovered = self.recover()
+                    if recovered:
+                        print(f"[Reservations] {recovered} comandos devueltos a la cola")
+                    needs_recover = False
+                    self._next_recover = time.monotonic() + LIVENESS_TTL_SECONDS
+                self.purge()
+                self.run_once()
+            except Exception as exc:
+                # Lo que quedó en processing vuelve a la cola antes de seguir;
+                # los comandos ya aplicados en Postgres no se descuentan de nuevo.
+                print(f"[Reservations] error: {exc!r}; reintentando en {RETRY_SECONDS}s")
+                needs_recover = True
+                time.sleep(RETRY_SECONDS)
+
+
+if __name__ == "__main__":
+    start_http_server(METRICS_PORT)
+    consumer = ReservationConsumer(redis.Redis.from_url(REDIS_URL))
+    print(
+        f"[Reservations] {SERVICE_ID} ({consumer.consumer_id}) consumiendo {RESERVATION_QUEUE} "
+        f"(lote {consumer.batch_size}, linger {consumer.linger_seconds}s)"
+    )
+    consumer.run()
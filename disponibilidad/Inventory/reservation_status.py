@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+from prometheus_client import Counter, Histogram
+
+
+RESULT_PREFIX = os.getenv("RESERVATION_RESULT_PREFIX", "reservation_result:")
+RESULT_TTL_SECONDS = int(os.getenv("RESERVATION_RESULT_TTL_SECONDS", str(24 * 3600)))
+
+PENDING = "pending"
+APPLIED = "applied"
+REJECTED = "rejected"
+FAILED = "failed"
+
+# Desde que la réplica de comandos acepta la reserva hasta que queda aplicada
+# (o rechazada) en Postgres.
+RESERVATION_LATENCY = Histogram(
+    "inventory_reservation_latency_seconds",
+    "Latencia de una reserva desde que se encola hasta que se aplica",
+    ["replica", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+RESERVATION_OUTCOMES = Counter(
+    "inventory_reservations",
+    "Reservas procesadas por réplica que las aceptó, estado y motivo de rechazo",
+    ["replica", "status", "reason"],
+)
+
+RESERVATION_COMMANDS = Counter(
+    "inventory_reservation_commands",
+    "Comandos de reserva aceptados por la réplica",
+    ["replica"],
+)
+
+
+def result_key(command_id):
+    return RESULT_PREFIX + command_id
+
+
+def mark_pending(client, command):
+    client.set(
+        result_key(command["command_id"]),
+        json.dumps({
+            "command_id": command["command_id"],
+            "status": PENDING,
+            "replica": command["replica"],
+            "enqueued_at": command["enqueued_at"],
+        }),
+        ex=RESULT_TTL_SECONDS,
+    )
+
+
+def store_outcomes(pipe, commands, outcomes, consumer_id):
+    # Agrega al pipeline el resultado de cada comando (estado applied,
+    # rejected o failed más el detalle de updater) y retorna los documentos
+    # para `observe_outcomes` una vez ejecutado el pipeline.
+    applied_at = time.time()
+    documents = []
+    for command in commands:
+        outcome = outcomes.get(command["command_id"])
+        if outcome is None:
+            continue
+        document = dict(outcome)
+        if document["status"] == "confirmed":
+            document["status"] = APPLIED
+        document.update(
+            command_id=command["command_id"],
+            replica=command.get("replica", "unknown"),
+            enqueued_at=command["enqueued_at"],
+            applied_at=applied_at,
+            latency_seconds=round(applied_at - command["enqueued_at"], 6),
+            consumer=consumer_id,
+        )
+        pipe.set(result_key(command["command_id"]), json.dumps(document),
+                 ex=RESULT_TTL_SECONDS)
+        documents.append(document)
+    return documents
+
+
+def observe_outcomes(documents):
+    for document in documents:
+        RESERVATION_LATENCY.labels(document["replica"], document["status"]).observe(
+            document["latency_seconds"]
+        )
+        RESERVATION_OUTCOMES.labels(
+            document["replica"], document["status"], document.get("reason", "")
+        ).inc()
+
+
+def get_status(client, command_id):
+    raw = client.get(result_key(command_id))
+    return json.loads(raw) if raw is not None else None
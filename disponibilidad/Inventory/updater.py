@@ -1,39 +1,366 @@
-from base import app, db, InventoryItem
+import json
+
+from base import app, db, AppliedReservation, InventoryItem
+from inventory_cache import invalidate_range
+from inventory_feed import next_version, publish_changes
 from datetime import datetime, timedelta
+from sqlalchemy import case, literal_column, update
+from sqlalchemy.dialects.postgresql import insert
+
+
+CONFIRMED = "confirmed"
+REJECTED = "rejected"
+
+# Filas por sentencia INSERT ... ON CONFLICT en las cargas masivas.
+BULK_CHUNK_SIZE = 1000
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _result(status, room_type_id, rate_plan_id, start, end, reason=None, dates=None):
+    result = {
+        "status": status,
+        "room_type_id": room_type_id,
+        "rate_plan_id": rate_plan_id,
+        "start_date": str(start),
+        "end_date": str(end),
+    }
+    if reason is not None:
+        result["reason"] = reason
+    if dates:
+        result["dates"] = dates
+    return result
+
+
+def lock_nights(room_type_id, rate_plan_id, start, end):
+    # Una sola consulta bloquea todas las noches del rango, en orden de fecha:
+    # dos reservas que se solapan toman los locks en el mismo orden, así que
+    # una espera a la otra en lugar de quedar en deadlock.
+    return (
+        db.session.query(
+            InventoryItem.id,
+            InventoryItem.date,
+            InventoryItem.available_quantity
+        )
+        .filter(
+            InventoryItem.room_type_id == room_type_id,
+            InventoryItem.rate_plan_id == rate_plan_id,
+            InventoryItem.date >= start,
+            InventoryItem.date < end
+        )
+        .order_by(InventoryItem.date)
+        .with_for_update()
+        .all()
+    )
+
+
+def reserve_range(room_type_id, rate_plan_id, start, end, changes=None):
+    # Verifica todas las noches y descuenta 1 con un único UPDATE dentro de la
+    # transacción actual; el commit o rollback queda a cargo del llamador.
+    # Si se pasa `changes`, se completa con {fecha: saldo nuevo}.
+    nights = (end - start).days
+    if nights <= 0:
+        return _result(REJECTED, room_type_id, rate_plan_id, start, end,
+                       reason="invalid_range")
+
+    rows = lock_nights(room_type_id, rate_plan_id, start, end)
+
+    if len(rows) < nights:
+        loaded = {row.date for row in rows}
+        missing = [
+            str(day)
+            for day in (start + timedelta(days=i) for i in range(nights))
+            if day not in loaded
+        ]
+        return _result(REJECTED, room_type_id, rate_plan_id, start, end,
+                       reason="missing_inventory", dates=missing)
+
+    sold_out = [str(row.date) for row in rows if row.available_quantity <= 0]
+    if sold_out:
+        return _result(REJECTED, room_type_id, rate_plan_id, start, end,
+                       reason="sold_out", dates=sold_out)
+
+    (
+        db.session.query(InventoryItem)
+        .filter(InventoryItem.id.in_([row.id for row in rows]))
+        .update(
+            {InventoryItem.available_quantity: InventoryItem.available_quantity - 1},
+            synchronize_session=False
+        )
+    )
+
+    if changes is not None:
+        changes.update({row.date: row.available_quantity - 1 for row in rows})
+
+    return _result(CONFIRMED, room_type_id, rate_plan_id, start, end)
+
+
+def reserve_ranges(room_type_id, rate_plan_id, ranges, changes=None):
+    # Aplica en orden de llegada varias reservas del mismo room type y rate
+    # plan dentro de la transacción actual. Bloquea una sola vez, en orden de
+    # fecha, todas las noches entre la primera entrada y la última salida,
+    # resuelve cada reserva sobre esos saldos en memoria y escribe los saldos
+    # finales con un solo UPDATE. Retorna un resultado por rango; si se pasa
+    # `changes`, se completa con {fecha: saldo nuevo}.
+    results = [None] * len(ranges)
+    valid = []
+
+    for position, (start, end) in enumerate(ranges):
+        if (end - start).days <= 0:
+            results[position] = _result(REJECTED, room_type_id, rate_plan_id, start, end,
+                                        reason="invalid_range")
+        else:
+            valid.append(position)
+
+    if not valid:
+        return results
+
+    first = min(ranges[position][0] for position in valid)
+    last = max(ranges[position][1] for position in valid)
+    rows = lock_nights(room_type_id, rate_plan_id, first, last)
+    row_ids = {row.date: row.id for row in rows}
+    available = {row.date: row.available_quantity for row in rows}
+    changed = set()
+
+    for position in valid:
+        start, end = ranges[position]
+        nights = [start + timedelta(days=i) for i in range((end - start).days)]
+
+        missing = [str(night) for night in nights if night not in available]
+        if missing:
+            results[position] = _result(REJECTED, room_type_id, rate_plan_id, start, end,
+                                        reason="missing_inventory", dates=missing)
+            continue
+
+        sold_out = [str(night) for night in nights if available[night] <= 0]
+        if sold_out:
+            results[position] = _result(REJECTED, room_type_id, rate_plan_id, start, end,
+                                        reason="sold_out", dates=sold_out)
+            continue
+
+        for night in nights:
+            available[night] -= 1
+            changed.add(night)
+        results[position] = _result(CONFIRMED, room_type_id, rate_plan_id, start, end)
+
+    if changed:
+        # Las filas siguen bloqueadas: escribir el saldo absoluto es seguro.
+        # Un CASE por id deja todas las noches en una sola sentencia (una
+        # lista de parámetros sería un UPDATE por noche con executemany).
+        balances = {row_ids[night]: available[night] for night in sorted(changed)}
+        db.session.execute(
+            update(InventoryItem)
+            .where(InventoryItem.id.in_(list(balances)))
+            .values(available_quantity=case(balances, value=InventoryItem.id))
+            .execution_options(synchronize_session=False)
+        )
+        if changes is not None:
+            changes.update({night: available[night] for night in changed})
+
+    return results
+
+
+def applied_results(command_ids):
+    # Resultados guardados de los comandos que ya se aplicaron.
+    rows = (
+        db.session.query(AppliedReservation.command_id, AppliedReservation.result)
+        .filter(AppliedReservation.command_id.in_(command_ids))
+        .all()
+    )
+    return {row.command_id: json.loads(row.result) for row in rows}
+
+
+def record_applied(room_type_id, rate_plan_id, entries):
+    # `entries` son pares (command_id, resultado); se insertan en la
+    # transacción actual. Si otro consumidor registró el mismo comando en
+    # paralelo, la restricción única hace fallar el commit y el reintento
+    # encuentra el resultado guardado.
+    db.session.add_all(
+        AppliedReservation(
+            command_id=command_id,
+            room_type_id=room_type_id,
+            rate_plan_id=rate_plan_id,
+            status=result["status"],
+            result=json.dumps(result)
+        )
+        for command_id, result in entries
+    )
+
+
+def purge_applied(retention_days):
+    # Borra los registros de comandos aplicados hace más de `retention_days`
+    # días: un comando tan viejo ya no puede volver a la cola.
+    with app.app_context():
+        try:
+            deleted = (
+                AppliedReservation.query
+                .filter(AppliedReservation.applied_at
+                        < db.func.now() - timedelta(days=retention_days))
+                .delete(synchronize_session=False)
+            )
+            db.session.commit()
+            return deleted
+        except:
+            db.session.rollback()
+            raise
+
+
+def process_reservations(room_type_id, rate_plan_id, date_ranges, command_ids=None):
+    # Variante por lotes de process_reservation: una sola transacción para
+    # todos los rangos (pares de fechas "YYYY-MM-DD") del mismo room type y
+    # rate plan. Retorna un resultado por rango, en el mismo orden.
+    # Con `command_ids` (uno por rango) cada comando queda registrado en
+    # applied_reservation junto con el descuento; uno ya registrado no se
+    # vuelve a aplicar y retorna el resultado guardado.
+
+    with app.app_context():
+
+        try:
+            results = [None] * len(date_ranges)
+            applied = applied_results(set(command_ids)) if command_ids else {}
+            first_position = {}
+            repeated = []
+            new_positions = []
+            positions = []
+            ranges = []
+
+            for position, (start_date, end_date) in enumerate(date_ranges):
+                command_id = command_ids[position] if command_ids else None
+                if command_id in applied:
+                    results[position] = applied[command_id]
+                    continue
+                if command_id is not None:
+                    # El mismo comando dos veces en el lote se aplica una sola vez.
+                    if command_id in first_position:
+                        repeated.append((position, first_position[command_id]))
+                        continue
+                    first_position[command_id] = position
+                new_positions.append(position)
+                try:
+                    ranges.append((_parse_date(start_date), _parse_date(end_date)))
+                except (TypeError, ValueError):
+                    results[position] = _result(REJECTED, room_type_id, rate_plan_id,
+                                                start_date, end_date, reason="invalid_dates")
+                else:
+                    positions.append(position)
+
+            confirmed = []
+            changes = {}
+            if ranges:
+                for position, date_range, result in zip(
+                    positions, ranges, reserve_ranges(room_type_id, rate_plan_id, ranges, changes)
+                ):
+                    results[position] = result
+                    if result["status"] == CONFIRMED:
+                        confirmed.append(date_range)
+
+            for position, original in repeated:
+                results[position] = results[original]
+
+            if command_ids and new_positions:
+                record_applied(room_type_id, rate_plan_id,
+                               [(command_ids[position], results[position])
+                                for position in new_positions])
+
+            version = next_version() if changes else None
+            db.session.commit()
+
+            if confirmed:
+                invalidate_range(room_type_id, rate_plan_id,
+                                 min(start for start, _ in confirmed),
+                                 max(end for _, end in confirmed))
+                publish_changes(room_type_id, rate_plan_id, version, changes)
+
+            return results
+
+        except:
+            db.session.rollback()
+            raise
 
 
 def process_reservation(room_type_id, rate_plan_id, start_date, end_date):
 
-    try:
-        with app.app_context():
+    with app.app_context():
 
-            start = datetime.strptime(start_date, "%Y-%m-%d").date()
-            end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        try:
+            start = _parse_date(start_date)
+            end = _parse_date(end_date)
+        except ValueError:
+            return _result(REJECTED, room_type_id, rate_plan_id, start_date, end_date,
+                           reason="invalid_dates")
 
-            current = start
+        try:
+            changes = {}
+            result = reserve_range(room_type_id, rate_plan_id, start, end, changes)
 
-            while current < end:
+            if result["status"] == CONFIRMED:
+                version = next_version()
+                db.session.commit()
+                invalidate_range(room_type_id, rate_plan_id, start, end)
+                publish_changes(room_type_id, rate_plan_id, version, changes)
+            else:
+                db.session.rollback()
 
-                inventory = (
-                    InventoryItem.query
-                    .with_for_update()
-                    .filter_by(
-                        room_type_id=room_type_id,
-                        rate_plan_id=rate_plan_id,
-                        date=current
-                    )
-                    .first()
-                )
+            return result
 
-                if not inventory or inventory.available_quantity <= 0:
-                    db.session.rollback()
-                    return
+        except:
+            db.session.rollback()
+            raise
 
-                inventory.available_quantity -= 1
-                current += timedelta(days=1)
 
+def upsert_inventory(room_type_id, rate_plan_id, days):
+    # Carga un calendario completo: `days` es una lista de (fecha, cantidad).
+    # Inserta o reemplaza la disponibilidad de cada noche con
+    # INSERT ... ON CONFLICT sobre uq_inventory_per_day, BULK_CHUNK_SIZE filas
+    # por sentencia y una sola transacción. Una fecha repetida se queda con el
+    # último valor. Las filas van ordenadas por fecha, el mismo orden en que
+    # las reservas toman los locks.
+    quantities = dict(days)
+    rows = [
+        {
+            "room_type_id": room_type_id,
+            "rate_plan_id": rate_plan_id,
+            "date": night,
+            "available_quantity": quantity,
+        }
+        for night, quantity in sorted(quantities.items())
+    ]
+    inserted = 0
+    updated = 0
+    version = None
+
+    with app.app_context():
+
+        try:
+            for offset in range(0, len(rows), BULK_CHUNK_SIZE):
+                statement = insert(InventoryItem).values(rows[offset:offset + BULK_CHUNK_SIZE])
+                statement = statement.on_conflict_do_update(
+                    constraint="uq_inventory_per_day",
+                    set_={"available_quantity": statement.excluded.available_quantity}
+                ).returning(
+                    # xmax = 0 solo en filas recién insertadas.
+                    literal_column("xmax = 0").label("inserted")
+                )
+
+                for row in db.session.execute(statement):
+                    if row.inserted:
+                        inserted += 1
+                    else:
+                        updated += 1
+
+            if rows:
+                version = next_version()
             db.session.commit()
 
-    except:
-        db.session.rollback()
-        raise
\ No newline at end of file
+        except:
+            db.session.rollback()
+            raise
+
+    if rows:
+        invalidate_range(room_type_id, rate_plan_id,
+                         rows[0]["date"], rows[-1]["date"] + timedelta(days=1))
+        publish_changes(room_type_id, rate_plan_id, version, quantities)
+
+    return {"inserted": inserted, "updated": updated, "total": len(rows)}
@@ -0,0 +1,95 @@
+"""Benchmark de codecs de payload: bytes por mensaje y µs de encode/decode.
+
+Uso (desde disponibilidad/):
+    python benchmarks/bench_codecs.py --items 1 10 100 --iterations 2000
+
+Imprime un JSON con una entrada por (codec, tamaño de orden).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from shared_queue.codecs import PayloadCodec
+
+
+CODECS: dict[str, dict[str, Any]] = {
+    "json": {"format": "json"},
+    "json+zlib": {"format": "json", "compression": "zlib"},
+    "json+zstd": {"format": "json", "compression": "zstd"},
+    "msgpack": {"format": "msgpack"},
+    "msgpack+zlib": {"format": "msgpack", "compression": "zlib"},
+    "msgpack+zstd": {"format": "msgpack", "compression": "zstd"},
+}
+
+
+def make_order(num_items: int) -> dict[str, Any]:
+    # Misma forma que las órdenes que publica cart_service en /cart/checkout.
+    items = [{"item_id": f"I{index:05d}", "quantity": index % 5 + 1} for index in range(num_items)]
+    return {
+        "order_id": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "items": items,
+        "total": round(sum(item["quantity"] * 12.0 for item in items), 2),
+    }
+
+
+def bench_codec(
+    name: str, options: dict[str, Any], order: dict[str, Any], iterations: int
+) -> dict[str, Any]:
+    # Umbral 0: se mide siempre la compresión, independientemente del tamaño.
+    codec = PayloadCodec(compress_threshold=0, **options)
+    data, stored_codec = codec.encode(order)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(order)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        PayloadCodec.decode(data, stored_codec)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    size = len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+    return {
+        "codec": name,
+        "items": len(order["items"]),
+        "bytes": size,
+        "encode_us": round(encode_us, 2),
+        "decode_us": round(decode_us, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--codecs", nargs="+", default=list(CODECS))
+    args = parser.parse_args()
+
+    results = []
+    for num_items in args.items:
+        order = make_order(num_items)
+        for name in args.codecs:
+            try:
+                results.append(bench_codec(name, CODECS[name], order, args.iterations))
+            except RuntimeError as exc:  # dependencia opcional no instalada
+                results.append({"codec": name, "items": num_items, "error": str(exc)})
+
+    print(json.dumps({"benchmark": "codecs", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
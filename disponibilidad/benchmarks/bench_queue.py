@@ -0,0 +1,443 @@
+"""Benchmark de la cola de órdenes (FileBackedQueue) y de OrderStore.
+
+Todo corre localmente sobre archivos SQLite temporales. Para cada tamaño de
+backlog se mide:
+- enqueue: ops/s con 1..N productores (`enqueue` individual y `enqueue_many`).
+- dequeue+ack: ops/s con 1..N consumidores (`dequeue_batch` + `ack_many`).
+- end-to-end: p50/p99 de latencia enqueue→ack con productores y consumidores
+  concurrentes.
+- crecimiento del archivo: bytes antes y después de cada escenario.
+- OrderStore: ops/s de `add_order`, `add_orders` (con y sin ack en la misma
+  transacción) y latencia de `list_orders` y de una página de `list_orders_page`.
+
+El backlog se precarga como mensajes pendientes reales con PRIORITY_LOW, la
+prioridad de las cargas masivas:
+- enqueue: los mensajes se publican con prioridad normal y se drenan antes
+  que el backlog.
+- dequeue+ack: los consumidores drenan el propio backlog, así que el dequeue
+  recorre el índice sobre esas filas.
+- end-to-end: las órdenes medidas usan PRIORITY_HIGH como las interactivas;
+  los consumidores ociosos también toman filas del backlog. Todos se detienen
+  cuando se confirmaron las `messages` órdenes medidas (contador compartido);
+  las filas del backlog confirmadas hasta ese momento se reportan aparte.
+Después de cada escenario se repone lo consumido del backlog para que su tamaño
+se mantenga durante toda la corrida.
+
+Uso (desde disponibilidad/):
+    python benchmarks/bench_queue.py --backlog 1000 100000 1000000 \\
+        --workers 1 4 --mode thread --messages 2000 --output bench.json
+
+La salida es JSON para comparar regresiones entre commits.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from order_service.order_store import OrderStore
+from shared_queue.file_queue import PRIORITY_HIGH, PRIORITY_LOW, FileBackedQueue
+
+
+PREFILL_CHUNK = 10_000
+
+
+def make_order(index: int) -> dict[str, Any]:
+    return {
+        "order_id": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "items": [{"item_id": "A001", "quantity": index % 5 + 1}],
+        "total": 10.0 * (index % 5 + 1),
+    }
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def file_size(db_path: Path) -> int:
+    # Incluye el WAL si la base está en ese modo.
+    wal = db_path.with_name(db_path.name + "-wal")
+    return db_path.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+
+
+# --- Tareas ejecutadas en hilos o procesos (deben ser de nivel módulo) ---
+
+
+def _produce(db_path: str, count: int, batch_size: int) -> float:
+    queue = FileBackedQueue(db_path)
+    start = time.perf_counter()
+    if batch_size <= 1:
+        for index in range(count):
+            queue.enqueue(make_order(index))
+    else:
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            queue.enqueue_many([make_order(offset + index) for index in range(size)])
+    return time.perf_counter() - start
+
+
+def _produce_timed(db_path: str, count: int, interval: float) -> None:
+    queue = FileBackedQueue(db_path)
+    for index in range(count):
+        order = make_order(index)
+        order["enqueued_at"] = time.time()
+        queue.enqueue(order, priority=PRIORITY_HIGH)
+        if interval:
+            time.sleep(interval)
+
+
+def _consume(
+    db_path: str,
+    target: int,
+    batch_size: int,
+    timeout: float,
+    timed_acked: Any = None,
+    timed_lock: Any = None,
+) -> dict[str, Any]:
+    """Consume hasta `target` mensajes (o hasta `timeout` sin mensajes).
+
+    Con `timed_acked` (un `Value` compartido entre consumidores, protegido por
+    `timed_lock`) solo cuentan los mensajes con `enqueued_at` y `target` es el
+    total de todos los consumidores: cada uno se detiene cuando entre todos
+    confirmaron `target`. Los del backlog se confirman igual y se reportan en
+    `backlog`.
+    """
+    queue = FileBackedQueue(db_path)
+    latencies: list[float] = []
+    consumed = 0
+    backlog = 0
+    start = time.perf_counter()
+    idle_deadline = time.monotonic() + timeout
+    while (timed_acked.value if timed_acked is not None else consumed) < target:
+        wanted = batch_size if timed_acked is not None else min(batch_size, target - consumed)
+        messages = queue.dequeue_batch(wanted)
+        if not messages:
+            if time.monotonic() > idle_deadline:
+                break
+            queue.wait_for_messages(0.05)
+            continue
+        queue.ack_many([message_id for message_id, _ in messages])
+        acked_at = time.time()
+        timed = 0
+        for _, order in messages:
+            if "enqueued_at" in order:
+                latencies.append(acked_at - order["enqueued_at"])
+                timed += 1
+            else:
+                backlog += 1
+        consumed += len(messages)
+        if timed_acked is not None and timed:
+            with timed_lock:
+                timed_acked.value += timed
+        idle_deadline = time.monotonic() + timeout
+    return {
+        "consumed": consumed,
+        "backlog": backlog,
+        "elapsed": time.perf_counter() - start,
+        "latencies": latencies,
+    }
+
+
+# --- Escenarios ---
+
+
+def _split(total: int, parts: int) -> list[int]:
+    base, extra = divmod(total, parts)
+    return [base + (1 if index < extra else 0) for index in range(parts)]
+
+
+def prefill_backlog(db_path: Path, backlog: int) -> float:
+    """Agrega `backlog` mensajes pendientes con PRIORITY_LOW; retorna los segundos usados."""
+    queue = FileBackedQueue(db_path)
+    start = time.perf_counter()
+    for offset in range(0, backlog, PREFILL_CHUNK):
+        size = min(PREFILL_CHUNK, backlog - offset)
+        queue.enqueue_many(
+            [make_order(offset + index) for index in range(size)], priority=PRIORITY_LOW
+        )
+    return time.perf_counter() - start
+
+
+def bench_enqueue(
+    executor: Executor, db_path: Path, producers: int, messages: int, batch_size: int
+) -> dict[str, Any]:
+    size_before = file_size(db_path)
+    start = time.perf_counter()
+    futures = [
+        executor.submit(_produce, str(db_path), count, batch_size)
+        for count in _split(messages, producers)
+    ]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    return {
+        "scenario": "enqueue" if batch_size <= 1 else "enqueue_many",
+        "producers": producers,
+        "batch_size": batch_size,
+        "messages": messages,
+        "ops_per_sec": round(messages / elapsed, 1),
+        "bytes_growth": file_size(db_path) - size_before,
+    }
+
+
+def bench_dequeue_ack(
+    executor: Executor,
+    db_path: Path,
+    consumers: int,
+    messages: int,
+    batch_size: int,
+    backlog: int,
+) -> dict[str, Any]:
+    # Se consume del backlog; si es más chico que `messages` se completa antes.
+    prefill_backlog(db_path, max(messages - backlog, 0))
+    start = time.perf_counter()
+    futures = [
+        executor.submit(_consume, str(db_path), count, batch_size, 1.0)
+        for count in _split(messages, consumers)
+    ]
+    consumed = sum(future.result()["consumed"] for future in futures)
+    elapsed = time.perf_counter() - start
+    prefill_backlog(db_path, min(consumed, backlog))
+    return {
+        "scenario": "dequeue_ack",
+        "consumers": consumers,
+        "batch_size": batch_size,
+        "messages": consumed,
+        "ops_per_sec": round(consumed / elapsed, 1),
+    }
+
+
+def bench_end_to_end(
+    executor: Executor,
+    db_path: Path,
+    workers: int,
+    messages: int,
+    batch_size: int,
+    interval: float,
+) -> dict[str, Any]:
+    # Proxies de un Manager: se pueden pasar tanto a hilos como a procesos.
+    with multiprocessing.Manager() as manager:
+        timed_acked = manager.Value("i", 0)
+        timed_lock = manager.Lock()
+        start = time.perf_counter()
+        consumers = [
+            executor.submit(
+                _consume, str(db_path), messages, batch_size, 2.0, timed_acked, timed_lock
+            )
+            for _ in range(workers)
+        ]
+        producers = [
+            executor.submit(_produce_timed, str(db_path), count, interval)
+            for count in _split(messages, workers)
+        ]
+        for future in producers:
+            future.result()
+        results = [future.result() for future in consumers]
+        elapsed = time.perf_counter() - start
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    backlog_consumed = sum(result["backlog"] for result in results)
+    prefill_backlog(db_path, backlog_consumed)
+    return {
+        "scenario": "end_to_end",
+        "producers": workers,
+        "consumers": workers,
+        "batch_size": batch_size,
+        "messages": len(latencies),
+        "backlog_consumed": backlog_consumed,
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+def bench_order_store(db_path: Path, messages: int, batch_size: int) -> list[dict[str, Any]]:
+    store = OrderStore(db_path)
+    start = time.perf_counter()
+    for index in range(messages):
+        store.add_order(make_order(index))
+    add_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, messages, batch_size):
+        size = min(batch_size, messages - offset)
+        store.add_orders([make_order(offset + index) for index in range(size)])
+    bulk_elapsed = time.perf_counter() - start
+
+    # Insert + ack en la misma transacción (cola y store en el mismo archivo).
+    queue = FileBackedQueue(db_path)
+    queue.enqueue_many([make_order(index) for index in range(messages)])
+    start = time.perf_counter()
+    while batch := queue.dequeue_batch(batch_size):
+        store.add_orders(
+            [order for _, order in batch],
+            ack_queue=queue,
+            message_ids=[message_id for message_id, _ in batch],
+        )
+    atomic_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    orders = store.list_orders()
+    list_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    page, _ = store.list_orders_page()
+    page_elapsed = time.perf_counter() - start
+    return [
+        {
+            "scenario": "order_store_add_order",
+            "messages": messages,
+            "ops_per_sec": round(messages / add_elapsed, 1),
+        },
+        {
+            "scenario": "order_store_add_orders",
+            "batch_size": batch_size,
+            "messages": messages,
+            "ops_per_sec": round(messages / bulk_elapsed, 1),
+        },
+        {
+            "scenario": "order_store_add_orders_with_ack",
+            "batch_size": batch_size,
+            "messages": messages,
+            "ops_per_sec": round(messages / atomic_elapsed, 1),
+        },
+        {
+            "scenario": "order_store_list_orders",
+            "rows": len(orders),
+            "latency_ms": round(list_elapsed * 1000, 3),
+        },
+        {
+            "scenario": "order_store_list_orders_page",
+            "rows": len(page),
+            "latency_ms": round(page_elapsed * 1000, 3),
+        },
+    ]
+
+
+def run_backlog(args: argparse.Namespace, backlog: int, workdir: Path) -> dict[str, Any]:
+    db_path = workdir / f"queue_{backlog}.db"
+    prefill_seconds = prefill_backlog(db_path, backlog)
+    size_after_prefill = file_size(db_path)
+
+    executor_cls = ProcessPoolExecutor if args.mode == "process" else ThreadPoolExecutor
+    results: list[dict[str, Any]] = []
+    for workers in args.workers:
+        with executor_cls(max_workers=workers * 2) as executor:
+            results.append(bench_enqueue(executor, db_path, workers, args.messages, 1))
+            results.append(
+                bench_enqueue(executor, db_path, workers, args.messages, args.batch_size)
+            )
+            # Se drena lo recién encolado (prioridad normal, sale antes que el backlog).
+            _consume(str(db_path), args.messages * 2, args.batch_size, 0.5)
+            results.append(
+                bench_dequeue_ack(
+                    executor, db_path, workers, args.messages, args.batch_size, backlog
+                )
+            )
+            results.append(
+                bench_end_to_end(
+                    executor, db_path, workers, args.messages, args.batch_size, args.interval
+                )
+            )
+
+    results.extend(
+        bench_order_store(workdir / f"orders_{backlog}.db", args.messages, args.batch_size)
+    )
+    return {
+        "backlog": backlog,
+        "prefill_seconds": round(prefill_seconds, 3),
+        "db_bytes_after_prefill": size_after_prefill,
+        "db_bytes_final": file_size(db_path),
+        "bytes_per_backlog_message": round(size_after_prefill / backlog, 1) if backlog else 0,
+        "results": results,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backlog", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--messages", type=int, default=2_000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.0,
+        help="pausa entre enqueues de cada productor en end_to_end (0 = a máxima velocidad)",
+    )
+    parser.add_argument("--output", type=Path, help="archivo JSON de salida (stdout si se omite)")
+    parser.add_argument("--workdir", type=Path, help="directorio para las bases temporales")
+    args = parser.parse_args()
+
+    report: dict[str, Any] = {
+        "benchmark": "queue",
+        "git_commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "backlog": args.backlog,
+            "workers": args.workers,
+            "mode": args.mode,
+            "messages": args.messages,
+            "batch_size": args.batch_size,
+            "interval": args.interval,
+        },
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        for backlog in args.backlog:
+            print(f"[bench_queue] backlog={backlog}", file=sys.stderr)
+            report["runs"].append(run_backlog(args, backlog, Path(tmp)))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark de conexiones SQLite: conexión por operación vs. conexiones persistentes.
+
+Compara, sobre archivos temporales, la configuración original (una conexión
+nueva por operación, journal DELETE, synchronous FULL) con el manager de
+`shared_queue.sqlite_connections` en varios niveles de durabilidad:
+- ops/s de `enqueue` individual, `dequeue`+`ack` y `pending_count`.
+- escritura con lectores concurrentes: enqueues/s de un productor mientras
+  N hilos leen `stats()`, y lecturas/s de esos hilos.
+
+Uso (desde disponibilidad/):
+    python benchmarks/bench_sqlite.py --operations 2000 --readers 2
+
+Imprime un JSON con una entrada por configuración.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from shared_queue.file_queue import FileBackedQueue
+from shared_queue.sqlite_connections import SQLiteConnectionManager
+
+
+class PerOperationConnections(SQLiteConnectionManager):
+    """Comportamiento previo: cada operación abre (y descarta) su propia conexión."""
+
+    def connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+CONFIGS: dict[str, dict[str, Any]] = {
+    "per_operation_delete_full": {
+        "manager": PerOperationConnections,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "auto_vacuum": None,
+    },
+    "persistent_delete_full": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "persistent_wal_full": {"journal_mode": "WAL", "synchronous": "FULL"},
+    "persistent_wal_normal": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+}
+
+
+def make_queue(db_path: Path, config: dict[str, Any]) -> tuple[FileBackedQueue, Any]:
+    options = dict(config)
+    manager_cls = options.pop("manager", SQLiteConnectionManager)
+    manager = manager_cls(db_path, **options)
+    return FileBackedQueue(db_path, connections=manager), manager
+
+
+def ops_per_sec(count: int, elapsed: float) -> float:
+    return round(count / elapsed, 1) if elapsed > 0 else 0.0
+
+
+def bench_single_ops(queue: FileBackedQueue, operations: int) -> dict[str, float]:
+    order = {"order_id": "bench", "items": [{"item_id": "A001", "quantity": 1}], "total": 10.0}
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        queue.enqueue(order)
+    enqueue_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        message = queue.dequeue()
+        if message is not None:
+            queue.ack(message[0])
+    dequeue_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        queue.pending_count()
+    count_elapsed = time.perf_counter() - start
+
+    return {
+        "enqueue_ops_per_sec": ops_per_sec(operations, enqueue_elapsed),
+        "dequeue_ack_ops_per_sec": ops_per_sec(operations, dequeue_elapsed),
+        "pending_count_ops_per_sec": ops_per_sec(operations, count_elapsed),
+    }
+
+
+def bench_concurrent(queue: FileBackedQueue, readers: int, seconds: float) -> dict[str, float]:
+    stop = threading.Event()
+    reads = [0] * readers
+
+    def read_loop(index: int) -> None:
+        while not stop.is_set():
+            queue.stats()
+            reads[index] += 1
+
+    threads = [threading.Thread(target=read_loop, args=(index,)) for index in range(readers)]
+    for thread in threads:
+        thread.start()
+
+    writes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        queue.enqueue({"order_id": "concurrent"})
+        writes += 1
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "concurrent_enqueue_ops_per_sec": ops_per_sec(writes, elapsed),
+        "concurrent_read_ops_per_sec": ops_per_sec(sum(reads), elapsed),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=2_000)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=list(CONFIGS))
+    args = parser.parse_args()
+
+    results: list[dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.configs:
+            queue, manager = make_queue(Path(tmp) / f"{name}.db", CONFIGS[name])
+            result: dict[str, Any] = {"config": name}
+            result.update(bench_single_ops(queue, args.operations))
+            result.update(bench_concurrent(queue, args.readers, args.seconds))
+            result["connections"] = manager.stats()
+            results.append(result)
+
+    print(json.dumps({"sqlite": sqlite3.sqlite_version, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+import re
 import sys
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from prometheus_flask_exporter import PrometheusMetrics
 
 
@@ -15,29 +16,86 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from shared_queue.file_queue import FileBackedQueue
+from cart_service.cart_store import CartFullError, create_cart_store
+from cart_service.checkout_batcher import CheckoutBatcher
+from cart_service.metrics import register_checkout_batcher_metrics
+from cart_service.price_catalog import PriceCatalog
+from shared_queue.backends import create_queue
+from shared_queue.metrics import register_queue_metrics
 
 app = Flask(__name__)
 metrics = PrometheusMetrics(app)
 metrics.info("cart_service_info", "Información del servicio cart", version="1.0.0")
-queue_client = FileBackedQueue()
+# Backend elegido con QUEUE_BACKEND (sqlite por defecto, partitioned o redis).
+queue_client = create_queue()
+register_queue_metrics(queue_client)
+# Checkouts concurrentes se publican juntos con `enqueue_many` (CHECKOUT_BATCH_*).
+# Prioridad alta: un checkout interactivo no espera detrás de cargas masivas.
+checkout_batcher = CheckoutBatcher.from_env(queue_client)
+register_checkout_batcher_metrics(checkout_batcher)
 
-# Almacenamiento en memoria para el experimento didáctico.
-cart_items: list[dict[str, Any]] = []
+# Un carrito por sesión: en memoria (CART_STORE=memory) o en Redis para
+# compartirlo entre réplicas (CART_STORE=redis).
+cart_store = create_cart_store()
+# Precios cargados una vez y refrescados por TTL (PRICE_CATALOG_*).
+price_catalog = PriceCatalog.from_env()
 
+CART_ID_HEADER = "X-Cart-Id"
+CART_ID_COOKIE = "cart_id"
+CART_COOKIE_MAX_AGE_SECONDS = 30 * 24 * 3600
+_CART_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
 
-def _calculate_total(items: list[dict[str, Any]]) -> float:
-    # Precios simplificados para no depender de un catálogo real.
-    price_catalog = {"A001": 10.0, "B002": 25.5, "C003": 7.75}
-    total = 0.0
-    for item in items:
-        unit_price = price_catalog.get(item["item_id"], 12.0)
-        total += unit_price * item["quantity"]
-    return round(total, 2)
+
+def _money(cents: int) -> float:
+    return round(cents / 100, 2)
+
+
+def _cart_summary(summary: dict[str, Any]) -> dict[str, Any]:
+    return {"lines": summary["lines"], "total": _money(summary["total_cents"])}
+
+
+def _cart_items(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {
+            "item_id": item["item_id"],
+            "quantity": item["quantity"],
+            "unit_price": _money(item["unit_price_cents"]),
+        }
+        for item in items
+    ]
+
+
+def _cart_id() -> str | None:
+    """Carrito de la sesión: header X-Cart-Id o cookie; si no hay, se crea uno.
+
+    Retorna None si el id recibido no es válido.
+    """
+    cart_id = request.headers.get(CART_ID_HEADER) or request.cookies.get(CART_ID_COOKIE)
+    if cart_id is None:
+        cart_id = uuid.uuid4().hex
+        g.new_cart_id = cart_id
+    return cart_id if _CART_ID_PATTERN.fullmatch(cart_id) else None
+
+
+@app.after_request
+def _set_cart_cookie(response: Any) -> Any:
+    new_cart_id = g.pop("new_cart_id", None)
+    if new_cart_id is not None:
+        response.set_cookie(
+            CART_ID_COOKIE, new_cart_id, max_age=CART_COOKIE_MAX_AGE_SECONDS, httponly=True
+        )
+    return response
+
+
+def _invalid_cart_id() -> Any:
+    return jsonify({"error": "cart id must be 1-64 characters of [A-Za-z0-9_-]"}), 400
 
 
 @app.post("/cart/items")
 def add_item() -> Any:
+    cart_id = _cart_id()
+    if cart_id is None:
+        return _invalid_cart_id()
     payload = request.get_json(silent=True) or {}
     item_id = payload.get("item_id")
     quantity = payload.get("quantity")
@@ -47,18 +105,90 @@ def add_item() -> Any:
     if not isinstance(quantity, int) or quantity <= 0:
         return jsonify({"error": "quantity must be a positive integer"}), 400
 
-    cart_items.append({"item_id": item_id.strip(), "quantity": quantity})
-    return jsonify({"status": "item_added", "cart": cart_items}), 201
+    item_id = item_id.strip()
+    try:
+        line = cart_store.add_item(cart_id, item_id, quantity, price_catalog.price_cents(item_id))
+    except CartFullError as exc:
+        return jsonify({"error": str(exc)}), 400
+    # Respuesta compacta: solo la línea afectada y el resumen del carrito.
+    return (
+        jsonify(
+            {
+                "status": "item_added",
+                "cart_id": cart_id,
+                "item": {
+                    "item_id": item_id,
+                    "quantity": line["quantity"],
+                    "unit_price": _money(line["unit_price_cents"]),
+                },
+                "cart": _cart_summary(line),
+            }
+        ),
+        201,
+    )
+
+
+@app.delete("/cart/items/<item_id>")
+def remove_item(item_id: str) -> Any:
+    cart_id = _cart_id()
+    if cart_id is None:
+        return _invalid_cart_id()
+    summary = cart_store.remove_item(cart_id, item_id)
+    if summary is None:
+        return jsonify({"error": "item not in cart"}), 404
+    return (
+        jsonify(
+            {
+                "status": "item_removed",
+                "cart_id": cart_id,
+                "item_id": item_id,
+                "cart": _cart_summary(summary),
+            }
+        ),
+        200,
+    )
 
 
 @app.get("/cart")
 def get_cart() -> Any:
-    return jsonify({"items": cart_items, "total": _calculate_total(cart_items)}), 200
+    cart_id = _cart_id()
+    if cart_id is None:
+        return _invalid_cart_id()
+    cart = cart_store.get_cart(cart_id)
+    return (
+        jsonify(
+            {
+                "cart_id": cart_id,
+                "items": _cart_items(cart["items"]),
+                "total": _money(cart["total_cents"]),
+            }
+        ),
+        200,
+    )
+
+
+@app.get("/cart/summary")
+def get_cart_summary() -> Any:
+    """Total y número de líneas sin listar los items: costo constante en carritos grandes."""
+    cart_id = _cart_id()
+    if cart_id is None:
+        return _invalid_cart_id()
+    return jsonify({"cart_id": cart_id, **_cart_summary(cart_store.summary(cart_id))}), 200
 
 
 @app.get("/health")
 def health() -> Any:
-    return jsonify({"status": "ok", "service": "cart_service"}), 200
+    return (
+        jsonify(
+            {
+                "status": "ok",
+                "service": "cart_service",
+                "carts": cart_store.stats(),
+                "price_catalog": price_catalog.stats(),
+            }
+        ),
+        200,
+    )
 
 
 @app.get("/echo")
@@ -68,24 +198,42 @@ def echo() -> Any:
 
 @app.post("/cart/checkout")
 def checkout() -> Any:
-    if not cart_items:
+    cart_id = _cart_id()
+    if cart_id is None:
+        return _invalid_cart_id()
+    # Se retira el carrito de forma atómica: dos checkouts simultáneos de la
+    # misma sesión no publican la misma orden dos veces.
+    cart = cart_store.pop(cart_id)
+    if not cart["items"]:
         return jsonify({"error": "cart is empty"}), 400
 
+    # `cart_id` es la clave de partición de la cola: las órdenes de un mismo
+    # carrito caen en el mismo shard y conservan su orden.
     order = {
         "order_id": str(uuid.uuid4()),
+        "cart_id": cart_id,
         "created_at": datetime.now(timezone.utc).isoformat(),
-        "items": list(cart_items),
-        "total": _calculate_total(cart_items),
+        "items": _cart_items(cart["items"]),
+        "total": _money(cart["total_cents"]),
     }
 
     # Punto clave de arquitectura: publicación asíncrona en cola.
     # No hay llamada HTTP sincrónica a order_service.
-    message_id = queue_client.enqueue(order)
+    try:
+        message_id = checkout_batcher.submit(order)
+    except Exception:
+        # Si no se pudo publicar, el carrito vuelve a la sesión.
+        for item in cart["items"]:
+            cart_store.add_item(
+                cart_id, item["item_id"], item["quantity"], item["unit_price_cents"]
+            )
+        raise
 
     return (
         jsonify(
             {
                 "status": "queued",
+                "cart_id": cart_id,
                 "order_id": order["order_id"],
                 "message_id": message_id,
             }
@@ -0,0 +1,433 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Protocol
+
+
+DEFAULT_CART_TTL_SECONDS = 24 * 3600.0
+DEFAULT_MAX_CARTS = 100_000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_LINES_PER_CART = 200
+DEFAULT_NUM_STRIPES = 32
+DEFAULT_REDIS_URL = "redis://redis:6379/0"
+DEFAULT_REDIS_PREFIX = "cart:"
+
+# Estimación del costo en memoria de un carrito y de cada línea (dict + strings).
+_CART_OVERHEAD_BYTES = 400
+_LINE_OVERHEAD_BYTES = 250
+
+
+class CartFullError(ValueError):
+    """El carrito alcanzó el máximo de líneas permitido."""
+
+
+class CartStore(Protocol):
+    """Carritos por sesión, identificados por `cart_id`.
+
+    Cada carrito tiene una línea por `item_id` (agregar un item que ya está
+    suma su cantidad) y mantiene su total en centavos al agregar o quitar
+    líneas, así que consultar el total no recorre los items. Cada línea guarda
+    el precio unitario vigente cuando se agregó por primera vez.
+
+    Los resúmenes son dicts con `lines` y `total_cents`; `add_item` agrega
+    `item_id`, `quantity` (de la línea) y `unit_price_cents`; `get_cart` y
+    `pop` agregan `items`, la lista de líneas en orden de llegada.
+    """
+
+    def add_item(
+        self, cart_id: str, item_id: str, quantity: int, unit_price_cents: int
+    ) -> dict[str, Any]: ...
+
+    def remove_item(self, cart_id: str, item_id: str) -> dict[str, Any] | None: ...
+
+    def summary(self, cart_id: str) -> dict[str, Any]: ...
+
+    def get_cart(self, cart_id: str) -> dict[str, Any]: ...
+
+    def pop(self, cart_id: str) -> dict[str, Any]: ...
+
+    def stats(self) -> dict[str, Any]: ...
+
+
+def _empty_cart() -> dict[str, Any]:
+    return {"items": [], "lines": 0, "total_cents": 0}
+
+
+class _Entry:
+    __slots__ = ("lines", "total_cents", "size", "expires_at")
+
+    def __init__(self, expires_at: float) -> None:
+        # item_id -> [cantidad, precio unitario en centavos]
+        self.lines: dict[str, list[int]] = {}
+        self.total_cents = 0
+        self.size = _CART_OVERHEAD_BYTES
+        self.expires_at = expires_at
+
+    def summary(self) -> dict[str, Any]:
+        return {"lines": len(self.lines), "total_cents": self.total_cents}
+
+    def cart(self) -> dict[str, Any]:
+        output = self.summary()
+        output["items"] = [
+            {"item_id": item_id, "quantity": quantity, "unit_price_cents": price}
+            for item_id, (quantity, price) in self.lines.items()
+        ]
+        return output
+
+
+class _Stripe:
+    """Una partición del store: su propio lock y su propio orden LRU."""
+
+    __slots__ = ("lock", "entries", "size", "evictions", "expirations")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class InMemoryCartStore:
+    """Carritos en memoria del proceso, con TTL, LRU y tope de memoria.
+
+    Los carritos se reparten en `num_stripes` particiones por hash del
+    `cart_id`, cada una con su propio lock: sesiones distintas casi nunca
+    compiten por el mismo lock bajo un servidor con hilos.
+
+    Cada acceso renueva el TTL y mueve el carrito al final del orden LRU de su
+    partición, así que los vencidos y los menos usados quedan al principio.
+    Al escribir se descartan primero los vencidos y luego los menos usados
+    hasta volver a `max_carts` y `max_bytes` (repartidos entre particiones). El
+    tamaño de cada carrito es una estimación, no una medición exacta.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = DEFAULT_CART_TTL_SECONDS,
+        max_carts: int = DEFAULT_MAX_CARTS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_lines_per_cart: int = DEFAULT_MAX_LINES_PER_CART,
+        num_stripes: int = DEFAULT_NUM_STRIPES,
+    ) -> None:
+        if num_stripes < 1:
+            raise ValueError("num_stripes must be >= 1")
+        self.ttl_seconds = ttl_seconds
+        self.max_carts = max_carts
+        self.max_bytes = max_bytes
+        self.max_lines_per_cart = max_lines_per_cart
+        self._stripes = [_Stripe() for _ in range(num_stripes)]
+        self._stripe_max_carts = max(1, max_carts // num_stripes)
+        self._stripe_max_bytes = max(1, max_bytes // num_stripes)
+
+    def _stripe_for(self, cart_id: str) -> _Stripe:
+        return self._stripes[zlib.crc32(cart_id.encode("utf-8")) % len(self._stripes)]
+
+    def _touch(self, stripe: _Stripe, cart_id: str, now: float) -> _Entry | None:
+        entry = stripe.entries.get(cart_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(stripe, cart_id)
+            stripe.expirations += 1
+            return None
+        entry.expires_at = now + self.ttl_seconds
+        stripe.entries.move_to_end(cart_id)
+        return entry
+
+    @staticmethod
+    def _remove(stripe: _Stripe, cart_id: str) -> _Entry | None:
+        entry = stripe.entries.pop(cart_id, None)
+        if entry is not None:
+            stripe.size -= entry.size
+        return entry
+
+    def _evict(self, stripe: _Stripe, now: float, keep: str) -> None:
+        # `keep` es el carrito recién escrito (el más reciente del LRU): nunca se
+        # desaloja, aunque por sí solo supere el tope de bytes de la franja.
+        while stripe.entries:
+            cart_id, oldest = next(iter(stripe.entries.items()))
+            if cart_id == keep:
+                return
+            if oldest.expires_at <= now:
+                stripe.expirations += 1
+            elif (
+                len(stripe.entries) > self._stripe_max_carts
+                or stripe.size > self._stripe_max_bytes
+            ):
+                stripe.evictions += 1
+            else:
+                return
+            self._remove(stripe, cart_id)
+
+    def add_item(
+        self, cart_id: str, item_id: str, quantity: int, unit_price_cents: int
+    ) -> dict[str, Any]:
+        stripe = self._stripe_for(cart_id)
+        now = time.monotonic()
+        with stripe.lock:
+            entry = self._touch(stripe, cart_id, now)
+            if entry is None:
+                entry = stripe.entries[cart_id] = _Entry(now + self.ttl_seconds)
+                stripe.size += entry.size
+            line = entry.lines.get(item_id)
+            if line is None:
+                if len(entry.lines) >= self.max_lines_per_cart:
+                    raise CartFullError(
+                        f"cart cannot have more than {self.max_lines_per_cart} lines"
+                    )
+                line = entry.lines[item_id] = [0, unit_price_cents]
+                line_size = _LINE_OVERHEAD_BYTES + len(item_id)
+                entry.size += line_size
+                stripe.size += line_size
+            line[0] += quantity
+            entry.total_cents += quantity * line[1]
+            output = entry.summary()
+            output.update(item_id=item_id, quantity=line[0], unit_price_cents=line[1])
+            self._evict(stripe, now, cart_id)
+            return output
+
+    def remove_item(self, cart_id: str, item_id: str) -> dict[str, Any] | None:
+        """Quita la línea completa; None si el item no estaba en el carrito."""
+        stripe = self._stripe_for(cart_id)
+        with stripe.lock:
+            entry = self._touch(stripe, cart_id, time.monotonic())
+            line = entry.lines.pop(item_id, None) if entry is not None else None
+            if entry is None or line is None:
+                return None
+            entry.total_cents -= line[0] * line[1]
+            line_size = _LINE_OVERHEAD_BYTES + len(item_id)
+            entry.size -= line_size
+            stripe.size -= line_size
+            if not entry.lines:
+                self._remove(stripe, cart_id)
+            return entry.summary()
+
+    def summary(self, cart_id: str) -> dict[str, Any]:
+        stripe = self._stripe_for(cart_id)
+        with stripe.lock:
+            entry = self._touch(stripe, cart_id, time.monotonic())
+            return entry.summary() if entry is not None else {"lines": 0, "total_cents": 0}
+
+    def get_cart(self, cart_id: str) -> dict[str, Any]:
+        stripe = self._stripe_for(cart_id)
+        with stripe.lock:
+            entry = self._touch(stripe, cart_id, time.monotonic())
+            return entry.cart() if entry is not None else _empty_cart()
+
+    def pop(self, cart_id: str) -> dict[str, Any]:
+        """Retira el carrito y lo retorna (vacío si no existe o venció)."""
+        stripe = self._stripe_for(cart_id)
+        with stripe.lock:
+            entry = self._touch(stripe, cart_id, time.monotonic())
+            if entry is None:
+                return _empty_cart()
+            self._remove(stripe, cart_id)
+            return entry.cart()
+
+    def stats(self) -> dict[str, Any]:
+        carts = size = evictions = expirations = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                carts += len(stripe.entries)
+                size += stripe.size
+                evictions += stripe.evictions
+                expirations += stripe.expirations
+        return {
+            "carts": carts,
+            "estimated_bytes": size,
+            "evictions": evictions,
+            "expirations": expirations,
+        }
+
+
+# Hash por carrito: `_total` (centavos), `_lines`, `_seq` y, por item,
+# `q:<item>` (cantidad), `p:<item>` (precio unitario) y `n:<item>` (orden de
+# llegada). En Lua para que el total no se desfase entre réplicas concurrentes.
+_ADD_SCRIPT = """
+local key = KEYS[1]
+local item = ARGV[1]
+local quantity = tonumber(ARGV[2])
+if redis.call('HEXISTS', key, 'q:' .. item) == 0 then
+    if tonumber(redis.call('HGET', key, '_lines') or '0') >= tonumber(ARGV[4]) then
+        return false
+    end
+    local seq = redis.call('HINCRBY', key, '_seq', 1)
+    redis.call('HSET', key, 'p:' .. item, ARGV[3], 'n:' .. item, seq)
+    redis.call('HINCRBY', key, '_lines', 1)
+end
+local price = tonumber(redis.call('HGET', key, 'p:' .. item))
+local line_quantity = redis.call('HINCRBY', key, 'q:' .. item, quantity)
+local total = redis.call('HINCRBY', key, '_total', price * quantity)
+redis.call('EXPIRE', key, ARGV[5])
+return {line_quantity, price, tonumber(redis.call('HGET', key, '_lines')), total}
+"""
+
+_REMOVE_SCRIPT = """
+local key = KEYS[1]
+local item = ARGV[1]
+local line = redis.call('HMGET', key, 'q:' .. item, 'p:' .. item)
+if not line[1] then
+    return false
+end
+redis.call('HDEL', key, 'q:' .. item, 'p:' .. item, 'n:' .. item)
+local lines = redis.call('HINCRBY', key, '_lines', -1)
+local total = redis.call('HINCRBY', key, '_total', -tonumber(line[1]) * tonumber(line[2]))
+if lines <= 0 then
+    redis.call('DEL', key)
+else
+    redis.call('EXPIRE', key, ARGV[2])
+end
+return {lines, total}
+"""
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+class RedisCartStore:
+    """Carritos en Redis para que varias réplicas de cart_service compartan estado.
+
+    Cada carrito es un hash `<prefix><cart_id>` cuyo TTL se renueva en cada
+    acceso. Agregar y quitar líneas son scripts Lua que actualizan cantidad y
+    total en el mismo paso. El tope de memoria lo impone el propio Redis
+    (`maxmemory` con una política LRU); aquí solo se limita el número de líneas
+    por carrito.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        url: str = DEFAULT_REDIS_URL,
+        prefix: str = DEFAULT_REDIS_PREFIX,
+        ttl_seconds: float = DEFAULT_CART_TTL_SECONDS,
+        max_lines_per_cart: int = DEFAULT_MAX_LINES_PER_CART,
+    ) -> None:
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_lines_per_cart = max_lines_per_cart
+        self._add = self.client.register_script(_ADD_SCRIPT)
+        self._remove = self.client.register_script(_REMOVE_SCRIPT)
+
+    def _key(self, cart_id: str) -> str:
+        return f"{self.prefix}{cart_id}"
+
+    @staticmethod
+    def _decode(fields: dict[Any, Any]) -> dict[str, Any]:
+        if not fields:
+            return _empty_cart()
+        values = {_text(name): _text(value) for name, value in fields.items()}
+        items = [
+            (
+                int(values[f"n:{name[2:]}"]),
+                {
+                    "item_id": name[2:],
+                    "quantity": int(value),
+                    "unit_price_cents": int(values[f"p:{name[2:]}"]),
+                },
+            )
+            for name, value in values.items()
+            if name.startswith("q:")
+        ]
+        return {
+            "items": [item for _, item in sorted(items, key=lambda pair: pair[0])],
+            "lines": int(values.get("_lines", 0)),
+            "total_cents": int(values.get("_total", 0)),
+        }
+
+    def add_item(
+        self, cart_id: str, item_id: str, quantity: int, unit_price_cents: int
+    ) -> dict[str, Any]:
+        result = self._add(
+            keys=[self._key(cart_id)],
+            args=[
+                item_id,
+                quantity,
+                unit_price_cents,
+                self.max_lines_per_cart,
+                int(self.ttl_seconds),
+            ],
+        )
+        if result is None:
+            raise CartFullError(f"cart cannot have more than {self.max_lines_per_cart} lines")
+        line_quantity, price, lines, total = (int(value) for value in result)
+        return {
+            "item_id": item_id,
+            "quantity": line_quantity,
+            "unit_price_cents": price,
+            "lines": lines,
+            "total_cents": total,
+        }
+
+    def remove_item(self, cart_id: str, item_id: str) -> dict[str, Any] | None:
+        result = self._remove(keys=[self._key(cart_id)], args=[item_id, int(self.ttl_seconds)])
+        if result is None:
+            return None
+        lines, total = (int(value) for value in result)
+        return {"lines": lines, "total_cents": total}
+
+    def summary(self, cart_id: str) -> dict[str, Any]:
+        key = self._key(cart_id)
+        pipe = self.client.pipeline()
+        pipe.hmget(key, "_lines", "_total")
+        pipe.expire(key, int(self.ttl_seconds))
+        (lines, total), _ = pipe.execute()
+        return {"lines": int(lines or 0), "total_cents": int(total or 0)}
+
+    def get_cart(self, cart_id: str) -> dict[str, Any]:
+        key = self._key(cart_id)
+        pipe = self.client.pipeline()
+        pipe.hgetall(key)
+        pipe.expire(key, int(self.ttl_seconds))
+        fields, _ = pipe.execute()
+        return self._decode(fields)
+
+    def pop(self, cart_id: str) -> dict[str, Any]:
+        """Lee y borra el carrito en una transacción MULTI: dos checkouts no lo duplican."""
+        key = self._key(cart_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(key)
+        pipe.delete(key)
+        fields, _ = pipe.execute()
+        return self._decode(fields)
+
+    def stats(self) -> dict[str, Any]:
+        # Contar carritos requeriría recorrer las claves: se deja a Redis (INFO keyspace).
+        return {}
+
+
+def create_cart_store(store: str | None = None) -> CartStore:
+    """Construye el store indicado por CART_STORE (`memory` por defecto o `redis`).
+
+    Variables de entorno adicionales: CART_TTL_SECONDS, CART_MAX_LINES y, para
+    `memory`, CART_MAX_CARTS, CART_MAX_BYTES y CART_STORE_STRIPES; para
+    `redis`, REDIS_URL.
+    """
+    name = (store or os.getenv("CART_STORE", "memory")).strip().lower()
+    ttl_seconds = float(os.getenv("CART_TTL_SECONDS", str(DEFAULT_CART_TTL_SECONDS)))
+    max_lines = int(os.getenv("CART_MAX_LINES", str(DEFAULT_MAX_LINES_PER_CART)))
+    if name == "memory":
+        return InMemoryCartStore(
+            ttl_seconds=ttl_seconds,
+            max_carts=int(os.getenv("CART_MAX_CARTS", str(DEFAULT_MAX_CARTS))),
+            max_bytes=int(os.getenv("CART_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+            max_lines_per_cart=max_lines,
+            num_stripes=int(os.getenv("CART_STORE_STRIPES", str(DEFAULT_NUM_STRIPES))),
+        )
+    if name == "redis":
+        return RedisCartStore(
+            url=os.getenv("REDIS_URL", DEFAULT_REDIS_URL),
+            ttl_seconds=ttl_seconds,
+            max_lines_per_cart=max_lines,
+        )
+    raise ValueError(f"Unknown cart store: {name!r} (expected memory or redis)")
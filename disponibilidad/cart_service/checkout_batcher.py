@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from typing import Any
+
+from shared_queue.backends import QueueBackend
+from shared_queue.file_queue import PRIORITY_HIGH
+from shared_queue.group_commit import GroupCommitter
+
+
+DEFAULT_MAX_BATCH_SIZE = 100
+DEFAULT_MAX_WAIT_SECONDS = 0.002
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+
+class CheckoutBatcher:
+    """Agrupa los checkouts concurrentes en una sola escritura a la cola.
+
+    Usa el mismo `GroupCommitter` que el group commit de `FileBackedQueue`,
+    pero sobre `enqueue_many` de cualquier backend: el primer checkout que
+    llega espera `max_wait` segundos (o hasta juntar `max_batch_size`), publica
+    el lote en una transacción y cada llamador recibe su propio id. Si la
+    escritura falla, todos los checkouts del lote reciben el error.
+
+    Con `max_batch_size=1` cada checkout se publica solo, sin esperar.
+    """
+
+    def __init__(
+        self,
+        queue: QueueBackend,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT_SECONDS,
+        priority: int = PRIORITY_HIGH,
+    ) -> None:
+        self.queue = queue
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.priority = priority
+        self._committer = GroupCommitter(
+            self._write, self.max_batch_size, self.max_wait, on_batch=self._record
+        )
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._checkouts = 0
+        self._errors = 0
+        self._size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._write_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, queue: QueueBackend) -> CheckoutBatcher:
+        """Configura el batcher con CHECKOUT_BATCH_MAX_SIZE y CHECKOUT_BATCH_MAX_WAIT_SECONDS."""
+        return cls(
+            queue,
+            max_batch_size=int(
+                os.getenv("CHECKOUT_BATCH_MAX_SIZE", str(DEFAULT_MAX_BATCH_SIZE))
+            ),
+            max_wait=float(
+                os.getenv("CHECKOUT_BATCH_MAX_WAIT_SECONDS", str(DEFAULT_MAX_WAIT_SECONDS))
+            ),
+        )
+
+    def submit(self, order: dict[str, Any]) -> Any:
+        """Publica la orden junto con las que lleguen en la ventana y retorna su id."""
+        return self._committer.submit(order)
+
+    def _write(self, orders: list[dict[str, Any]]) -> list[Any]:
+        return self.queue.enqueue_many(orders, priority=self.priority)
+
+    def _record(self, size: int, elapsed: float, error: BaseException | None) -> None:
+        with self._stats_lock:
+            self._batches += 1
+            self._checkouts += size
+            self._size_counts[bisect.bisect_left(BATCH_SIZE_BUCKETS, size)] += 1
+            self._write_seconds += elapsed
+            if error is not None:
+                self._errors += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Lotes, checkouts, errores e histograma de tamaños de lote."""
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "checkouts": self._checkouts,
+                "errors": self._errors,
+                "write_seconds": round(self._write_seconds, 6),
+                "batch_size": {
+                    "buckets": BATCH_SIZE_BUCKETS,
+                    "counts": list(self._size_counts),
+                    "sum": self._checkouts,
+                    "count": self._batches,
+                },
+            }
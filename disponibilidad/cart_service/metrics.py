@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+from prometheus_client.core import (
+    REGISTRY,
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily,
+)
+from prometheus_client.registry import CollectorRegistry
+
+from cart_service.checkout_batcher import CheckoutBatcher
+
+
+class CheckoutBatcherCollector:
+    """Expone `CheckoutBatcher.stats()` como métricas Prometheus, leídas una vez por scrape.
+
+    Si el tamaño medio de lote se queda en 1 bajo carga, la ventana
+    (`max_wait`) es demasiado corta para juntar checkouts.
+    """
+
+    def __init__(self, batcher: CheckoutBatcher) -> None:
+        self.batcher = batcher
+
+    def collect(self) -> Iterator[Any]:
+        stats = self.batcher.stats()
+
+        histogram = stats["batch_size"]
+        cumulative = 0
+        buckets: list[tuple[str, float]] = []
+        for bound, count in zip((*histogram["buckets"], float("inf")), histogram["counts"]):
+            cumulative += count
+            buckets.append(("+Inf" if bound == float("inf") else str(bound), cumulative))
+        batch_size = HistogramMetricFamily(
+            "cart_checkout_batch_size", "Checkouts publicados por escritura a la cola"
+        )
+        batch_size.add_metric([], buckets=buckets, sum_value=histogram["sum"])
+        yield batch_size
+
+        errors = CounterMetricFamily(
+            "cart_checkout_batch_errors", "Lotes de checkout cuya escritura a la cola falló"
+        )
+        errors.add_metric([], stats["errors"])
+        yield errors
+
+        write_seconds = CounterMetricFamily(
+            "cart_checkout_batch_write_seconds", "Tiempo acumulado escribiendo lotes en la cola"
+        )
+        write_seconds.add_metric([], stats["write_seconds"])
+        yield write_seconds
+
+        max_size = GaugeMetricFamily(
+            "cart_checkout_batch_max_size", "Tamaño máximo de lote configurado"
+        )
+        max_size.add_metric([], self.batcher.max_batch_size)
+        yield max_size
+
+
+def register_checkout_batcher_metrics(
+    batcher: CheckoutBatcher, registry: CollectorRegistry = REGISTRY
+) -> CheckoutBatcherCollector:
+    collector = CheckoutBatcherCollector(batcher)
+    registry.register(collector)
+    return collector
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Callable, Mapping
+
+
+logger = logging.getLogger(__name__)
+
+# Precios simplificados del experimento, usados si no hay catálogo de Inventory.
+STATIC_PRICES = {"A001": 10.0, "B002": 25.5, "C003": 7.75}
+DEFAULT_PRICE = 12.0
+DEFAULT_CATALOG_TTL_SECONDS = 300.0
+
+# Retorna {item_id: precio unitario}.
+PriceLoader = Callable[[], Mapping[str, Any]]
+
+
+def to_cents(price: Any) -> int:
+    """Convierte un precio (float, str o Decimal) a centavos, redondeando medio hacia arriba."""
+    return int((Decimal(str(price)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def static_prices() -> dict[str, Any]:
+    return dict(STATIC_PRICES)
+
+
+def rate_plan_prices(dsn: str) -> PriceLoader:
+    """Loader que lee `rate_plan.base_price` de la base de Inventory.
+
+    El `item_id` de un rate plan es su id como texto. Requiere psycopg2, que
+    solo se importa si se configura esta fuente.
+    """
+
+    def load() -> dict[str, Any]:
+        import psycopg2
+
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id, base_price FROM rate_plan")
+                prices: dict[str, Any] = static_prices()
+                prices.update({str(rate_plan_id): price for rate_plan_id, price in cursor})
+                return prices
+        finally:
+            conn.close()
+
+    return load
+
+
+class PriceCatalog:
+    """Precios unitarios en centavos, cargados una vez y refrescados cada `ttl_seconds`.
+
+    Los requests leen el diccionario en memoria sin consultar la fuente. Al
+    vencer el TTL, un solo hilo recarga mientras el resto sigue usando los
+    precios anteriores; si la recarga falla se conservan los anteriores y se
+    reintenta en el siguiente TTL.
+    """
+
+    def __init__(
+        self,
+        loader: PriceLoader = static_prices,
+        ttl_seconds: float = DEFAULT_CATALOG_TTL_SECONDS,
+        default_price: float = DEFAULT_PRICE,
+    ) -> None:
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.default_price_cents = to_cents(default_price)
+        self._prices: dict[str, int] = {}
+        self._expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @classmethod
+    def from_env(cls) -> PriceCatalog:
+        """Configura el catálogo con PRICE_CATALOG_DSN (Postgres de Inventory; sin él
+        usa los precios estáticos), PRICE_CATALOG_TTL_SECONDS y PRICE_DEFAULT."""
+        dsn = os.getenv("PRICE_CATALOG_DSN")
+        return cls(
+            loader=rate_plan_prices(dsn) if dsn else static_prices,
+            ttl_seconds=float(
+                os.getenv("PRICE_CATALOG_TTL_SECONDS", str(DEFAULT_CATALOG_TTL_SECONDS))
+            ),
+            default_price=float(os.getenv("PRICE_DEFAULT", str(DEFAULT_PRICE))),
+        )
+
+    def refresh(self) -> None:
+        try:
+            prices = {str(item_id): to_cents(price) for item_id, price in self.loader().items()}
+        except Exception:
+            self.refresh_errors += 1
+            logger.exception("Could not refresh the price catalog")
+        else:
+            self._prices = prices
+            self.refreshes += 1
+        self._expires_at = time.monotonic() + self.ttl_seconds
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() < self._expires_at:
+            return
+        # Quien no obtiene el lock sigue con los precios actuales; solo la
+        # primera carga (sin precios aún) espera a que termine.
+        if self._refresh_lock.acquire(blocking=not self._prices and self.refreshes == 0):
+            try:
+                if time.monotonic() >= self._expires_at:
+                    self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+    def price_cents(self, item_id: str) -> int:
+        self._maybe_refresh()
+        return self._prices.get(item_id, self.default_price_cents)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "items": len(self._prices),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
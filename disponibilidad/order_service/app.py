@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import json
+import os
+import re
+import signal
 import sys
 import threading
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, stream_with_context
 from prometheus_flask_exporter import PrometheusMetrics
 
 
@@ -13,19 +17,44 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from order_service.order_store import OrderStore
+from order_service.metrics import register_worker_pool_metrics
+from order_service.order_store import DEFAULT_PAGE_SIZE, OrderStore
 from order_service.worker import OrderWorker
+from order_service.worker_pool import OrderWorkerPool
+from shared_queue.backends import QueueBackend, create_queue, sqlite_queues
 from shared_queue.file_queue import FileBackedQueue
+from shared_queue.metrics import register_queue_metrics
+from shared_queue.partitioned_queue import PartitionedQueue
+from shared_queue.retention import NdjsonArchive, QueueCompactor
 
 app = Flask(__name__)
 metrics = PrometheusMetrics(app)
 metrics.info("order_service_info", "Información del servicio order", version="1.0.0")
-queue_client = FileBackedQueue()
+# Backend elegido con QUEUE_BACKEND (sqlite por defecto, partitioned o redis).
+queue_client = create_queue()
+register_queue_metrics(queue_client)
 order_store = OrderStore()
 
+# Tamaño de lote y lease con que el worker reclama mensajes de la cola.
+WORKER_BATCH_SIZE = 50
+WORKER_LEASE_SECONDS = 60.0
+
+# Retención de mensajes `done` en la cola (0 desactiva la compactación).
+# Con QUEUE_ARCHIVE_DIR los mensajes retirados se exportan a segmentos NDJSON.
+QUEUE_RETENTION_SECONDS = float(os.getenv("QUEUE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+QUEUE_ARCHIVE_DIR = os.getenv("QUEUE_ARCHIVE_DIR")
+# Convertir al arrancar una base existente a auto_vacuum=INCREMENTAL. Es un
+# VACUUM completo que bloquea a los productores: activar solo en una ventana
+# de mantenimiento (QUEUE_CONVERT_INCREMENTAL_VACUUM=1).
+QUEUE_CONVERT_INCREMENTAL_VACUUM = os.getenv("QUEUE_CONVERT_INCREMENTAL_VACUUM", "0") == "1"
+
+# Si la cola y el store comparten archivo, guardar el lote y confirmarlo en una
+# sola transacción (ORDER_ATOMIC_ACK=0 vuelve a dos commits por lote).
+ORDER_ATOMIC_ACK = os.getenv("ORDER_ATOMIC_ACK", "1") != "0"
+
 worker_lock = threading.Lock()
 worker_started = False
-worker: OrderWorker | None = None
+compactors: list[QueueCompactor] = []
 
 
 def _process_order(order: dict[str, Any]) -> None:
@@ -34,8 +63,81 @@ def _process_order(order: dict[str, Any]) -> None:
     print(f"[order_service] Orden procesada: {order['order_id']}")
 
 
+def _start_compactors() -> None:
+    if QUEUE_RETENTION_SECONDS <= 0:
+        return
+
+    # Solo los backends SQLite necesitan compactación (uno por archivo/shard).
+    for sqlite_queue in sqlite_queues(queue_client):
+        archive = (
+            NdjsonArchive(QUEUE_ARCHIVE_DIR, prefix=sqlite_queue.db_path.stem)
+            if QUEUE_ARCHIVE_DIR
+            else None
+        )
+        compactor = QueueCompactor(
+            sqlite_queue,
+            max_age_seconds=QUEUE_RETENTION_SECONDS,
+            archive=archive,
+            convert_existing=QUEUE_CONVERT_INCREMENTAL_VACUUM,
+        )
+        compactor.start()
+        compactors.append(compactor)
+
+
+def _batch_processor(
+    consumer_queue: QueueBackend,
+) -> Callable[[list[tuple[Any, dict[str, Any]]]], None]:
+    """Procesa un lote completo con un insert masivo y un ack por lote."""
+    atomic = (
+        ORDER_ATOMIC_ACK
+        and isinstance(consumer_queue, FileBackedQueue)
+        and order_store.shares_file_with(consumer_queue)
+    )
+
+    def process_batch(messages: list[tuple[Any, dict[str, Any]]]) -> None:
+        orders = [order for _, order in messages]
+        message_ids = [message_id for message_id, _ in messages]
+        if atomic:
+            order_store.add_orders(orders, ack_queue=consumer_queue, message_ids=message_ids)
+        else:
+            order_store.add_orders(orders)
+            consumer_queue.ack_many(message_ids)
+        for order in orders:
+            print(f"[order_service] Orden procesada: {order['order_id']}")
+
+    return process_batch
+
+
+def _consumer_queue(index: int, num_workers: int) -> QueueBackend:
+    # Con la cola particionada cada worker drena sus propios shards, así se
+    # conserva el orden por clave; si hay más workers que shards, comparten todos.
+    if isinstance(queue_client, PartitionedQueue) and num_workers <= queue_client.num_shards:
+        return queue_client.for_consumer(index, num_workers)
+    return queue_client
+
+
+def _build_worker(index: int, num_workers: int, **worker_kwargs: Any) -> OrderWorker:
+    """Construye el worker `index` del pool (en modo process corre dentro del hijo)."""
+    consumer_queue = _consumer_queue(index, num_workers)
+    return OrderWorker(
+        poll_fn=lambda: consumer_queue.dequeue_batch(WORKER_BATCH_SIZE, WORKER_LEASE_SECONDS),
+        process_fn=_process_order,
+        ack_fn=consumer_queue.ack_many,
+        interval_seconds=1.0,
+        wait_fn=consumer_queue.wait_for_messages,
+        fail_fn=consumer_queue.fail,
+        process_batch_fn=_batch_processor(consumer_queue),
+        **worker_kwargs,
+    )
+
+
+# ORDER_WORKERS (número o `auto`) y ORDER_WORKER_MODE (thread/process) definen la concurrencia.
+worker_pool = OrderWorkerPool.from_env(_build_worker)
+register_worker_pool_metrics(worker_pool, backlog_fn=queue_client.pending_count)
+
+
 def _ensure_worker_started() -> None:
-    global worker_started, worker
+    global worker_started
     if worker_started:
         return
 
@@ -43,15 +145,10 @@ def _ensure_worker_started() -> None:
         if worker_started:
             return
 
-        # Punto clave de arquitectura: este worker consume la cola en segundo plano.
-        # Si el servicio estuvo caído, al volver procesa backlog pendiente.
-        worker = OrderWorker(
-            poll_fn=queue_client.dequeue,
-            process_fn=_process_order,
-            ack_fn=queue_client.ack,
-            interval_seconds=1.0,
-        )
-        worker.start()
+        # Punto clave de arquitectura: los workers consumen la cola en segundo plano.
+        # Si el servicio estuvo caído, al volver procesan el backlog pendiente.
+        worker_pool.start()
+        _start_compactors()
         worker_started = True
 
 
@@ -62,12 +159,96 @@ def boot_worker() -> None:
 
 @app.get("/orders")
 def list_orders() -> Any:
-    return jsonify({"orders": order_store.list_orders()}), 200
+    """Órdenes procesadas, paginadas por cursor.
+
+    Parámetros: `limit`, `after` (cursor `next_cursor` de la página anterior),
+    `since`/`until` (ISO 8601 sobre `processed_at`) y `format=ndjson` para
+    exportar todo el rango en streaming, una orden por línea.
+    """
+    after = request.args.get("after")
+    since = request.args.get("since")
+    until = request.args.get("until")
+
+    try:
+        if request.args.get("format") == "ndjson":
+            orders = order_store.iter_orders(after=after, since=since, until=until)
+            # El primer bloque se lee aquí para validar parámetros antes de responder 200.
+            first = next(orders, None)
+            return Response(
+                stream_with_context(_ndjson_lines(first, orders)),
+                mimetype="application/x-ndjson",
+            )
+
+        limit = request.args.get("limit", default=DEFAULT_PAGE_SIZE, type=int)
+        orders, next_cursor = order_store.list_orders_page(
+            limit=limit, after=after, since=since, until=until
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"orders": orders, "next_cursor": next_cursor}), 200
+
+
+def _ndjson_lines(
+    first: dict[str, Any] | None, rest: Iterator[dict[str, Any]]
+) -> Iterator[str]:
+    if first is None:
+        return
+    yield json.dumps(first) + "\n"
+    for order in rest:
+        yield json.dumps(order) + "\n"
+
+
+@app.get("/dead-letters")
+def list_dead_letters() -> Any:
+    limit = request.args.get("limit", default=100, type=int)
+    return jsonify({"dead_letters": queue_client.dead_letters(limit)}), 200
+
+
+# Ids de mensaje: enteros en SQLite, "<ms>-<seq>" en Redis Streams.
+_MESSAGE_ID_PATTERN = re.compile(r"\d+(-\d+)?")
+
+
+def _parse_message_ids(raw_ids: list[Any]) -> list[int | str]:
+    message_ids: list[int | str] = []
+    for raw_id in raw_ids:
+        if isinstance(raw_id, bool) or not isinstance(raw_id, (int, str)):
+            raise ValueError(f"invalid message id: {raw_id!r}")
+        text = str(raw_id)
+        if not _MESSAGE_ID_PATTERN.fullmatch(text):
+            raise ValueError(f"invalid message id: {raw_id!r}")
+        message_ids.append(text if "-" in text else int(text))
+    return message_ids
+
+
+@app.post("/dead-letters/requeue")
+def requeue_dead_letters() -> Any:
+    payload = request.get_json(silent=True) or {}
+    message_ids = payload.get("ids")
+    if message_ids is not None and not isinstance(message_ids, list):
+        return jsonify({"error": "ids must be a list of message ids"}), 400
+
+    try:
+        if message_ids is not None:
+            message_ids = _parse_message_ids(message_ids)
+        # Un id de Redis ("<ms>-<seq>") no es válido para las colas SQLite.
+        requeued = queue_client.requeue_dead_letters(message_ids)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"status": "requeued", "requeued": requeued}), 200
 
 
 @app.get("/health")
 def health() -> Any:
-    return jsonify({"status": "ok", "worker_started": worker_started}), 200
+    return (
+        jsonify(
+            {
+                "status": "ok",
+                "worker_started": worker_started,
+                "workers": worker_pool.stats(),
+            }
+        ),
+        200,
+    )
 
 
 @app.get("/echo")
@@ -76,5 +257,7 @@ def echo() -> Any:
 
 
 if __name__ == "__main__":
+    # SIGTERM (docker stop) pasa por atexit para que el pool drene antes de salir.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     _ensure_worker_started()
     app.run(host="0.0.0.0", port=5002, debug=True)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from prometheus_client.core import (
+    REGISTRY,
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily,
+)
+from prometheus_client.registry import CollectorRegistry
+
+from order_service.worker_pool import OrderWorkerPool
+
+
+# (nombre de la métrica, campo de WorkerStats, descripción)
+_WORKER_COUNTERS = (
+    ("order_worker_batches", "batches", "Lotes reclamados de la cola por worker"),
+    ("order_worker_idle_polls", "idle_polls", "Polls que no devolvieron mensajes por worker"),
+    ("order_worker_poll_errors", "poll_errors", "Errores al reclamar mensajes por worker"),
+    ("order_worker_ack_errors", "ack_errors", "Errores al confirmar lotes por worker"),
+)
+
+_HISTOGRAMS = (
+    (
+        "order_worker_processing_seconds",
+        "processing_seconds",
+        "Tiempo desde que se reclama el mensaje hasta su ack",
+    ),
+    (
+        "order_worker_lag_seconds",
+        "lag_seconds",
+        "Atraso desde el created_at de la orden hasta que queda procesada",
+    ),
+)
+
+
+class WorkerPoolCollector:
+    """Expone la instrumentación de los workers del pool como métricas Prometheus.
+
+    Igual que `QueueStatsCollector`, se leen los contadores una vez por
+    scrape; en modo `process` viven en memoria compartida con los hijos.
+    Además de los contadores por worker expone los histogramas de tiempo de
+    procesamiento y de atraso, el throughput (mensajes/s desde el scrape
+    anterior) y, con `backlog_fn`, los mensajes pendientes: si el atraso y el
+    backlog crecen mientras el throughput se mantiene, el consumidor se está
+    quedando atrás.
+    """
+
+    def __init__(
+        self, pool: OrderWorkerPool, backlog_fn: Callable[[], int] | None = None
+    ) -> None:
+        self.pool = pool
+        self.backlog_fn = backlog_fn
+        self._rate_lock = threading.Lock()
+        self._last_sample: tuple[float, int] | None = None
+
+    def _throughput(self, processed_total: int) -> float:
+        now = time.monotonic()
+        with self._rate_lock:
+            rate = 0.0
+            if self._last_sample is not None:
+                sampled_at, last_total = self._last_sample
+                if now > sampled_at:
+                    rate = (processed_total - last_total) / (now - sampled_at)
+            self._last_sample = (now, processed_total)
+        return round(rate, 3)
+
+    def collect(self) -> Iterator[Any]:
+        stats = self.pool.stats()
+
+        size = GaugeMetricFamily(
+            "order_worker_pool_size", "Workers configurados en el pool", labels=["mode"]
+        )
+        size.add_metric([self.pool.mode], self.pool.size)
+        yield size
+
+        alive = GaugeMetricFamily(
+            "order_worker_alive", "1 si el worker sigue en ejecución", labels=["worker"]
+        )
+        for entry in stats:
+            alive.add_metric([str(entry["worker"])], 1 if entry["alive"] else 0)
+        yield alive
+
+        messages = CounterMetricFamily(
+            "order_worker_messages",
+            "Mensajes procesados por worker según el resultado",
+            labels=["worker", "outcome"],
+        )
+        for entry in stats:
+            messages.add_metric([str(entry["worker"]), "processed"], entry["processed"])
+            messages.add_metric([str(entry["worker"]), "failed"], entry["failed"])
+        yield messages
+
+        for name, field, documentation in _WORKER_COUNTERS:
+            counter = CounterMetricFamily(name, documentation, labels=["worker"])
+            for entry in stats:
+                counter.add_metric([str(entry["worker"])], entry[field])
+            yield counter
+
+        throughput = GaugeMetricFamily(
+            "order_worker_throughput_messages_per_second",
+            "Mensajes procesados por segundo por el pool desde el scrape anterior",
+        )
+        throughput.add_metric([], self._throughput(sum(entry["processed"] for entry in stats)))
+        yield throughput
+
+        histograms = self.pool.histograms()
+        for name, field, documentation in _HISTOGRAMS:
+            histogram = histograms[field]
+            cumulative = 0
+            buckets: list[tuple[str, float]] = []
+            for bound, count in zip((*histogram["buckets"], float("inf")), histogram["counts"]):
+                cumulative += count
+                buckets.append(("+Inf" if bound == float("inf") else str(bound), cumulative))
+            family = HistogramMetricFamily(name, documentation)
+            family.add_metric([], buckets=buckets, sum_value=histogram["sum"])
+            yield family
+
+        if self.backlog_fn is not None:
+            backlog = GaugeMetricFamily(
+                "order_worker_backlog_messages", "Mensajes pendientes por procesar"
+            )
+            backlog.add_metric([], self.backlog_fn())
+            yield backlog
+
+
+def register_worker_pool_metrics(
+    pool: OrderWorkerPool,
+    backlog_fn: Callable[[], int] | None = None,
+    registry: CollectorRegistry = REGISTRY,
+) -> WorkerPoolCollector:
+    collector = WorkerPoolCollector(pool, backlog_fn)
+    registry.register(collector)
+    return collector
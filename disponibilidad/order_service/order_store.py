@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import base64
 import json
 import sqlite3
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
 
 
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -11,21 +14,70 @@ DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "experiment_queue.db"
 
+# Tamaño de página de /orders y tamaño de bloque al exportar en streaming.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 500
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from shared_queue.codecs import PayloadCodec
+from shared_queue.sqlite_connections import SQLiteConnectionManager, connection_manager_for
+
+if TYPE_CHECKING:
+    from shared_queue.file_queue import FileBackedQueue
+
+
+def encode_cursor(processed_at: str, order_id: str) -> str:
+    """Cursor opaco con la última clave `(processed_at, order_id)` entregada."""
+    raw = json.dumps([processed_at, order_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        processed_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    return str(processed_at), str(order_id)
+
+
+def normalize_timestamp(value: str) -> str:
+    """Convierte una fecha ISO 8601 al formato de `processed_at` (UTC, `YYYY-MM-DD HH:MM:SS`)."""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid timestamp: {value!r}") from exc
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
 
 class OrderStore:
-    """Persistencia mínima de órdenes procesadas para consultar /orders."""
+    """Persistencia mínima de órdenes procesadas para consultar /orders.
+
+    Las lecturas se paginan por keyset sobre el índice `(processed_at,
+    order_id)`: cada página continúa tras la última clave entregada, así que
+    el costo no crece con el historial. `iter_orders` recorre el resultado por
+    bloques, cada uno con una lectura corta, para exportar sin cargarlo todo en
+    memoria ni retener el archivo durante todo el streaming.
+    """
 
-    def __init__(self, db_path: str | Path = DB_PATH) -> None:
+    def __init__(
+        self,
+        db_path: str | Path = DB_PATH,
+        codec: PayloadCodec | None = None,
+        connections: SQLiteConnectionManager | None = None,
+    ) -> None:
         self.db_path = Path(db_path)
+        self.codec = codec or PayloadCodec()
+        # Mismo manager que la cola si comparten archivo: misma conexión por hilo.
+        self._db = connections or connection_manager_for(self.db_path)
         self._init_db()
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, timeout=30)
-        conn.row_factory = sqlite3.Row
-        return conn
-
     def _init_db(self) -> None:
-        with self._connect() as conn:
+        with self._db.transaction() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS processed_orders (
@@ -35,30 +87,146 @@ class OrderStore:
                 )
                 """
             )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(processed_orders)")}
+            if "codec" not in columns:
+                conn.execute(
+                    "ALTER TABLE processed_orders ADD COLUMN codec TEXT NOT NULL DEFAULT 'json'"
+                )
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_processed_orders_processed_at
+                ON processed_orders(processed_at, order_id)
+                """
+            )
 
     def add_order(self, order: dict[str, Any]) -> None:
-        with self._connect() as conn:
+        data, codec = self.codec.encode(order)
+        with self._db.transaction() as conn:
             conn.execute(
                 """
-                INSERT OR IGNORE INTO processed_orders(order_id, payload)
-                VALUES (?, ?)
+                INSERT OR IGNORE INTO processed_orders(order_id, payload, codec)
+                VALUES (?, ?, ?)
                 """,
-                (order["order_id"], json.dumps(order)),
+                (order["order_id"], data, codec),
             )
 
-    def list_orders(self) -> list[dict[str, Any]]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                """
-                SELECT payload, processed_at
-                FROM processed_orders
-                ORDER BY processed_at ASC
+    def add_orders(
+        self,
+        orders: Iterable[dict[str, Any]],
+        ack_queue: FileBackedQueue | None = None,
+        message_ids: Iterable[int] = (),
+    ) -> int:
+        """Guarda un lote de órdenes con un solo `executemany` y un solo commit.
+
+        Con `ack_queue` los `message_ids` se confirman en la misma transacción:
+        o quedan guardadas las órdenes y confirmados los mensajes, o nada. Solo
+        es posible si la cola vive en el mismo archivo SQLite que el store.
+
+        Retorna cuántas órdenes nuevas se insertaron (las repetidas se ignoran).
+        """
+        if ack_queue is not None and not self.shares_file_with(ack_queue):
+            raise ValueError("ack_queue must use the same SQLite file as the order store")
+
+        rows = []
+        for order in orders:
+            data, codec = self.codec.encode(order)
+            rows.append((order["order_id"], data, codec))
+
+        with self._db.transaction() as conn:
+            changes_before = conn.total_changes
+            conn.executemany(
                 """
-            ).fetchall()
-
-        output: list[dict[str, Any]] = []
-        for row in rows:
-            order = json.loads(row["payload"])
-            order["processed_at"] = row["processed_at"]
-            output.append(order)
-        return output
+                INSERT OR IGNORE INTO processed_orders(order_id, payload, codec)
+                VALUES (?, ?, ?)
+                """,
+                rows,
+            )
+            inserted = conn.total_changes - changes_before
+            if ack_queue is not None:
+                ack_queue.ack_many_in(conn, message_ids)
+        return inserted
+
+    def shares_file_with(self, queue: Any) -> bool:
+        """True si `queue` es una cola SQLite sobre el mismo archivo que este store."""
+        queue_path = getattr(queue, "db_path", None)
+        return queue_path is not None and Path(queue_path).resolve() == self.db_path.resolve()
+
+    def list_orders(self) -> list[dict[str, Any]]:
+        """Todas las órdenes en orden de procesamiento (para lotes pequeños o pruebas)."""
+        return list(self.iter_orders())
+
+    def list_orders_page(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """Página de órdenes y cursor de la siguiente (None si no hay más).
+
+        `after` es un cursor retornado por una página anterior; `since` (inclusive)
+        y `until` (exclusivo) filtran por `processed_at` en formato ISO 8601.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after_key = decode_cursor(after) if after else None
+        # Se pide una fila extra solo para saber si existe una página siguiente.
+        rows = self._fetch_page(limit + 1, after_key, since, until)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["processed_at"], rows[-1]["order_id"])
+        return [self._row_to_order(row) for row in rows], next_cursor
+
+    def iter_orders(
+        self,
+        after: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        batch_size: int = EXPORT_BATCH_SIZE,
+    ) -> Iterator[dict[str, Any]]:
+        """Recorre las órdenes por bloques de `batch_size` con memoria constante."""
+        after_key = decode_cursor(after) if after else None
+        while True:
+            rows = self._fetch_page(batch_size, after_key, since, until)
+            for row in rows:
+                yield self._row_to_order(row)
+            if len(rows) < batch_size:
+                return
+            after_key = (rows[-1]["processed_at"], rows[-1]["order_id"])
+
+    def _fetch_page(
+        self,
+        limit: int,
+        after_key: tuple[str, str] | None,
+        since: str | None,
+        until: str | None,
+    ) -> list[sqlite3.Row]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if after_key is not None:
+            clauses.append("(processed_at, order_id) > (?, ?)")
+            params.extend(after_key)
+        if since:
+            clauses.append("processed_at >= ?")
+            params.append(normalize_timestamp(since))
+        if until:
+            clauses.append("processed_at < ?")
+            params.append(normalize_timestamp(until))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        conn = self._db.connection()
+        return conn.execute(
+            f"""
+            SELECT order_id, payload, codec, processed_at
+            FROM processed_orders
+            {where}
+            ORDER BY processed_at ASC, order_id ASC
+            LIMIT ?
+            """,
+            (*params, limit),
+        ).fetchall()
+
+    def _row_to_order(self, row: sqlite3.Row) -> dict[str, Any]:
+        order = self.codec.decode(row["payload"], row["codec"])
+        order["processed_at"] = row["processed_at"]
+        return order
@@ -1,37 +1,250 @@
 from __future__ import annotations
 
+import bisect
 import threading
 import time
-from typing import Callable
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Callable, Protocol
+
+
+STAT_FIELDS = ("processed", "failed", "batches", "idle_polls", "poll_errors", "ack_errors")
+
+# Buckets (segundos) de los histogramas de cada worker:
+# - processing_seconds: desde que se reclama el lote hasta el ack de cada mensaje.
+# - lag_seconds: desde el `created_at` de la orden hasta que queda procesada.
+HISTOGRAM_BUCKETS: dict[str, tuple[float, ...]] = {
+    "processing_seconds": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    "lag_seconds": (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+}
+
+
+def _layout() -> tuple[dict[str, int], dict[str, int], int]:
+    # Contadores e histogramas en un vector plano de floats, para poder ubicarlo
+    # en memoria compartida. Cada histograma ocupa un conteo por bucket, el
+    # bucket +Inf y la suma.
+    counters = {name: index for index, name in enumerate(STAT_FIELDS)}
+    histograms: dict[str, int] = {}
+    offset = len(STAT_FIELDS)
+    for name, buckets in HISTOGRAM_BUCKETS.items():
+        histograms[name] = offset
+        offset += len(buckets) + 2
+    return counters, histograms, offset
+
+
+_COUNTER_OFFSETS, _HISTOGRAM_OFFSETS, STATS_SIZE = _layout()
+
+
+class StopEvent(Protocol):
+    """Lo que el worker usa de `threading.Event` (también lo cumple `multiprocessing.Event`)."""
+
+    def is_set(self) -> bool: ...
+
+    def set(self) -> None: ...
+
+    def wait(self, timeout: float | None = None) -> bool: ...
+
+
+class WorkerStats:
+    """Contadores e histogramas de un worker.
+
+    Es el punto de instrumentación de `OrderWorker`: registra mensajes
+    procesados y fallidos, lotes, polls vacíos, tiempo de procesamiento y
+    atraso de cada orden. `order_service/metrics.py` los expone en Prometheus.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._values = [0.0] * STATS_SIZE
+
+    def _add(self, updates: list[tuple[int, float]]) -> None:
+        with self._lock:
+            for position, amount in updates:
+                self._values[position] += amount
+
+    def _read(self) -> list[float]:
+        with self._lock:
+            return list(self._values)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self._add([(_COUNTER_OFFSETS[name], amount)])
+
+    def observe(self, name: str, values: list[float]) -> None:
+        """Registra varias observaciones del histograma `name` de una vez."""
+        if not values:
+            return
+        offset = _HISTOGRAM_OFFSETS[name]
+        buckets = HISTOGRAM_BUCKETS[name]
+        updates = [(offset + bisect.bisect_left(buckets, value), 1.0) for value in values]
+        updates.append((offset + len(buckets) + 1, sum(values)))
+        self._add(updates)
+
+    def snapshot(self) -> dict[str, int]:
+        values = self._read()
+        return {name: int(values[offset]) for name, offset in _COUNTER_OFFSETS.items()}
+
+    def histograms(self) -> dict[str, dict[str, Any]]:
+        """Por histograma: conteos por bucket (no acumulados, último = +Inf), suma y total."""
+        values = self._read()
+        output: dict[str, dict[str, Any]] = {}
+        for name, offset in _HISTOGRAM_OFFSETS.items():
+            size = len(HISTOGRAM_BUCKETS[name]) + 1
+            counts = [int(value) for value in values[offset : offset + size]]
+            output[name] = {"counts": counts, "sum": values[offset + size], "count": sum(counts)}
+        return output
+
+
+def order_lag_seconds(order: dict[str, Any], now: float) -> float | None:
+    """Segundos desde el `created_at` (ISO 8601) de la orden; None si no lo trae."""
+    created_at = order.get("created_at")
+    if not isinstance(created_at, str):
+        return None
+    try:
+        created = datetime.fromisoformat(created_at)
+    except ValueError:
+        return None
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return max(now - created.timestamp(), 0.0)
 
 
 class OrderWorker(threading.Thread):
-    """Worker en background que desacopla al API de /orders del procesamiento."""
+    """Worker en background que desacopla al API de /orders del procesamiento.
+
+    Consume la cola por lotes: `poll_fn` reclama hasta N mensajes con lease y
+    `ack_fn` los confirma todos juntos una vez procesados. Si se entrega
+    `wait_fn`, la cola vacía se espera bloqueando hasta que llegue un mensaje
+    (como máximo `interval_seconds`) en lugar de dormir un intervalo fijo.
+
+    Una excepción al procesar un mensaje no detiene el worker: el mensaje se
+    entrega a `fail_fn` (reintento con backoff o dead letter) y el resto del
+    lote se confirma normalmente. Si falla el ack (p. ej. base bloqueada) se
+    registra y se sigue: el lote vuelve a entregarse al vencer el lease.
+
+    Con `process_batch_fn` el lote completo se procesa y confirma en una sola
+    llamada (p. ej. un insert masivo más el ack en la misma transacción). Si
+    esa llamada falla se recurre al camino por mensaje, que aísla al mensaje
+    defectuoso sin perder el resto del lote.
+
+    `stop()` termina el worker al cerrar el lote en curso; `drain()` lo deja
+    seguir hasta que la cola quede vacía. Los eventos se pueden inyectar para
+    controlar un worker que corre en otro proceso (ver `OrderWorkerPool`).
+    """
 
     def __init__(
         self,
-        poll_fn: Callable[[], tuple[int, dict] | None],
+        poll_fn: Callable[[], list[tuple[int, dict]]],
         process_fn: Callable[[dict], None],
-        ack_fn: Callable[[int], None],
+        ack_fn: Callable[[list[int]], None],
         interval_seconds: float = 1.0,
+        wait_fn: Callable[[float], bool] | None = None,
+        fail_fn: Callable[[int, BaseException], Any] | None = None,
+        stop_event: StopEvent | None = None,
+        drain_event: StopEvent | None = None,
+        stats: WorkerStats | None = None,
+        name: str | None = None,
+        process_batch_fn: Callable[[list[tuple[int, dict]]], None] | None = None,
     ) -> None:
-        super().__init__(daemon=True)
+        super().__init__(daemon=True, name=name)
         self.poll_fn = poll_fn
         self.process_fn = process_fn
         self.ack_fn = ack_fn
         self.interval_seconds = interval_seconds
-        self._stop_event = threading.Event()
+        self.wait_fn = wait_fn
+        self.fail_fn = fail_fn
+        self.process_batch_fn = process_batch_fn
+        self.stats = stats or WorkerStats()
+        self._stop_event = stop_event or threading.Event()
+        self._drain_event = drain_event or threading.Event()
 
     def run(self) -> None:
         while not self._stop_event.is_set():
-            message = self.poll_fn()
-            if not message:
-                time.sleep(self.interval_seconds)
+            try:
+                messages = self.poll_fn()
+            except Exception:
+                # Falla de la cola (p. ej. base bloqueada): se reintenta tras el intervalo.
+                traceback.print_exc()
+                self.stats.increment("poll_errors")
+                self._stop_event.wait(self.interval_seconds)
                 continue
 
-            message_id, order = message
-            self.process_fn(order)
-            self.ack_fn(message_id)
+            if not messages:
+                if self._drain_event.is_set():
+                    return
+                self.stats.increment("idle_polls")
+                self._wait_for_work()
+                continue
+
+            dequeued_at = time.monotonic()
+            self.stats.increment("batches")
+            if self.process_batch_fn is not None and self._process_batch(messages, dequeued_at):
+                continue
+
+            processed: list[int] = []
+            processed_orders: list[dict] = []
+            for message_id, order in messages:
+                try:
+                    self.process_fn(order)
+                except Exception as exc:
+                    self._handle_failure(message_id, exc)
+                else:
+                    processed.append(message_id)
+                    processed_orders.append(order)
+            if processed:
+                try:
+                    self.ack_fn(processed)
+                except Exception:
+                    # Los mensajes siguen en processing: vuelven cuando vence el lease.
+                    traceback.print_exc()
+                    self.stats.increment("ack_errors")
+                    self._stop_event.wait(self.interval_seconds)
+                    continue
+                self._record_processed(processed_orders, dequeued_at)
+
+    def _process_batch(self, messages: list[tuple[int, dict]], dequeued_at: float) -> bool:
+        try:
+            self.process_batch_fn(messages)
+        except Exception as exc:
+            print(
+                f"[order_worker] Falló el lote de {len(messages)} mensajes ({exc!r}); "
+                "se procesa mensaje por mensaje"
+            )
+            return False
+        self._record_processed([order for _, order in messages], dequeued_at)
+        return True
+
+    def _record_processed(self, orders: list[dict], dequeued_at: float) -> None:
+        # Todo el lote se confirma con un único ack: comparten el mismo tiempo.
+        processing_seconds = time.monotonic() - dequeued_at
+        now = time.time()
+        self.stats.increment("processed", len(orders))
+        self.stats.observe("processing_seconds", [processing_seconds] * len(orders))
+        lags = [order_lag_seconds(order, now) for order in orders]
+        self.stats.observe("lag_seconds", [lag for lag in lags if lag is not None])
+
+    def _handle_failure(self, message_id: int, exc: Exception) -> None:
+        self.stats.increment("failed")
+        print(f"[order_worker] Falló el mensaje {message_id}: {exc!r}")
+        if self.fail_fn is None:
+            # Sin fail_fn el mensaje queda en processing y vuelve por vencimiento del lease.
+            return
+        try:
+            status = self.fail_fn(message_id, exc)
+        except Exception:
+            traceback.print_exc()
+            return
+        if status == "dead_letter":
+            print(f"[order_worker] Mensaje {message_id} enviado a dead letter")
+
+    def _wait_for_work(self) -> None:
+        if self.wait_fn is None:
+            time.sleep(self.interval_seconds)
+            return
+        self.wait_fn(self.interval_seconds)
 
     def stop(self) -> None:
         self._stop_event.set()
+
+    def drain(self) -> None:
+        """Termina en cuanto un poll no devuelva mensajes."""
+        self._drain_event.set()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Any, Callable
+
+from order_service.worker import (
+    HISTOGRAM_BUCKETS,
+    STATS_SIZE,
+    OrderWorker,
+    StopEvent,
+    WorkerStats,
+)
+
+
+WORKER_MODES = ("thread", "process")
+DEFAULT_WORKER_MODE = "thread"
+DEFAULT_NUM_WORKERS = 1
+DEFAULT_DRAIN_TIMEOUT_SECONDS = 10.0
+# Tiempo extra para que un worker cierre su lote tras `stop` antes de forzarlo.
+STOP_JOIN_TIMEOUT_SECONDS = 5.0
+
+# Recibe (índice del worker, total de workers, **kwargs de OrderWorker) y
+# retorna el worker sin arrancar. En modo `process` se ejecuta dentro del hijo,
+# así que debe ser una función de nivel módulo (picklable).
+WorkerFactory = Callable[..., OrderWorker]
+
+
+class SharedWorkerStats(WorkerStats):
+    """Contadores e histogramas de un worker en memoria compartida, legibles desde el padre."""
+
+    def __init__(self, array: Any, index: int) -> None:
+        self._array = array
+        self._offset = index * STATS_SIZE
+
+    def _add(self, updates: list[tuple[int, float]]) -> None:
+        with self._array.get_lock():
+            for position, amount in updates:
+                self._array[self._offset + position] += amount
+
+    def _read(self) -> list[float]:
+        with self._array.get_lock():
+            return list(self._array[self._offset : self._offset + STATS_SIZE])
+
+
+def _run_worker_process(
+    worker_factory: WorkerFactory,
+    index: int,
+    size: int,
+    stop_event: StopEvent,
+    drain_event: StopEvent,
+    stats: WorkerStats,
+) -> None:
+    # Ctrl+C llega a todo el grupo de procesos: el padre coordina el drenado.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = worker_factory(
+        index, size, stop_event=stop_event, drain_event=drain_event, stats=stats
+    )
+    worker.run()
+
+
+class OrderWorkerPool:
+    """Pool de N consumidores `OrderWorker` como hilos o como procesos.
+
+    Los hilos comparten la cola y la conexión del proceso; sirven cuando el
+    procesamiento espera I/O. Los procesos (`mode="process"`) escalan con los
+    núcleos disponibles porque cada uno tiene su propio intérprete y su propia
+    instancia de la cola; se arrancan con `spawn` para no heredar hilos ni
+    conexiones abiertas del proceso padre.
+
+    `stop()` (registrado con atexit) primero drena: los workers siguen hasta
+    que la cola quede vacía o venza `drain_timeout`; luego se detienen al
+    terminar el lote en curso. Lo que quede reclamado vuelve a la cola cuando
+    vence su lease.
+    """
+
+    def __init__(
+        self,
+        worker_factory: WorkerFactory,
+        size: int = DEFAULT_NUM_WORKERS,
+        mode: str = DEFAULT_WORKER_MODE,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT_SECONDS,
+    ) -> None:
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Unknown worker mode: {mode!r}")
+        self.worker_factory = worker_factory
+        self.size = size
+        self.mode = mode
+        self.drain_timeout = drain_timeout
+
+        self._lock = threading.Lock()
+        self._started = False
+        self._workers: list[Any] = []
+        if mode == "process":
+            self._context = multiprocessing.get_context("spawn")
+            self._stop_event: StopEvent = self._context.Event()
+            self._drain_event: StopEvent = self._context.Event()
+            counters = self._context.Array("d", size * STATS_SIZE)
+            self._stats: list[WorkerStats] = [
+                SharedWorkerStats(counters, index) for index in range(size)
+            ]
+        else:
+            self._stop_event = threading.Event()
+            self._drain_event = threading.Event()
+            self._stats = [WorkerStats() for _ in range(size)]
+
+    @classmethod
+    def from_env(cls, worker_factory: WorkerFactory) -> OrderWorkerPool:
+        """Configura el pool con ORDER_WORKERS (número o `auto`), ORDER_WORKER_MODE y
+        ORDER_WORKER_DRAIN_SECONDS."""
+        size = os.getenv("ORDER_WORKERS", str(DEFAULT_NUM_WORKERS)).strip().lower()
+        return cls(
+            worker_factory,
+            size=(os.cpu_count() or 1) if size == "auto" else int(size),
+            mode=os.getenv("ORDER_WORKER_MODE", DEFAULT_WORKER_MODE).strip().lower(),
+            drain_timeout=float(
+                os.getenv("ORDER_WORKER_DRAIN_SECONDS", str(DEFAULT_DRAIN_TIMEOUT_SECONDS))
+            ),
+        )
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            for index in range(self.size):
+                name = f"order-worker-{index}"
+                if self.mode == "process":
+                    worker: Any = self._context.Process(
+                        target=_run_worker_process,
+                        args=(
+                            self.worker_factory,
+                            index,
+                            self.size,
+                            self._stop_event,
+                            self._drain_event,
+                            self._stats[index],
+                        ),
+                        name=name,
+                        daemon=True,
+                    )
+                else:
+                    worker = self.worker_factory(
+                        index,
+                        self.size,
+                        stop_event=self._stop_event,
+                        drain_event=self._drain_event,
+                        stats=self._stats[index],
+                        name=name,
+                    )
+                worker.start()
+                self._workers.append(worker)
+            self._started = True
+        atexit.register(self.stop)
+
+    def stop(self, drain: bool = True, timeout: float | None = None) -> None:
+        """Drena (opcional) y detiene los workers; es seguro llamarlo más de una vez."""
+        with self._lock:
+            if not self._started:
+                return
+            if drain:
+                self._drain_event.set()
+                deadline = time.monotonic() + (
+                    self.drain_timeout if timeout is None else timeout
+                )
+                for worker in self._workers:
+                    worker.join(max(0.0, deadline - time.monotonic()))
+
+            self._stop_event.set()
+            deadline = time.monotonic() + STOP_JOIN_TIMEOUT_SECONDS
+            for worker in self._workers:
+                worker.join(max(0.0, deadline - time.monotonic()))
+                if self.mode == "process" and worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            self._started = False
+        atexit.unregister(self.stop)
+
+    def alive_count(self) -> int:
+        return sum(1 for worker in self._workers if worker.is_alive())
+
+    def histograms(self) -> dict[str, dict[str, Any]]:
+        """Histogramas de todos los workers sumados (mismos buckets en todos)."""
+        output: dict[str, dict[str, Any]] = {}
+        for name, buckets in HISTOGRAM_BUCKETS.items():
+            output[name] = {
+                "buckets": buckets,
+                "counts": [0] * (len(buckets) + 1),
+                "sum": 0.0,
+                "count": 0,
+            }
+        for stats in self._stats:
+            for name, histogram in stats.histograms().items():
+                total = output[name]
+                total["counts"] = [a + b for a, b in zip(total["counts"], histogram["counts"])]
+                total["sum"] += histogram["sum"]
+                total["count"] += histogram["count"]
+        return output
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Contadores por worker más si sigue vivo."""
+        output: list[dict[str, Any]] = []
+        for index, stats in enumerate(self._stats):
+            entry: dict[str, Any] = {"worker": index, "mode": self.mode}
+            entry["alive"] = index < len(self._workers) and self._workers[index].is_alive()
+            entry.update(stats.snapshot())
+            output.append(entry)
+        return output
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, Iterable, Protocol
+
+from shared_queue.codecs import PayloadCodec
+from shared_queue.file_queue import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_RETRY_BACKOFF_SECONDS,
+    PRIORITY_NORMAL,
+    FileBackedQueue,
+)
+from shared_queue.partitioned_queue import DEFAULT_NUM_SHARDS, PartitionedQueue
+
+
+BACKEND_ENV_VAR = "QUEUE_BACKEND"
+DEFAULT_BACKEND = "sqlite"
+
+
+class QueueBackend(Protocol):
+    """Interfaz común de las colas que conectan `cart_service` con `order_service`."""
+
+    def enqueue(
+        self,
+        payload: dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> Any: ...
+
+    def enqueue_many(
+        self,
+        payloads: Iterable[dict[str, Any]],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> list[Any]: ...
+
+    def dequeue(self) -> tuple[Any, dict[str, Any]] | None: ...
+
+    def dequeue_batch(
+        self, n: int, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> list[tuple[Any, dict[str, Any]]]: ...
+
+    def ack(self, message_id: Any) -> None: ...
+
+    def ack_many(self, message_ids: Iterable[Any]) -> None: ...
+
+    def release(self, message_id: Any, delay_seconds: float = 0.0) -> None: ...
+
+    def fail(self, message_id: Any, error: BaseException | str) -> str: ...
+
+    def dead_letters(self, limit: int = 100) -> list[dict[str, Any]]: ...
+
+    def requeue_dead_letters(self, message_ids: Iterable[Any] | None = None) -> int: ...
+
+    def reap_expired_leases(self) -> int: ...
+
+    def wait_for_messages(self, timeout: float) -> bool: ...
+
+    def pending_count(self) -> int: ...
+
+    def stats(self) -> dict[str, Any]: ...
+
+
+def create_queue(backend: str | None = None) -> QueueBackend:
+    """Construye la cola indicada por `QUEUE_BACKEND` (sqlite, partitioned o redis).
+
+    Variables de entorno adicionales:
+    - QUEUE_SHARDS: número de shards para `partitioned` (por defecto 4).
+    - REDIS_URL, QUEUE_STREAM, QUEUE_GROUP: conexión y nombres para `redis`.
+    - QUEUE_CODEC, QUEUE_COMPRESSION, QUEUE_COMPRESS_THRESHOLD: ver `PayloadCodec`.
+    - QUEUE_MAX_ATTEMPTS, QUEUE_RETRY_BACKOFF_SECONDS: presupuesto de reintentos.
+    """
+    name = (backend or os.getenv(BACKEND_ENV_VAR, DEFAULT_BACKEND)).strip().lower()
+    options: dict[str, Any] = {
+        "codec": PayloadCodec.from_env(),
+        "max_attempts": int(os.getenv("QUEUE_MAX_ATTEMPTS", str(DEFAULT_MAX_ATTEMPTS))),
+        "retry_backoff_seconds": float(
+            os.getenv("QUEUE_RETRY_BACKOFF_SECONDS", str(DEFAULT_RETRY_BACKOFF_SECONDS))
+        ),
+    }
+
+    if name == "sqlite":
+        return FileBackedQueue(**options)
+    if name == "partitioned":
+        return PartitionedQueue(
+            num_shards=int(os.getenv("QUEUE_SHARDS", str(DEFAULT_NUM_SHARDS))),
+            **options,
+        )
+    if name == "redis":
+        from shared_queue.redis_queue import (
+            DEFAULT_GROUP,
+            DEFAULT_REDIS_URL,
+            DEFAULT_STREAM,
+            RedisStreamQueue,
+        )
+
+        return RedisStreamQueue(
+            url=os.getenv("REDIS_URL", DEFAULT_REDIS_URL),
+            stream=os.getenv("QUEUE_STREAM", DEFAULT_STREAM),
+            group=os.getenv("QUEUE_GROUP", DEFAULT_GROUP),
+            **options,
+        )
+
+    raise ValueError(f"Unknown queue backend: {name!r} (expected sqlite, partitioned or redis)")
+
+
+def sqlite_queues(queue: QueueBackend) -> list[FileBackedQueue]:
+    """Archivos SQLite subyacentes de una cola (vacío para backends remotos)."""
+    if isinstance(queue, FileBackedQueue):
+        return [queue]
+    if isinstance(queue, PartitionedQueue):
+        return list(queue.shards)
+    return []
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+import os
+import zlib
+from typing import Any, Callable
+
+
+DEFAULT_CODEC = "json"
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+Encoder = Callable[[Any], bytes]
+Decoder = Callable[[bytes], Any]
+
+
+def _json_encode(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _msgpack_encode(value: Any) -> bytes:
+    try:
+        import msgpack
+    except ImportError as exc:  # pragma: no cover - depende del entorno
+        raise RuntimeError("The msgpack codec requires the 'msgpack' package") from exc
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_decode(data: bytes) -> Any:
+    try:
+        import msgpack
+    except ImportError as exc:  # pragma: no cover - depende del entorno
+        raise RuntimeError("The msgpack codec requires the 'msgpack' package") from exc
+    return msgpack.unpackb(data, raw=False)
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError as exc:  # pragma: no cover - depende del entorno
+        raise RuntimeError("zstd compression requires the 'zstandard' package") from exc
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError as exc:  # pragma: no cover - depende del entorno
+        raise RuntimeError("zstd compression requires the 'zstandard' package") from exc
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+_FORMATS: dict[str, tuple[Encoder, Decoder]] = {
+    "json": (_json_encode, json.loads),
+    "msgpack": (_msgpack_encode, _msgpack_decode),
+}
+
+_COMPRESSORS: dict[str, tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "zstd": (_zstd_compress, _zstd_decompress),
+}
+
+
+class PayloadCodec:
+    """Serialización de payloads de la cola con compresión opcional.
+
+    Cada fila guarda el nombre del codec con que se escribió (`json`,
+    `msgpack`, `json+zlib`, `msgpack+zstd`, ...), así que cambiar la
+    configuración no impide leer filas antiguas: `decode` usa el nombre
+    guardado, no la configuración actual.
+
+    `json` sin compresión se guarda como texto, idéntico al formato original
+    de la cola; el resto se guarda como BLOB. La compresión solo se aplica a
+    payloads de al menos `compress_threshold` bytes.
+    """
+
+    def __init__(
+        self,
+        format: str = DEFAULT_CODEC,
+        compression: str | None = None,
+        compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+    ) -> None:
+        if format not in _FORMATS:
+            raise ValueError(f"Unknown payload format: {format!r}")
+        if compression is not None and compression not in _COMPRESSORS:
+            raise ValueError(f"Unknown compression: {compression!r}")
+        self.format = format
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+
+    @classmethod
+    def from_env(cls) -> PayloadCodec:
+        """Configura el codec con QUEUE_CODEC, QUEUE_COMPRESSION y QUEUE_COMPRESS_THRESHOLD."""
+        compression = os.getenv("QUEUE_COMPRESSION", "").strip().lower() or None
+        return cls(
+            format=os.getenv("QUEUE_CODEC", DEFAULT_CODEC).strip().lower(),
+            compression=None if compression == "none" else compression,
+            compress_threshold=int(
+                os.getenv("QUEUE_COMPRESS_THRESHOLD", str(DEFAULT_COMPRESS_THRESHOLD))
+            ),
+        )
+
+    def encode(self, value: Any) -> tuple[str | bytes, str]:
+        """Retorna `(datos, nombre_codec)` listos para guardar."""
+        encoder, _ = _FORMATS[self.format]
+        data = encoder(value)
+        codec = self.format
+
+        if self.compression is not None and len(data) >= self.compress_threshold:
+            compress, _ = _COMPRESSORS[self.compression]
+            data = compress(data)
+            codec = f"{codec}+{self.compression}"
+
+        if codec == "json":
+            return data.decode("utf-8"), codec
+        return data, codec
+
+    @staticmethod
+    def decode(data: str | bytes, codec: str | None = None) -> Any:
+        """Decodifica `data` según el codec con que fue escrito (json si es None)."""
+        format_name, _, compression = (codec or DEFAULT_CODEC).partition("+")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if compression:
+            _, decompress = _COMPRESSORS[compression]
+            data = decompress(data)
+        _, decoder = _FORMATS[format_name]
+        return decoder(data)
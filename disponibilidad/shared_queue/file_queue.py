@@ -1,9 +1,16 @@
 from __future__ import annotations
 
-import json
 import sqlite3
+import threading
+import time
+import weakref
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable, Sequence
+
+from shared_queue.codecs import PayloadCodec
+from shared_queue.group_commit import GroupCommitter
+from shared_queue.sqlite_connections import SQLiteConnectionManager, connection_manager_for
 
 
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -11,6 +18,87 @@ DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DEFAULT_DB_PATH = DATA_DIR / "experiment_queue.db"
 
+# Ventana y tamaño máximo por defecto del modo group commit.
+DEFAULT_GROUP_COMMIT_WINDOW_SECONDS = 0.002
+DEFAULT_GROUP_COMMIT_MAX_BATCH = 500
+
+# Tiempo que un consumidor retiene un mensaje antes de que vuelva a `pending`.
+DEFAULT_LEASE_SECONDS = 60.0
+# Frecuencia mínima con la que `dequeue_batch` recupera leases vencidos.
+DEFAULT_REAP_INTERVAL_SECONDS = 5.0
+
+# Presupuesto de reintentos: tras `max_attempts` entregas fallidas el mensaje
+# pasa a `dead_letter`. Entre intentos se espera base * 2^(intento-1), con tope.
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BACKOFF_SECONDS = 1.0
+DEFAULT_RETRY_BACKOFF_MAX_SECONDS = 300.0
+
+# Prioridades: menor valor = se atiende antes. Las órdenes interactivas usan
+# PRIORITY_HIGH para no quedar detrás de cargas masivas (PRIORITY_LOW).
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+# Backoff adaptativo de `wait_for_messages` al vigilar commits de otros procesos.
+WAIT_MIN_BACKOFF_SECONDS = 0.001
+WAIT_MAX_BACKOFF_SECONDS = 0.02
+
+# Columnas agregadas después de la primera versión del esquema. Se aplican con
+# ALTER TABLE sobre bases existentes (p. ej. data/experiment_queue.db).
+_COLUMN_MIGRATIONS: tuple[tuple[str, str], ...] = (
+    ("lease_expires_at", "REAL"),
+    ("codec", "TEXT NOT NULL DEFAULT 'json'"),
+    ("priority", f"INTEGER NOT NULL DEFAULT {PRIORITY_NORMAL}"),
+    # Epoch (s) desde el que el mensaje puede entregarse; 0 = inmediatamente.
+    ("available_at", "REAL NOT NULL DEFAULT 0"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("last_error", "TEXT"),
+)
+
+
+def _to_epoch(value: float | datetime | None) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class _CommitNotifier:
+    """Despierta a los consumidores del mismo proceso cuando se confirman mensajes."""
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self.generation = 0
+        self._listeners: weakref.WeakSet[_CommitNotifier] = weakref.WeakSet()
+
+    def subscribe(self, listener: _CommitNotifier) -> None:
+        """Reenvía cada notificación a `listener` (p. ej. el de un grupo de shards)."""
+        with self.cond:
+            self._listeners.add(listener)
+
+    def notify(self) -> None:
+        with self.cond:
+            self.generation += 1
+            self.cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener.notify()
+
+
+_notifiers: dict[str, _CommitNotifier] = {}
+_notifiers_lock = threading.Lock()
+
+
+def _notifier_for(db_path: Path) -> _CommitNotifier:
+    # Compartido por ruta: varias instancias sobre el mismo archivo se notifican entre sí.
+    key = str(db_path.resolve())
+    with _notifiers_lock:
+        notifier = _notifiers.get(key)
+        if notifier is None:
+            notifier = _notifiers[key] = _CommitNotifier()
+        return notifier
+
 
 class FileBackedQueue:
     """Cola asíncrona mínima y persistente usando SQLite.
@@ -19,19 +107,72 @@ class FileBackedQueue:
     - `cart_service` publica mensajes aquí (enqueue) sin depender de `order_service`.
     - `order_service` consume mensajes en background (dequeue + ack).
     - Si `order_service` cae, los mensajes quedan en estado `pending` en disco.
+    - Si un consumidor cae con mensajes en `processing`, su lease vence y el
+      reaper los devuelve a `pending` para que otro consumidor los tome.
+
+    Con `group_commit=True` los `enqueue` concurrentes del mismo proceso se
+    agrupan en una sola transacción: el primer llamador actúa como líder,
+    espera `group_commit_window` segundos (o hasta `group_commit_max_batch`
+    mensajes) y confirma el lote completo; cada llamador recibe su propio id
+    (ver `shared_queue.group_commit.GroupCommitter`).
+
+    El orden de entrega es por `priority` (menor primero), luego `available_at`
+    y luego `id`. Un mensaje con `not_before` en el futuro no se entrega hasta
+    esa hora; `release` devuelve un mensaje a `pending` con un retraso opcional
+    para reintentos con backoff.
+
+    Cada entrega incrementa `attempts`. `fail` registra el error y reprograma
+    el mensaje con backoff exponencial; al agotar `max_attempts` (también por
+    leases vencidos) pasa a `dead_letter`, donde no bloquea al resto de la cola
+    hasta que se reencole con `requeue_dead_letters`.
+
+    Las operaciones usan la conexión persistente del hilo que entrega
+    `connections` (por defecto el manager compartido de la ruta, ver
+    `shared_queue/sqlite_connections.py`); las escrituras son transacciones
+    `BEGIN IMMEDIATE`. El manager fija `auto_vacuum=INCREMENTAL` al abrir cada
+    conexión, lo que solo aplica a bases nuevas: en una base existente con
+    datos `incremental_vacuum` no libera nada hasta convertirla con
+    `enable_incremental_vacuum` (un VACUUM completo, opt-in en
+    `QueueCompactor(convert_existing=True)`).
     """
 
-    def __init__(self, db_path: str | Path = DEFAULT_DB_PATH) -> None:
+    def __init__(
+        self,
+        db_path: str | Path = DEFAULT_DB_PATH,
+        group_commit: bool = False,
+        group_commit_window: float = DEFAULT_GROUP_COMMIT_WINDOW_SECONDS,
+        group_commit_max_batch: int = DEFAULT_GROUP_COMMIT_MAX_BATCH,
+        reap_interval: float = DEFAULT_REAP_INTERVAL_SECONDS,
+        codec: PayloadCodec | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = DEFAULT_RETRY_BACKOFF_SECONDS,
+        retry_backoff_max_seconds: float = DEFAULT_RETRY_BACKOFF_MAX_SECONDS,
+        connections: SQLiteConnectionManager | None = None,
+    ) -> None:
         self.db_path = Path(db_path)
+        self._db = connections or connection_manager_for(self.db_path)
+        self.codec = codec or PayloadCodec()
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.retry_backoff_max_seconds = retry_backoff_max_seconds
+        self.reap_interval = reap_interval
+        self._last_reap = 0.0
+        self._notifier = _notifier_for(self.db_path)
+        self._waiter_local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._last_stats_sample: tuple[float, int, int] | None = None
+        self.group_commit = group_commit
+        self.group_commit_window = group_commit_window
+        self.group_commit_max_batch = max(1, group_commit_max_batch)
+        self._group_committer = GroupCommitter(
+            self._insert_rows, self.group_commit_max_batch, group_commit_window
+        )
         self._init_db()
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, timeout=30)
-        conn.row_factory = sqlite3.Row
-        return conn
-
     def _init_db(self) -> None:
-        with self._connect() as conn:
+        # Esquema, migraciones y contadores en una sola transacción para que
+        # varios procesos arrancando a la vez no se pisen.
+        with self._db.transaction() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS queued_messages (
@@ -43,56 +184,587 @@ class FileBackedQueue:
                 )
                 """
             )
+            self._migrate_columns(conn)
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_messages_status_id ON queued_messages(status, id)"
             )
+            # Índice que cubre el orden de entrega de `dequeue_batch`.
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_messages_dequeue
+                ON queued_messages(status, priority, available_at, id)
+                """
+            )
+            self._init_counters(conn)
+
+    @staticmethod
+    def _init_counters(conn: sqlite3.Connection) -> None:
+        """Contadores por estado mantenidos por triggers en la misma transacción.
 
-    def enqueue(self, payload: dict[str, Any]) -> int:
-        """Publica una orden en la cola y retorna el id de mensaje."""
-        with self._connect() as conn:
-            cur = conn.execute(
-                "INSERT INTO queued_messages(payload, status) VALUES (?, 'pending')",
-                (json.dumps(payload),),
+        `pending_count` y `stats` leen estas filas en O(1) en lugar de hacer
+        COUNT(*) sobre `queued_messages`. Al crear la tabla en una base existente
+        se siembran con los conteos actuales.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='queue_counters'"
+        ).fetchone()
+        if exists is None:
+            conn.execute(
+                """
+                CREATE TABLE queue_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                INSERT INTO queue_counters(name, value)
+                SELECT 'status:' || status, COUNT(*) FROM queued_messages GROUP BY status
+                """
             )
-            return int(cur.lastrowid)
+            conn.execute(
+                """
+                INSERT INTO queue_counters(name, value)
+                SELECT 'enqueued_total', COUNT(*) FROM queued_messages
+                UNION ALL
+                SELECT 'acked_total', COUNT(*) FROM queued_messages WHERE status='done'
+                """
+            )
+
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_queue_counters_insert
+            AFTER INSERT ON queued_messages
+            BEGIN
+                INSERT INTO queue_counters(name, value) VALUES ('status:' || NEW.status, 1)
+                ON CONFLICT(name) DO UPDATE SET value = value + 1;
+                INSERT INTO queue_counters(name, value) VALUES ('enqueued_total', 1)
+                ON CONFLICT(name) DO UPDATE SET value = value + 1;
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_queue_counters_update
+            AFTER UPDATE OF status ON queued_messages
+            WHEN OLD.status != NEW.status
+            BEGIN
+                UPDATE queue_counters SET value = value - 1 WHERE name = 'status:' || OLD.status;
+                INSERT INTO queue_counters(name, value) VALUES ('status:' || NEW.status, 1)
+                ON CONFLICT(name) DO UPDATE SET value = value + 1;
+                INSERT INTO queue_counters(name, value)
+                SELECT 'acked_total', 1 WHERE NEW.status = 'done'
+                ON CONFLICT(name) DO UPDATE SET value = value + 1;
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_queue_counters_delete
+            AFTER DELETE ON queued_messages
+            BEGIN
+                UPDATE queue_counters SET value = value - 1 WHERE name = 'status:' || OLD.status;
+            END
+            """
+        )
+
+    @staticmethod
+    def _migrate_columns(conn: sqlite3.Connection) -> None:
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(queued_messages)")}
+        for name, ddl in _COLUMN_MIGRATIONS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE queued_messages ADD COLUMN {name} {ddl}")
+
+    def enqueue(
+        self,
+        payload: dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> int:
+        """Publica una orden en la cola y retorna el id de mensaje.
+
+        `not_before` (epoch o datetime) retrasa la entrega hasta esa hora.
+        """
+        row = self._encode_row(payload, priority, not_before)
+        if self.group_commit:
+            return self._enqueue_grouped(row)
+        return self._insert_rows([row])[0]
+
+    def enqueue_many(
+        self,
+        payloads: Iterable[dict[str, Any]],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> list[int]:
+        """Publica varios mensajes en una sola transacción y retorna sus ids en orden."""
+        return self._insert_rows(
+            [self._encode_row(payload, priority, not_before) for payload in payloads]
+        )
+
+    def _encode_row(
+        self, payload: dict[str, Any], priority: int, not_before: float | datetime | None
+    ) -> tuple[str | bytes, str, int, float]:
+        data, codec = self.codec.encode(payload)
+        return data, codec, int(priority), _to_epoch(not_before)
+
+    def _insert_rows(self, rows: list[tuple[str | bytes, str, int, float]]) -> list[int]:
+        if not rows:
+            return []
+
+        ids: list[int] = []
+        with self._db.transaction() as conn:
+            # Un INSERT por fila dentro de la misma transacción: un único commit
+            # (y un único fsync) para todo el lote, conservando cada lastrowid.
+            for row in rows:
+                cur = conn.execute(
+                    """
+                    INSERT INTO queued_messages(payload, codec, priority, available_at, status)
+                    VALUES (?, ?, ?, ?, 'pending')
+                    """,
+                    row,
+                )
+                ids.append(int(cur.lastrowid))
+        self._notifier.notify()
+        return ids
+
+    def _enqueue_grouped(self, row: tuple[str | bytes, str, int, float]) -> int:
+        return int(self._group_committer.submit(row))
 
     def dequeue(self) -> tuple[int, dict[str, Any]] | None:
         """Toma 1 mensaje pendiente y lo marca como processing de forma atómica."""
-        with self._connect() as conn:
-            row = conn.execute(
-                "SELECT id, payload FROM queued_messages WHERE status='pending' ORDER BY id LIMIT 1"
-            ).fetchone()
-            if row is None:
-                return None
+        messages = self.dequeue_batch(1)
+        return messages[0] if messages else None
+
+    def dequeue_batch(
+        self, n: int, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> list[tuple[int, dict[str, Any]]]:
+        """Reclama hasta `n` mensajes pendientes con un lease de `lease_seconds`.
+
+        La reclamación es un único `UPDATE ... RETURNING`, así que dos
+        consumidores nunca obtienen el mismo mensaje. Los mensajes no
+        confirmados antes de que venza el lease vuelven a `pending`.
+        """
+        if n <= 0:
+            return []
+
+        now = time.time()
+        with self._db.transaction() as conn:
+            if now - self._last_reap >= self.reap_interval:
+                self._reap(conn, now)
+                self._last_reap = now
 
-            updated = conn.execute(
+            rows = conn.execute(
                 """
                 UPDATE queued_messages
-                SET status='processing', updated_at=CURRENT_TIMESTAMP
-                WHERE id=? AND status='pending'
+                SET status='processing', lease_expires_at=?, attempts=attempts + 1,
+                    updated_at=CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM queued_messages
+                    WHERE status='pending' AND available_at <= ?
+                    ORDER BY priority, available_at, id
+                    LIMIT ?
+                )
+                RETURNING id, payload, codec, priority, available_at
                 """,
-                (row["id"],),
-            )
-            if updated.rowcount == 0:
-                return None
+                (now + lease_seconds, now, n),
+            ).fetchall()
 
-            return int(row["id"]), json.loads(row["payload"])
+        # RETURNING no garantiza orden: se restituye el orden de entrega.
+        rows.sort(key=lambda row: (row["priority"], row["available_at"], row["id"]))
+        return [(int(row["id"]), self.codec.decode(row["payload"], row["codec"])) for row in rows]
 
     def ack(self, message_id: int) -> None:
         """Confirma mensaje procesado."""
-        with self._connect() as conn:
+        with self._db.transaction() as conn:
             conn.execute(
                 """
                 UPDATE queued_messages
-                SET status='done', updated_at=CURRENT_TIMESTAMP
+                SET status='done', lease_expires_at=NULL, updated_at=CURRENT_TIMESTAMP
                 WHERE id=?
                 """,
                 (message_id,),
             )
 
-    def pending_count(self) -> int:
-        with self._connect() as conn:
+    def ack_many(self, message_ids: Iterable[int]) -> None:
+        """Confirma varios mensajes procesados en una sola transacción."""
+        params = [(int(message_id),) for message_id in message_ids]
+        if not params:
+            return
+
+        with self._db.transaction() as conn:
+            self._ack_rows(conn, params)
+
+    def ack_many_in(self, conn: sqlite3.Connection, message_ids: Iterable[int]) -> None:
+        """Confirma mensajes dentro de la transacción de `conn`, sin hacer commit.
+
+        `conn` debe estar abierta sobre el mismo archivo que la cola; así otra
+        escritura (p. ej. guardar la orden) y el ack se confirman juntos.
+        """
+        params = [(int(message_id),) for message_id in message_ids]
+        if params:
+            self._ack_rows(conn, params)
+
+    @staticmethod
+    def _ack_rows(conn: sqlite3.Connection, params: list[tuple[int]]) -> None:
+        conn.executemany(
+            """
+            UPDATE queued_messages
+            SET status='done', lease_expires_at=NULL, updated_at=CURRENT_TIMESTAMP
+            WHERE id=?
+            """,
+            params,
+        )
+
+    def release(self, message_id: int, delay_seconds: float = 0.0) -> None:
+        """Devuelve un mensaje en `processing` a `pending`, disponible en `delay_seconds`."""
+        with self._db.transaction() as conn:
+            conn.execute(
+                """
+                UPDATE queued_messages
+                SET status='pending', lease_expires_at=NULL, available_at=?,
+                    updated_at=CURRENT_TIMESTAMP
+                WHERE id=? AND status='processing'
+                """,
+                (time.time() + delay_seconds, message_id),
+            )
+        self._notifier.notify()
+
+    def fail(self, message_id: int, error: BaseException | str) -> str:
+        """Registra un intento fallido y retorna el nuevo estado del mensaje.
+
+        Si aún queda presupuesto el mensaje vuelve a `pending` con backoff
+        exponencial; si no, pasa a `dead_letter`.
+        """
+        with self._db.transaction() as conn:
             row = conn.execute(
-                "SELECT COUNT(*) AS total FROM queued_messages WHERE status='pending'"
+                """
+                UPDATE queued_messages
+                SET status=CASE WHEN attempts >= ? THEN 'dead_letter' ELSE 'pending' END,
+                    available_at=? + MIN(? * (1 << MIN(MAX(attempts - 1, 0), 30)), ?),
+                    lease_expires_at=NULL,
+                    last_error=?,
+                    updated_at=CURRENT_TIMESTAMP
+                WHERE id=? AND status='processing'
+                RETURNING status
+                """,
+                (
+                    self.max_attempts,
+                    time.time(),
+                    self.retry_backoff_seconds,
+                    self.retry_backoff_max_seconds,
+                    str(error)[:2000],
+                    message_id,
+                ),
             ).fetchone()
-            return int(row["total"]) if row else 0
+        if row is None:
+            return "unknown"
+        if row["status"] == "pending":
+            self._notifier.notify()
+        return str(row["status"])
+
+    def dead_letters(self, limit: int = 100) -> list[dict[str, Any]]:
+        """Mensajes en `dead_letter`, del más antiguo al más reciente."""
+        conn = self._db.connection()
+        rows = conn.execute(
+            """
+            SELECT id, payload, codec, attempts, last_error, updated_at
+            FROM queued_messages
+            WHERE status='dead_letter'
+            ORDER BY id
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+        return [
+            {
+                "id": int(row["id"]),
+                "payload": self.codec.decode(row["payload"], row["codec"]),
+                "attempts": int(row["attempts"]),
+                "last_error": row["last_error"],
+                "dead_lettered_at": row["updated_at"],
+            }
+            for row in rows
+        ]
+
+    def requeue_dead_letters(self, message_ids: Iterable[int] | None = None) -> int:
+        """Devuelve a `pending` (con presupuesto nuevo) los ids dados, o todos si es None."""
+        now = time.time()
+        with self._db.transaction() as conn:
+            reset = """
+                UPDATE queued_messages
+                SET status='pending', attempts=0, last_error=NULL, available_at=?,
+                    updated_at=CURRENT_TIMESTAMP
+                WHERE status='dead_letter'
+            """
+            if message_ids is None:
+                requeued = conn.execute(reset, (now,)).rowcount
+            else:
+                params = [(now, int(message_id)) for message_id in message_ids]
+                requeued = conn.executemany(reset + " AND id=?", params).rowcount
+        if requeued:
+            self._notifier.notify()
+        return max(requeued, 0)
+
+    def reap_expired_leases(self) -> int:
+        """Devuelve a `pending` los mensajes cuyo lease venció. Retorna cuántos."""
+        now = time.time()
+        with self._db.transaction() as conn:
+            reclaimed = self._reap(conn, now)
+        self._last_reap = now
+        if reclaimed:
+            self._notifier.notify()
+        return reclaimed
+
+    def _reap(self, conn: sqlite3.Connection, now: float) -> int:
+        # Un consumidor que cae siempre con el mismo mensaje también consume
+        # presupuesto: al agotarlo, el mensaje va a `dead_letter`.
+        cur = conn.execute(
+            """
+            UPDATE queued_messages
+            SET status=CASE WHEN attempts >= ? THEN 'dead_letter' ELSE 'pending' END,
+                last_error=CASE WHEN attempts >= ? THEN 'lease expired' ELSE last_error END,
+                lease_expires_at=NULL,
+                updated_at=CURRENT_TIMESTAMP
+            WHERE status='processing' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+            """,
+            (self.max_attempts, self.max_attempts, now),
+        )
+        return cur.rowcount
+
+    def purge_done(
+        self,
+        max_age_seconds: float,
+        limit: int,
+        archive_fn: Callable[[list[dict[str, Any]]], None] | None = None,
+    ) -> int:
+        """Elimina hasta `limit` mensajes `done` más viejos que `max_age_seconds`.
+
+        Si se entrega `archive_fn`, recibe las filas eliminadas antes del commit;
+        si falla, la transacción se revierte y las filas se conservan.
+        Retorna cuántas filas se eliminaron.
+        """
+        with self._db.transaction() as conn:
+            rows = conn.execute(
+                """
+                DELETE FROM queued_messages
+                WHERE id IN (
+                    SELECT id FROM queued_messages
+                    WHERE status='done' AND updated_at < datetime('now', ?)
+                    ORDER BY id
+                    LIMIT ?
+                )
+                RETURNING id, payload, codec, created_at, updated_at
+                """,
+                (f"-{int(max_age_seconds)} seconds", limit),
+            ).fetchall()
+            if rows and archive_fn is not None:
+                archive_fn(
+                    [
+                        {
+                            "id": int(row["id"]),
+                            "payload": self.codec.decode(row["payload"], row["codec"]),
+                            "created_at": row["created_at"],
+                            "updated_at": row["updated_at"],
+                        }
+                        for row in sorted(rows, key=lambda row: row["id"])
+                    ]
+                )
+        return len(rows)
+
+    def incremental_vacuum(self, pages: int | None = None) -> None:
+        """Devuelve al sistema de archivos hasta `pages` páginas libres (todas si es None).
+
+        No hace nada si la base no está en auto_vacuum INCREMENTAL (ver
+        `auto_vacuum_mode` y `enable_incremental_vacuum`).
+        """
+        pragma = "PRAGMA incremental_vacuum"
+        if pages is not None:
+            pragma += f"({int(pages)})"
+        # Conexión aparte: executescript confirma cualquier transacción abierta.
+        conn = self._db.open()
+        try:
+            # `execute` avanza un solo paso (una página); executescript lo ejecuta completo.
+            conn.executescript(pragma + ";")
+            # En WAL el archivo principal solo se achica al hacer checkpoint;
+            # TRUNCATE además deja el -wal en cero para que tampoco crezca sin límite.
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        finally:
+            conn.close()
+
+    def auto_vacuum_mode(self) -> int:
+        """0 = NONE, 1 = FULL, 2 = INCREMENTAL."""
+        conn = self._db.connection()
+        return int(conn.execute("PRAGMA auto_vacuum").fetchone()[0])
+
+    def enable_incremental_vacuum(self) -> None:
+        """Convierte una base existente a auto_vacuum INCREMENTAL (requiere un VACUUM completo)."""
+        # VACUUM no puede correr dentro de una transacción: conexión aparte.
+        conn = self._db.open()
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    def wait_for_messages(self, timeout: float) -> bool:
+        """Bloquea hasta que haya mensajes listos para entregar o venza `timeout`.
+
+        Los productores del mismo proceso despiertan al consumidor de inmediato
+        mediante una variable de condición. Los commits de otros procesos se
+        detectan con `PRAGMA data_version`, consultado con backoff adaptativo
+        (1 ms a 20 ms), sin leer la tabla hasta que el archivo cambia. Si solo
+        hay mensajes diferidos, la espera termina cuando vence el primero.
+        Retorna True si hay mensajes listos.
+        """
+        return wait_for_any([self], timeout, self._notifier)
+
+    def _has_ready(self) -> bool:
+        conn = self._db.connection()
+        row = conn.execute(
+            """
+            SELECT 1 FROM queued_messages
+            WHERE status='pending' AND available_at <= ?
+            LIMIT 1
+            """,
+            (time.time(),),
+        ).fetchone()
+        return row is not None
+
+    def _next_available_at(self) -> float | None:
+        conn = self._db.connection()
+        row = conn.execute(
+            "SELECT MIN(available_at) AS due FROM queued_messages WHERE status='pending'"
+        ).fetchone()
+        return float(row["due"]) if row and row["due"] is not None else None
+
+    def _data_version_connection(self) -> sqlite3.Connection:
+        # `data_version` solo cambia con commits de *otras* conexiones, así que
+        # cada hilo consumidor conserva una conexión dedicada para observarlo.
+        conn = getattr(self._waiter_local, "conn", None)
+        if conn is None:
+            conn = self._waiter_local.conn = self._db.open()
+        return conn
+
+    @staticmethod
+    def _data_version(conn: sqlite3.Connection) -> int:
+        return int(conn.execute("PRAGMA data_version").fetchone()[0])
+
+    def pending_count(self) -> int:
+        conn = self._db.connection()
+        row = conn.execute(
+            "SELECT value FROM queue_counters WHERE name='status:pending'"
+        ).fetchone()
+        return int(row["value"]) if row else 0
+
+    def stats(self) -> dict[str, Any]:
+        """Profundidad por estado, edad del pendiente más antiguo y tasas de enqueue/ack.
+
+        Las tasas (mensajes/s) se calculan contra la llamada anterior a `stats`
+        de esta instancia; en la primera llamada son 0.
+        """
+        # Una sola transacción de lectura: contadores y edad del mismo snapshot.
+        with self._db.transaction(immediate=False) as conn:
+            counters = {
+                row["name"]: int(row["value"])
+                for row in conn.execute("SELECT name, value FROM queue_counters")
+            }
+            oldest = conn.execute(
+                """
+                SELECT (julianday('now') - julianday(created_at)) * 86400.0 AS age
+                FROM queued_messages
+                WHERE status='pending'
+                ORDER BY id
+                LIMIT 1
+                """
+            ).fetchone()
+
+        now = time.monotonic()
+        enqueued_total = counters.get("enqueued_total", 0)
+        acked_total = counters.get("acked_total", 0)
+        enqueue_rate = ack_rate = 0.0
+        with self._stats_lock:
+            if self._last_stats_sample is not None:
+                sampled_at, last_enqueued, last_acked = self._last_stats_sample
+                elapsed = now - sampled_at
+                if elapsed > 0:
+                    enqueue_rate = (enqueued_total - last_enqueued) / elapsed
+                    ack_rate = (acked_total - last_acked) / elapsed
+            self._last_stats_sample = (now, enqueued_total, acked_total)
+
+        output: dict[str, Any] = {
+            "pending": counters.get("status:pending", 0),
+            "processing": counters.get("status:processing", 0),
+            "done": counters.get("status:done", 0),
+            "dead_letter": counters.get("status:dead_letter", 0),
+        }
+        output.update(
+            {
+                "oldest_pending_age_seconds": max(float(oldest["age"]), 0.0) if oldest else 0.0,
+                "enqueued_total": enqueued_total,
+                "acked_total": acked_total,
+                "enqueue_rate": round(enqueue_rate, 3),
+                "ack_rate": round(ack_rate, 3),
+            }
+        )
+        return output
+
+
+def _earliest(queues: Sequence[FileBackedQueue]) -> float | None:
+    dues = [due for due in (queue._next_available_at() for queue in queues) if due is not None]
+    return min(dues) if dues else None
+
+
+def wait_for_any(
+    queues: Sequence[FileBackedQueue], timeout: float, notifier: _CommitNotifier
+) -> bool:
+    """Espera hasta que alguna de `queues` tenga mensajes listos o venza `timeout`.
+
+    `notifier` debe recibir las notificaciones de todas las colas (el propio
+    de la cola si es una sola). Los commits de otros procesos se detectan
+    consultando `PRAGMA data_version` de cada cola con un único backoff
+    compartido; la tabla solo se lee cuando algo cambió o vence un diferido.
+    """
+    if any(queue._has_ready() for queue in queues):
+        return True
+
+    deadline = time.monotonic() + timeout
+    next_due = _earliest(queues)
+    watchers = [queue._data_version_connection() for queue in queues]
+    versions = [FileBackedQueue._data_version(watcher) for watcher in watchers]
+    backoff = WAIT_MIN_BACKOFF_SECONDS
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+
+        wait_seconds = min(backoff, remaining)
+        if next_due is not None:
+            wait_seconds = max(min(wait_seconds, next_due - time.time()), 0.0)
+
+        with notifier.cond:
+            generation = notifier.generation
+            notified = notifier.cond.wait_for(
+                lambda: notifier.generation != generation,
+                timeout=wait_seconds,
+            )
+
+        changed = []
+        for index, (queue, watcher) in enumerate(zip(queues, watchers)):
+            current_version = FileBackedQueue._data_version(watcher)
+            if current_version != versions[index]:
+                versions[index] = current_version
+                changed.append(queue)
+
+        due = next_due is not None and time.time() >= next_due
+        if notified or changed or due:
+            # Una notificación no dice qué cola cambió: se revisan todas.
+            candidates = queues if notified or due else changed
+            if any(queue._has_ready() for queue in candidates):
+                return True
+            next_due = _earliest(queues)
+            backoff = WAIT_MIN_BACKOFF_SECONDS
+        else:
+            backoff = min(backoff * 2, WAIT_MAX_BACKOFF_SECONDS)
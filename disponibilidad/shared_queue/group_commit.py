@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable
+
+
+class _PendingWrite:
+    """Elemento esperando a que su lote sea escrito (o a recibir el liderazgo)."""
+
+    __slots__ = ("item", "result", "error", "leader", "wake")
+
+    def __init__(self, item: Any) -> None:
+        self.item = item
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.leader = False
+        self.wake = threading.Event()
+
+
+class GroupCommitter:
+    """Agrupa escrituras concurrentes en lotes confirmados por un líder.
+
+    El primer llamador sin líder activo espera `window` segundos (o hasta
+    juntar `max_batch` elementos) y escribe el lote con `write_batch`, que
+    recibe los elementos y retorna un resultado por elemento, en orden. Si la
+    escritura falla, todos los llamadores del lote reciben el error.
+
+    Cada líder escribe un solo lote: si quedan elementos esperando, al terminar
+    cede el liderazgo al más antiguo en lugar de seguir escribiendo, así ningún
+    hilo llamador queda atendiendo lotes ajenos indefinidamente. Si no queda
+    nadie, cede el liderazgo antes de escribir para que el siguiente lote se
+    arme mientras este se confirma.
+
+    `on_batch(tamaño, segundos, error)` se llama después de cada escritura.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[list[Any]], list[Any]],
+        max_batch: int,
+        window: float,
+        on_batch: Callable[[int, float, BaseException | None], None] | None = None,
+    ) -> None:
+        self.write_batch = write_batch
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window)
+        self.on_batch = on_batch
+        self._cond = threading.Condition()
+        self._pending: list[_PendingWrite] = []
+        self._leader_active = False
+
+    def submit(self, item: Any) -> Any:
+        """Escribe `item` junto con los que lleguen en la ventana y retorna su resultado."""
+        request = _PendingWrite(item)
+        with self._cond:
+            self._pending.append(request)
+            if not self._leader_active:
+                self._leader_active = True
+                request.leader = True
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+        if not request.leader:
+            # Despierta cuando su lote se escribió o cuando recibe el liderazgo.
+            request.wake.wait()
+        if request.leader:
+            # El líder siempre es el más antiguo pendiente: su lote lo incluye.
+            self._lead()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _lead(self) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.window)
+            batch = self._pending[: self.max_batch]
+            self._pending = self._pending[self.max_batch :]
+            handoff = bool(self._pending)
+            if not handoff:
+                self._leader_active = False
+
+        started = time.perf_counter()
+        error: BaseException | None = None
+        try:
+            results = self.write_batch([request.item for request in batch])
+        except BaseException as exc:
+            error = exc
+            for request in batch:
+                request.error = exc
+        else:
+            for request, result in zip(batch, results):
+                request.result = result
+        finally:
+            try:
+                if self.on_batch is not None:
+                    self.on_batch(len(batch), time.perf_counter() - started, error)
+            finally:
+                if handoff:
+                    with self._cond:
+                        successor = self._pending[0]
+                        successor.leader = True
+                    successor.wake.set()
+                for request in batch:
+                    request.wake.set()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import CollectorRegistry
+
+from shared_queue.backends import QueueBackend
+
+
+_STATUSES = ("pending", "processing", "done", "dead_letter")
+
+# Familias que emite `collect` además de `queue_stats_up` (para `describe`).
+_FAMILIES = (
+    ("queue_messages", GaugeMetricFamily),
+    ("queue_oldest_pending_age_seconds", GaugeMetricFamily),
+    ("queue_enqueue_rate", GaugeMetricFamily),
+    ("queue_ack_rate", GaugeMetricFamily),
+    ("queue_enqueued", CounterMetricFamily),
+    ("queue_acked", CounterMetricFamily),
+)
+
+
+class QueueStatsCollector:
+    """Expone `queue.stats()` como métricas Prometheus.
+
+    Se consulta la cola una sola vez por scrape (las lecturas son O(1) gracias
+    a los contadores), en lugar de mantener gauges actualizados en cada request.
+    Si `stats()` falla (Redis caído, base bloqueada) solo se emite
+    `queue_stats_up 0`: el resto del scrape (worker, carritos) no se pierde.
+    """
+
+    def __init__(self, queue: QueueBackend, queue_name: str = "orders") -> None:
+        self.queue = queue
+        self.queue_name = queue_name
+
+    def describe(self) -> Iterator[Any]:
+        # Con `describe` el registro no llama a `collect` (ni a la cola) al registrar.
+        yield self._up(None)
+        for name, family in _FAMILIES:
+            yield family(name, "", labels=["queue"])
+
+    def _up(self, value: float | None) -> GaugeMetricFamily:
+        up = GaugeMetricFamily(
+            "queue_stats_up", "1 si se pudieron leer las estadísticas de la cola", labels=["queue"]
+        )
+        if value is not None:
+            up.add_metric([self.queue_name], value)
+        return up
+
+    def collect(self) -> Iterator[Any]:
+        try:
+            stats = self.queue.stats()
+        except Exception as exc:
+            print(f"[queue_metrics] Falló stats() de la cola {self.queue_name}: {exc!r}")
+            yield self._up(0)
+            return
+        yield self._up(1)
+        labels = [self.queue_name]
+
+        depth = GaugeMetricFamily(
+            "queue_messages", "Mensajes en la cola por estado", labels=["queue", "status"]
+        )
+        for status in _STATUSES:
+            depth.add_metric([self.queue_name, status], stats.get(status, 0))
+        yield depth
+
+        oldest = GaugeMetricFamily(
+            "queue_oldest_pending_age_seconds",
+            "Edad del mensaje pendiente más antiguo",
+            labels=["queue"],
+        )
+        oldest.add_metric(labels, stats["oldest_pending_age_seconds"])
+        yield oldest
+
+        enqueue_rate = GaugeMetricFamily(
+            "queue_enqueue_rate", "Mensajes encolados por segundo", labels=["queue"]
+        )
+        enqueue_rate.add_metric(labels, stats["enqueue_rate"])
+        yield enqueue_rate
+
+        ack_rate = GaugeMetricFamily(
+            "queue_ack_rate", "Mensajes confirmados por segundo", labels=["queue"]
+        )
+        ack_rate.add_metric(labels, stats["ack_rate"])
+        yield ack_rate
+
+        enqueued = CounterMetricFamily(
+            "queue_enqueued", "Mensajes encolados desde la creación de la cola", labels=["queue"]
+        )
+        enqueued.add_metric(labels, stats["enqueued_total"])
+        yield enqueued
+
+        acked = CounterMetricFamily(
+            "queue_acked", "Mensajes confirmados desde la creación de la cola", labels=["queue"]
+        )
+        acked.add_metric(labels, stats["acked_total"])
+        yield acked
+
+
+def register_queue_metrics(
+    queue: QueueBackend,
+    queue_name: str = "orders",
+    registry: CollectorRegistry = REGISTRY,
+) -> QueueStatsCollector:
+    collector = QueueStatsCollector(queue, queue_name)
+    registry.register(collector)
+    return collector
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Sequence
+
+from shared_queue.file_queue import (
+    DEFAULT_DB_PATH,
+    DEFAULT_LEASE_SECONDS,
+    PRIORITY_NORMAL,
+    FileBackedQueue,
+    _CommitNotifier,
+    wait_for_any,
+)
+
+
+DEFAULT_NUM_SHARDS = 4
+
+
+def default_partition_key(payload: dict[str, Any]) -> Any:
+    """Clave de partición por defecto: carrito, cliente u orden, en ese orden."""
+    for field in ("cart_id", "customer_id", "order_id"):
+        value = payload.get(field)
+        if value is not None:
+            return value
+    return None
+
+
+def shard_path(base_path: str | Path, shard_index: int) -> Path:
+    base_path = Path(base_path)
+    return base_path.with_name(f"{base_path.stem}.shard{shard_index}{base_path.suffix}")
+
+
+class PartitionedQueue:
+    """Cola particionada en N archivos SQLite independientes.
+
+    Cada mensaje se asigna a un shard con un hash estable de su clave de
+    partición, así que los mensajes de una misma clave conservan el orden FIFO
+    de su shard. Cada shard tiene su propio lock de escritura: productores y
+    consumidores de shards distintos no compiten entre sí.
+
+    Los ids de mensaje codifican el shard (`id_local * num_shards + shard`)
+    para que `ack` sepa a qué archivo dirigirse sin estado adicional.
+
+    Un consumidor puede limitarse a un subconjunto de shards con `for_shards`
+    o `for_consumer`; el orden por clave se garantiza mientras cada shard sea
+    drenado por un único consumidor. Tampoco se conserva entre mensajes de
+    distinta `priority` (sale primero la más alta) ni para un mensaje devuelto
+    con `release` o `fail`: su backoff lo deja detrás de los que le seguían.
+    """
+
+    def __init__(
+        self,
+        num_shards: int = DEFAULT_NUM_SHARDS,
+        base_path: str | Path = DEFAULT_DB_PATH,
+        key_fn: Callable[[dict[str, Any]], Any] = default_partition_key,
+        assigned_shards: Sequence[int] | None = None,
+        shard_queues: Sequence[FileBackedQueue] | None = None,
+        **queue_kwargs: Any,
+    ) -> None:
+        if num_shards < 1:
+            raise ValueError("num_shards must be >= 1")
+        self.num_shards = num_shards
+        self.base_path = Path(base_path)
+        self.key_fn = key_fn
+        if shard_queues is not None:
+            self.shards = list(shard_queues)
+        else:
+            self.shards = [
+                FileBackedQueue(shard_path(self.base_path, index), **queue_kwargs)
+                for index in range(num_shards)
+            ]
+
+        if assigned_shards is None:
+            assigned_shards = range(num_shards)
+        indices = tuple(sorted(set(assigned_shards)))
+        if not indices or any(index < 0 or index >= num_shards for index in indices):
+            raise ValueError(f"shard indices must be within [0, {num_shards})")
+        self.assigned_shards = indices
+        # Un solo notificador para esperar en todos los shards asignados.
+        self._notifier = _CommitNotifier()
+        for index in indices:
+            self.shards[index]._notifier.subscribe(self._notifier)
+        self._cursor = 0
+        self._cursor_lock = threading.Lock()
+        self._round_robin = 0
+
+    def for_shards(self, shard_indices: Sequence[int]) -> PartitionedQueue:
+        """Vista que consume solo de `shard_indices` y comparte los shards subyacentes."""
+        return PartitionedQueue(
+            num_shards=self.num_shards,
+            base_path=self.base_path,
+            key_fn=self.key_fn,
+            assigned_shards=shard_indices,
+            shard_queues=self.shards,
+        )
+
+    def for_consumer(self, consumer_index: int, num_consumers: int) -> PartitionedQueue:
+        """Reparte los shards entre `num_consumers` consumidores (shard % num_consumers)."""
+        indices = [
+            index for index in range(self.num_shards) if index % num_consumers == consumer_index
+        ]
+        return self.for_shards(indices)
+
+    def shard_for(self, key: Any) -> int:
+        if key is None:
+            # Sin clave no hay orden que preservar: se reparte en round-robin.
+            with self._cursor_lock:
+                self._round_robin = (self._round_robin + 1) % self.num_shards
+                return self._round_robin
+        return zlib.crc32(str(key).encode("utf-8")) % self.num_shards
+
+    def _encode_id(self, shard_index: int, local_id: int) -> int:
+        return local_id * self.num_shards + shard_index
+
+    def _decode_id(self, message_id: int) -> tuple[int, int]:
+        local_id, shard_index = divmod(int(message_id), self.num_shards)
+        return shard_index, local_id
+
+    def enqueue(
+        self,
+        payload: dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+        key: Any = None,
+    ) -> int:
+        shard_index = self.shard_for(key if key is not None else self.key_fn(payload))
+        local_id = self.shards[shard_index].enqueue(
+            payload, priority=priority, not_before=not_before
+        )
+        return self._encode_id(shard_index, local_id)
+
+    def enqueue_many(
+        self,
+        payloads: Iterable[dict[str, Any]],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> list[int]:
+        """Publica un lote con una transacción por shard; retorna ids en el orden de entrada."""
+        by_shard: dict[int, list[tuple[int, dict[str, Any]]]] = {}
+        count = 0
+        for position, payload in enumerate(payloads):
+            shard_index = self.shard_for(self.key_fn(payload))
+            by_shard.setdefault(shard_index, []).append((position, payload))
+            count += 1
+
+        ids: list[int] = [0] * count
+        for shard_index, entries in by_shard.items():
+            local_ids = self.shards[shard_index].enqueue_many(
+                [payload for _, payload in entries], priority=priority, not_before=not_before
+            )
+            for (position, _), local_id in zip(entries, local_ids):
+                ids[position] = self._encode_id(shard_index, local_id)
+        return ids
+
+    def _next_shard_order(self) -> list[int]:
+        # Se rota el shard inicial para no favorecer siempre al primero.
+        with self._cursor_lock:
+            start = self._cursor
+            self._cursor = (self._cursor + 1) % len(self.assigned_shards)
+        return list(self.assigned_shards[start:] + self.assigned_shards[:start])
+
+    def dequeue(self) -> tuple[int, dict[str, Any]] | None:
+        messages = self.dequeue_batch(1)
+        return messages[0] if messages else None
+
+    def dequeue_batch(
+        self, n: int, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> list[tuple[int, dict[str, Any]]]:
+        output: list[tuple[int, dict[str, Any]]] = []
+        for shard_index in self._next_shard_order():
+            if len(output) >= n:
+                break
+            messages = self.shards[shard_index].dequeue_batch(n - len(output), lease_seconds)
+            output.extend(
+                (self._encode_id(shard_index, local_id), payload) for local_id, payload in messages
+            )
+        return output
+
+    def ack(self, message_id: int) -> None:
+        shard_index, local_id = self._decode_id(message_id)
+        self.shards[shard_index].ack(local_id)
+
+    def ack_many(self, message_ids: Iterable[int]) -> None:
+        by_shard: dict[int, list[int]] = {}
+        for message_id in message_ids:
+            shard_index, local_id = self._decode_id(message_id)
+            by_shard.setdefault(shard_index, []).append(local_id)
+        for shard_index, local_ids in by_shard.items():
+            self.shards[shard_index].ack_many(local_ids)
+
+    def release(self, message_id: int, delay_seconds: float = 0.0) -> None:
+        shard_index, local_id = self._decode_id(message_id)
+        self.shards[shard_index].release(local_id, delay_seconds)
+
+    def fail(self, message_id: int, error: BaseException | str) -> str:
+        shard_index, local_id = self._decode_id(message_id)
+        return self.shards[shard_index].fail(local_id, error)
+
+    def dead_letters(self, limit: int = 100) -> list[dict[str, Any]]:
+        output: list[dict[str, Any]] = []
+        for shard_index, shard in enumerate(self.shards):
+            for entry in shard.dead_letters(limit):
+                entry["id"] = self._encode_id(shard_index, entry["id"])
+                output.append(entry)
+        output.sort(key=lambda entry: entry["dead_lettered_at"])
+        return output[:limit]
+
+    def requeue_dead_letters(self, message_ids: Iterable[int] | None = None) -> int:
+        if message_ids is None:
+            return sum(shard.requeue_dead_letters() for shard in self.shards)
+
+        by_shard: dict[int, list[int]] = {}
+        for message_id in message_ids:
+            shard_index, local_id = self._decode_id(message_id)
+            by_shard.setdefault(shard_index, []).append(local_id)
+        return sum(
+            self.shards[shard_index].requeue_dead_letters(local_ids)
+            for shard_index, local_ids in by_shard.items()
+        )
+
+    def reap_expired_leases(self) -> int:
+        return sum(self.shards[index].reap_expired_leases() for index in self.assigned_shards)
+
+    def wait_for_messages(self, timeout: float) -> bool:
+        """Espera mensajes en cualquiera de los shards asignados."""
+        if len(self.assigned_shards) == 1:
+            return self.shards[self.assigned_shards[0]].wait_for_messages(timeout)
+
+        shards = [self.shards[index] for index in self.assigned_shards]
+        return wait_for_any(shards, timeout, self._notifier)
+
+    def pending_count(self) -> int:
+        """Mensajes pendientes en todos los shards (no solo los asignados)."""
+        return sum(shard.pending_count() for shard in self.shards)
+
+    def stats(self) -> dict[str, Any]:
+        """Suma de `stats()` de todos los shards; la edad es la del pendiente más antiguo."""
+        output: dict[str, Any] = {}
+        for shard in self.shards:
+            for name, value in shard.stats().items():
+                if name == "oldest_pending_age_seconds":
+                    output[name] = max(output.get(name, 0.0), value)
+                else:
+                    output[name] = output.get(name, 0) + value
+        return output
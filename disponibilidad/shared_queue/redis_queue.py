@@ -0,0 +1,516 @@
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Iterable
+
+from shared_queue.codecs import PayloadCodec
+from shared_queue.file_queue import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_RETRY_BACKOFF_MAX_SECONDS,
+    DEFAULT_RETRY_BACKOFF_SECONDS,
+    PRIORITY_NORMAL,
+)
+
+
+DEFAULT_REDIS_URL = "redis://redis:6379/0"
+DEFAULT_STREAM = "orders"
+DEFAULT_GROUP = "order_service"
+# Con entregas sin ack, cada cuánto `wait_for_messages` revisa si algún lease venció.
+_LEASE_CHECK_SECONDS = 1.0
+
+# Mueve al stream los mensajes diferidos cuyo `available_at` ya pasó. Se hace
+# en Lua para que ZREM + XADD sean atómicos aunque varios consumidores promuevan.
+_PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, token in ipairs(due) do
+    local fields = redis.call(
+        'HMGET', KEYS[2], token .. ':payload', token .. ':codec', token .. ':attempts'
+    )
+    if fields[1] then
+        redis.call(
+            'XADD', KEYS[3], '*',
+            'payload', fields[1], 'codec', fields[2], 'attempts', fields[3] or '0'
+        )
+    end
+    redis.call('HDEL', KEYS[2], token .. ':payload', token .. ':codec', token .. ':attempts')
+    redis.call('ZREM', KEYS[1], token)
+end
+return #due
+"""
+
+
+class RedisStreamQueue:
+    """Cola sobre Redis Streams con la misma interfaz que `FileBackedQueue`.
+
+    - `enqueue` hace XADD; `enqueue_many` agrupa los XADD en un pipeline MULTI.
+    - `dequeue_batch` primero recupera con XAUTOCLAIM las entradas entregadas a
+      otro consumidor que llevan más de `lease_seconds` sin ack (el equivalente
+      al reaper de leases) y completa el lote con un XREADGROUP de N entradas.
+    - `ack_many` hace XACK + XDEL: las entradas confirmadas no se conservan,
+      igual que la compactación de mensajes `done` en SQLite.
+    - Los totales de enqueue/ack se llevan con HINCRBY en el hash
+      `<stream>:stats` para que `stats()` no recorra el stream.
+
+    - Los mensajes con `not_before` futuro esperan en el sorted set
+      `<stream>:delayed` y se promueven al stream al vencer. Streams no admite
+      reordenar entradas, así que `priority` se acepta por compatibilidad pero
+      no altera el orden (FIFO).
+    - Los intentos son entregas, como en SQLite: el campo `attempts` guarda las
+      de entradas anteriores del mismo mensaje (reintentos y `release` lo
+      reescriben) y se le suma el `times_delivered` de XPENDING de la entrada
+      actual, que incluye los reclamos por lease vencido. `fail` reprograma con
+      backoff exponencial; al agotar `max_attempts`, `fail` o el reclamo lo
+      mueven al stream `<stream>:dead`, de donde `requeue_dead_letters` lo
+      devuelve.
+
+    Los ids de mensaje son los ids del stream (`"<ms>-<seq>"`), no enteros;
+    un mensaje diferido recibe otro id al promoverse.
+    Cada entrada guarda `payload` y `codec`; el cliente se crea sin
+    `decode_responses` para admitir payloads binarios.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        url: str = DEFAULT_REDIS_URL,
+        stream: str = DEFAULT_STREAM,
+        group: str = DEFAULT_GROUP,
+        consumer: str | None = None,
+        codec: PayloadCodec | None = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = DEFAULT_RETRY_BACKOFF_SECONDS,
+        retry_backoff_max_seconds: float = DEFAULT_RETRY_BACKOFF_MAX_SECONDS,
+    ) -> None:
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.codec = codec or PayloadCodec()
+        self.max_attempts = max(1, max_attempts)
+        # Para `wait_for_messages`; cada `dequeue_batch` lo actualiza con el suyo.
+        self.lease_seconds = lease_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.retry_backoff_max_seconds = retry_backoff_max_seconds
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.stats_key = f"{stream}:stats"
+        self.delayed_key = f"{stream}:delayed"
+        self.delayed_data_key = f"{stream}:delayed:data"
+        self.dead_stream = f"{stream}:dead"
+        self._promote = self.client.register_script(_PROMOTE_SCRIPT)
+        self._stats_lock = threading.Lock()
+        self._last_stats_sample: tuple[float, int, int] | None = None
+        self._ensure_group()
+
+    def _ensure_group(self) -> None:
+        try:
+            self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as exc:  # redis.ResponseError si el grupo ya existe
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def _decode(self, fields: dict[Any, Any]) -> dict[str, Any]:
+        data = fields.get(b"payload", fields.get("payload"))
+        codec = fields.get(b"codec", fields.get("codec"))
+        return self.codec.decode(data, self._text(codec) if codec is not None else None)
+
+    def _fields(self, payload: dict[str, Any]) -> dict[str, str | bytes]:
+        data, codec = self.codec.encode(payload)
+        return {"payload": data, "codec": codec}
+
+    @staticmethod
+    def _text(value: Any) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    def enqueue(
+        self,
+        payload: dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> str:
+        return self.enqueue_many([payload], priority=priority, not_before=not_before)[0]
+
+    def enqueue_many(
+        self,
+        payloads: Iterable[dict[str, Any]],
+        priority: int = PRIORITY_NORMAL,
+        not_before: float | datetime | None = None,
+    ) -> list[str]:
+        available_at = None
+        if not_before is not None:
+            if isinstance(not_before, datetime):
+                available_at = not_before.timestamp()
+            else:
+                available_at = float(not_before)
+            if available_at <= time.time():
+                available_at = None
+
+        pipe = self.client.pipeline(transaction=True)
+        tokens: list[str] = []
+        count = 0
+        for payload in payloads:
+            count += 1
+            fields = self._fields(payload)
+            if available_at is None:
+                pipe.xadd(self.stream, fields)
+            else:
+                token = f"delayed-{uuid.uuid4().hex}"
+                self._queue_delayed(pipe, token, fields, available_at)
+                tokens.append(token)
+        if not count:
+            return []
+        pipe.hincrby(self.stats_key, "enqueued_total", count)
+        results = pipe.execute()
+        if tokens:
+            return tokens
+        return [self._text(message_id) for message_id in results[:count]]
+
+    def _queue_delayed(
+        self, pipe: Any, token: str, fields: dict[str, Any], available_at: float
+    ) -> None:
+        pipe.hset(
+            self.delayed_data_key,
+            mapping={
+                f"{token}:payload": fields["payload"],
+                f"{token}:codec": fields["codec"],
+                f"{token}:attempts": fields.get("attempts", 0),
+            },
+        )
+        pipe.zadd(self.delayed_key, {token: available_at})
+
+    def _promote_due(self, limit: int = 1000) -> int:
+        return int(
+            self._promote(
+                keys=[self.delayed_key, self.delayed_data_key, self.stream],
+                args=[time.time(), limit],
+            )
+        )
+
+    def dequeue(self) -> tuple[str, dict[str, Any]] | None:
+        messages = self.dequeue_batch(1)
+        return messages[0] if messages else None
+
+    def dequeue_batch(
+        self, n: int, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> list[tuple[str, dict[str, Any]]]:
+        if n <= 0:
+            return []
+
+        self.lease_seconds = lease_seconds
+        self._promote_due()
+        output = self._reclaim(n, lease_seconds)
+        remaining = n - len(output)
+        if remaining > 0:
+            response = self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=remaining
+            )
+            for _, entries in response or []:
+                output.extend(
+                    (self._text(message_id), self._decode(fields)) for message_id, fields in entries
+                )
+        return output
+
+    def _reclaim(self, n: int, lease_seconds: float) -> list[tuple[str, dict[str, Any]]]:
+        result = self.client.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=int(lease_seconds * 1000),
+            start_id="0-0",
+            count=n,
+        )
+        # XAUTOCLAIM retorna [next_start, entries] (y en Redis 7 también ids borrados).
+        entries = [
+            (message_id, fields) for message_id, fields in (result[1] if result else []) if fields
+        ]
+        if not entries:
+            return []
+
+        # Cada lease vencido consume presupuesto, igual que `_reap` en SQLite:
+        # las entregas previas al reclamo (times_delivered ya lo incluye).
+        pipe = self.client.pipeline(transaction=False)
+        for message_id, _ in entries:
+            self._queue_deliveries(pipe, message_id)
+        pending = pipe.execute()
+
+        output: list[tuple[str, dict[str, Any]]] = []
+        expired: list[tuple[str, dict[Any, Any], int]] = []
+        for (message_id, fields), info in zip(entries, pending):
+            stored = int(self._text(fields.get(b"attempts", fields.get("attempts", 0))))
+            attempts = stored + self._times_delivered(info) - 1
+            if attempts >= self.max_attempts:
+                expired.append((self._text(message_id), fields, attempts))
+            else:
+                output.append((self._text(message_id), self._decode(fields)))
+
+        if expired:
+            pipe = self.client.pipeline(transaction=True)
+            for message_id, fields, attempts in expired:
+                pipe.xack(self.stream, self.group, message_id)
+                pipe.xdel(self.stream, message_id)
+                pipe.xadd(
+                    self.dead_stream,
+                    {
+                        "payload": fields.get(b"payload", fields.get("payload")),
+                        "codec": fields.get(b"codec", fields.get("codec")),
+                        "attempts": attempts,
+                        "last_error": "lease expired",
+                        "dead_lettered_at": time.time(),
+                    },
+                )
+            pipe.execute()
+        return output
+
+    def _queue_deliveries(self, pipe: Any, message_id: Any) -> None:
+        pipe.xpending_range(self.stream, self.group, min=message_id, max=message_id, count=1)
+
+    @staticmethod
+    def _times_delivered(info: Any) -> int:
+        # Una entrada que ya no está pendiente en el grupo cuenta una entrega.
+        return int(info[0]["times_delivered"]) if info else 1
+
+    def _attempts(self, message_id: str, fields: dict[str, Any]) -> int:
+        """Entregas del mensaje hasta ahora, incluida la actual."""
+        pipe = self.client.pipeline(transaction=False)
+        self._queue_deliveries(pipe, message_id)
+        (info,) = pipe.execute()
+        return fields["attempts"] + self._times_delivered(info)
+
+    def ack(self, message_id: str) -> None:
+        self.ack_many([message_id])
+
+    def ack_many(self, message_ids: Iterable[str]) -> None:
+        ids = [self._text(message_id) for message_id in message_ids]
+        if not ids:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xack(self.stream, self.group, *ids)
+        pipe.xdel(self.stream, *ids)
+        acked, _ = pipe.execute()
+        # XACK solo cuenta entradas que seguían pendientes: los acks repetidos no suman.
+        if acked:
+            self.client.hincrby(self.stats_key, "acked_total", int(acked))
+
+    def release(self, message_id: str, delay_seconds: float = 0.0) -> None:
+        """Devuelve un mensaje entregado a la cola, disponible en `delay_seconds`."""
+        message_id = self._text(message_id)
+        fields = self._entry_fields(self.stream, message_id)
+        if fields is None:
+            return
+        # Como en SQLite, devolver el mensaje no descuenta la entrega.
+        fields["attempts"] = self._attempts(message_id, fields)
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xack(self.stream, self.group, message_id)
+        pipe.xdel(self.stream, message_id)
+        if delay_seconds > 0:
+            token = f"delayed-{uuid.uuid4().hex}"
+            self._queue_delayed(pipe, token, fields, time.time() + delay_seconds)
+        else:
+            pipe.xadd(self.stream, fields)
+        pipe.execute()
+
+    def _entry_fields(self, stream: str, message_id: str) -> dict[str, Any] | None:
+        entries = self.client.xrange(stream, min=message_id, max=message_id, count=1)
+        if not entries:
+            return None
+        _, raw_fields = entries[0]
+        fields = {self._text(key): value for key, value in raw_fields.items()}
+        fields["attempts"] = int(self._text(fields.get("attempts", 0)))
+        return fields
+
+    def fail(self, message_id: str, error: BaseException | str) -> str:
+        message_id = self._text(message_id)
+        fields = self._entry_fields(self.stream, message_id)
+        if fields is None:
+            return "unknown"
+
+        attempts = self._attempts(message_id, fields)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xack(self.stream, self.group, message_id)
+        pipe.xdel(self.stream, message_id)
+        if attempts >= self.max_attempts:
+            pipe.xadd(
+                self.dead_stream,
+                {
+                    "payload": fields["payload"],
+                    "codec": fields["codec"],
+                    "attempts": attempts,
+                    "last_error": str(error)[:2000],
+                    "dead_lettered_at": time.time(),
+                },
+            )
+            status = "dead_letter"
+        else:
+            delay = min(
+                self.retry_backoff_seconds * 2 ** (attempts - 1), self.retry_backoff_max_seconds
+            )
+            retry_fields = {
+                "payload": fields["payload"],
+                "codec": fields["codec"],
+                "attempts": attempts,
+            }
+            token = f"delayed-{uuid.uuid4().hex}"
+            self._queue_delayed(pipe, token, retry_fields, time.time() + delay)
+            status = "pending"
+        pipe.execute()
+        return status
+
+    def dead_letters(self, limit: int = 100) -> list[dict[str, Any]]:
+        output: list[dict[str, Any]] = []
+        for message_id, raw_fields in self.client.xrange(self.dead_stream, count=limit):
+            fields = {self._text(key): value for key, value in raw_fields.items()}
+            output.append(
+                {
+                    "id": self._text(message_id),
+                    "payload": self._decode(fields),
+                    "attempts": int(self._text(fields.get("attempts", 0))),
+                    "last_error": self._text(fields.get("last_error", "")),
+                    "dead_lettered_at": float(self._text(fields.get("dead_lettered_at", 0))),
+                }
+            )
+        return output
+
+    def requeue_dead_letters(self, message_ids: Iterable[str] | None = None) -> int:
+        if message_ids is None:
+            ids = [self._text(message_id) for message_id, _ in self.client.xrange(self.dead_stream)]
+        else:
+            ids = [self._text(message_id) for message_id in message_ids]
+
+        pipe = self.client.pipeline(transaction=True)
+        requeued = 0
+        for message_id in ids:
+            fields = self._entry_fields(self.dead_stream, message_id)
+            if fields is None:
+                continue
+            pipe.xadd(
+                self.stream, {"payload": fields["payload"], "codec": fields["codec"], "attempts": 0}
+            )
+            pipe.xdel(self.dead_stream, message_id)
+            requeued += 1
+        if requeued:
+            pipe.execute()
+        return requeued
+
+    def reap_expired_leases(self) -> int:
+        # En Redis el reclamo ocurre dentro de `dequeue_batch` (XAUTOCLAIM).
+        return 0
+
+    def pending_count(self) -> int:
+        """Entradas aún no entregadas a ningún consumidor del grupo (incluye diferidas)."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xlen(self.stream)
+        pipe.xpending(self.stream, self.group)
+        pipe.zcard(self.delayed_key)
+        length, pending_info, delayed = pipe.execute()
+        return self._ready_count(length, pending_info) + int(delayed)
+
+    @staticmethod
+    def _ready_count(length: int, pending_info: Any) -> int:
+        delivered = int(pending_info.get("pending", 0)) if pending_info else 0
+        return max(int(length) - delivered, 0)
+
+    def stats(self) -> dict[str, Any]:
+        """Mismo formato que `FileBackedQueue.stats()`.
+
+        `done` no se conserva en el stream (XDEL al confirmar), así que se
+        reporta igual a `acked_total`.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xlen(self.stream)
+        pipe.xpending(self.stream, self.group)
+        pipe.hgetall(self.stats_key)
+        pipe.xinfo_groups(self.stream)
+        pipe.zcard(self.delayed_key)
+        pipe.xlen(self.dead_stream)
+        length, pending_info, totals, groups, delayed, dead = pipe.execute()
+
+        totals = {self._text(key): int(value) for key, value in (totals or {}).items()}
+        processing = int(pending_info.get("pending", 0)) if pending_info else 0
+        enqueued_total = totals.get("enqueued_total", 0)
+        acked_total = totals.get("acked_total", 0)
+
+        oldest_age = 0.0
+        group_info = next(
+            (group for group in groups if self._text(group.get("name")) == self.group), None
+        )
+        if group_info is not None:
+            # La primera entrada no entregada es la siguiente al last-delivered-id;
+            # su id empieza con el timestamp (ms) en que se agregó.
+            last_delivered = self._text(group_info.get("last-delivered-id", "0-0"))
+            next_entry = self.client.xrange(self.stream, min=f"({last_delivered}", count=1)
+            if next_entry:
+                added_ms = int(self._text(next_entry[0][0]).split("-")[0])
+                oldest_age = max(time.time() - added_ms / 1000, 0.0)
+
+        now = time.monotonic()
+        enqueue_rate = ack_rate = 0.0
+        with self._stats_lock:
+            if self._last_stats_sample is not None:
+                sampled_at, last_enqueued, last_acked = self._last_stats_sample
+                elapsed = now - sampled_at
+                if elapsed > 0:
+                    enqueue_rate = (enqueued_total - last_enqueued) / elapsed
+                    ack_rate = (acked_total - last_acked) / elapsed
+            self._last_stats_sample = (now, enqueued_total, acked_total)
+
+        return {
+            "pending": max(int(length) - processing, 0) + int(delayed),
+            "processing": processing,
+            "done": acked_total,
+            "dead_letter": int(dead),
+            "oldest_pending_age_seconds": oldest_age,
+            "enqueued_total": enqueued_total,
+            "acked_total": acked_total,
+            "enqueue_rate": round(enqueue_rate, 3),
+            "ack_rate": round(ack_rate, 3),
+        }
+
+    def wait_for_messages(self, timeout: float) -> bool:
+        """Bloquea con XREAD hasta que se agregue una entrada nueva o venza `timeout`.
+
+        También retorna True si hay entregas con más de `lease_seconds` sin ack,
+        que `dequeue_batch` reclamaría. Si hay mensajes diferidos, cada espera
+        se acorta hasta que vence el primero para promoverlo a tiempo; si hay
+        entregas sin ack, a `_LEASE_CHECK_SECONDS` para notar su vencimiento.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self._promote_due()
+            pipe = self.client.pipeline(transaction=False)
+            pipe.xlen(self.stream)
+            pipe.xpending(self.stream, self.group)
+            pipe.zrange(self.delayed_key, 0, 0, withscores=True)
+            pipe.xrevrange(self.stream, count=1)
+            pipe.xpending_range(
+                self.stream, self.group, min="-", max="+", count=1,
+                idle=int(self.lease_seconds * 1000),
+            )
+            length, pending_info, next_delayed, last, expired = pipe.execute()
+            if self._ready_count(length, pending_info) > 0 or expired:
+                return True
+
+            wait_seconds = deadline - time.monotonic()
+            if next_delayed:
+                wait_seconds = min(wait_seconds, next_delayed[0][1] - time.time() + 0.001)
+            if pending_info and int(pending_info.get("pending", 0)):
+                wait_seconds = min(wait_seconds, _LEASE_CHECK_SECONDS)
+            block_ms = int(wait_seconds * 1000)
+            if deadline - time.monotonic() <= 0:
+                return False
+            if block_ms <= 0:
+                continue
+
+            last_id = self._text(last[0][0]) if last else "0-0"
+            # XREAD (sin grupo) solo observa: no entrega ni reclama la entrada.
+            if self.client.xread({self.stream: last_id}, count=1, block=block_ms):
+                return True
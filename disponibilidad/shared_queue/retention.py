@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from shared_queue.file_queue import FileBackedQueue
+
+
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 3600
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_INTERVAL_SECONDS = 60.0
+DEFAULT_VACUUM_PAGES = 1024
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+class NdjsonArchive:
+    """Archivo de mensajes retirados de la cola en segmentos NDJSON rotados.
+
+    Cada segmento se llama `<prefix>-<UTC timestamp>.ndjson` y se rota al
+    superar `max_segment_bytes`. Con `max_segments` se eliminan los segmentos
+    más antiguos para acotar el espacio en disco.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        prefix: str = "queued_messages",
+        max_segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_segments: int | None = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._current: Path | None = None
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"{self.prefix}-*.ndjson"))
+
+    def write(self, records: list[dict[str, Any]]) -> None:
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self._lock:
+            segment = self._segment_for_write()
+            with segment.open("a", encoding="utf-8") as fh:
+                fh.write(data)
+                fh.flush()
+                # El compactor borra las filas justo después: el archivo debe estar en disco.
+                os.fsync(fh.fileno())
+
+    def _segment_for_write(self) -> Path:
+        if self._current is None:
+            existing = self.segments()
+            self._current = existing[-1] if existing else None
+
+        if self._current is None or (
+            self._current.exists() and self._current.stat().st_size >= self.max_segment_bytes
+        ):
+            self._current = self._new_segment_path()
+            self._prune()
+        return self._current
+
+    def _new_segment_path(self) -> Path:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        return self.directory / f"{self.prefix}-{stamp}.ndjson"
+
+    def _prune(self) -> None:
+        if self.max_segments is None:
+            return
+        # El segmento nuevo aún no existe en disco: se reserva su lugar.
+        old_segments = [path for path in self.segments() if path != self._current]
+        excess = len(old_segments) + 1 - self.max_segments
+        for path in old_segments[: max(excess, 0)]:
+            path.unlink(missing_ok=True)
+
+
+class QueueCompactor(threading.Thread):
+    """Compactación en background de `queued_messages`.
+
+    - Elimina (y opcionalmente archiva) mensajes `done` más viejos que
+      `max_age_seconds`, en lotes de `batch_size` filas por transacción para
+      no retener el lock de escritura frente a productores y consumidores.
+    - Después de cada pasada ejecuta `PRAGMA incremental_vacuum` para devolver
+      las páginas libres y que el archivo no crezca sin límite.
+
+    Una base creada antes de auto_vacuum=INCREMENTAL solo se convierte con
+    `convert_existing=True`: la conversión es un VACUUM completo que retiene
+    el lock de escritura durante toda la copia. Los errores de una pasada
+    (p. ej. `database is locked`) se registran y se reintenta en la siguiente.
+    """
+
+    def __init__(
+        self,
+        queue: FileBackedQueue,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        vacuum_pages: int = DEFAULT_VACUUM_PAGES,
+        archive: NdjsonArchive | None = None,
+        convert_existing: bool = False,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.max_age_seconds = max_age_seconds
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.vacuum_pages = vacuum_pages
+        self.archive = archive
+        self.convert_existing = convert_existing
+        self._stop_event = threading.Event()
+
+    def run_once(self) -> int:
+        """Ejecuta una pasada completa y retorna cuántas filas se retiraron."""
+        archive_fn = self.archive.write if self.archive is not None else None
+        removed_total = 0
+        while not self._stop_event.is_set():
+            removed = self.queue.purge_done(self.max_age_seconds, self.batch_size, archive_fn)
+            removed_total += removed
+            if removed < self.batch_size:
+                break
+            # Pausa breve entre lotes para ceder el lock de escritura.
+            time.sleep(0.01)
+
+        # Se ejecuta siempre: si la pasada anterior dejó páginas libres, se siguen
+        # devolviendo de a `vacuum_pages` sin bloquear la base por mucho tiempo.
+        self.queue.incremental_vacuum(self.vacuum_pages)
+        return removed_total
+
+    def run(self) -> None:
+        if self.convert_existing:
+            try:
+                if self.queue.auto_vacuum_mode() == 0:
+                    self.queue.enable_incremental_vacuum()
+            except Exception as exc:
+                print(f"[queue_compactor] No se pudo activar incremental_vacuum: {exc}")
+
+        while not self._stop_event.is_set():
+            try:
+                removed = self.run_once()
+            except Exception as exc:
+                print(f"[queue_compactor] Error en la pasada de compactación: {exc}")
+            else:
+                if removed:
+                    print(f"[queue_compactor] Mensajes retirados: {removed}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def stop(self) -> None:
+        self._stop_event.set()
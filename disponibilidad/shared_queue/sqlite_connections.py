@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+
+DEFAULT_JOURNAL_MODE = "WAL"
+# NORMAL en WAL no pierde consistencia ante una caída del proceso; solo las
+# últimas transacciones ante un corte de energía. FULL hace fsync en cada commit.
+DEFAULT_SYNCHRONOUS = "NORMAL"
+DEFAULT_BUSY_TIMEOUT_SECONDS = 30.0
+DEFAULT_CACHE_SIZE_KIB = 16 * 1024
+DEFAULT_MMAP_SIZE_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHED_STATEMENTS = 256
+# Reintentos de BEGIN IMMEDIATE si SQLite agota `busy_timeout` esperando el lock.
+DEFAULT_BUSY_RETRIES = 2
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# Un BEGIN IMMEDIATE que tarda más que esto esperó el lock de escritura.
+_LOCK_WAIT_THRESHOLD_SECONDS = 0.001
+_BUSY_RETRY_BACKOFF_SECONDS = 0.05
+
+# Conexiones heredadas por fork: no se cierran en el hijo (cerrarlas liberaría
+# locks del archivo que pertenecen al padre); solo se dejan de usar.
+_abandoned: list[sqlite3.Connection] = []
+
+
+class SQLiteConnectionManager:
+    """Conexiones SQLite persistentes por hilo con pragmas afinados.
+
+    Cada hilo reutiliza su propia conexión en lugar de abrir una por
+    operación, así que el costo de abrir el archivo y preparar sentencias
+    (`cached_statements`) se paga una sola vez. Si el proceso hace fork, el
+    hijo detecta el cambio de pid y abre conexiones nuevas.
+
+    Por defecto usa WAL: los lectores no bloquean al escritor ni viceversa y
+    `synchronous=NORMAL` evita un fsync por commit. Las conexiones se abren en
+    modo autocommit; `transaction()` delimita las escrituras con
+    `BEGIN IMMEDIATE`, de modo que la espera por el lock ocurre al inicio y se
+    puede medir (`stats()`).
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        journal_mode: str = DEFAULT_JOURNAL_MODE,
+        synchronous: str = DEFAULT_SYNCHRONOUS,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT_SECONDS,
+        cache_size_kib: int = DEFAULT_CACHE_SIZE_KIB,
+        mmap_size: int = DEFAULT_MMAP_SIZE_BYTES,
+        cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+        busy_retries: int = DEFAULT_BUSY_RETRIES,
+        auto_vacuum: str | None = "INCREMENTAL",
+    ) -> None:
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode: {journal_mode!r}")
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous!r}")
+        self.db_path = Path(db_path)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.busy_retries = max(0, busy_retries)
+        self.auto_vacuum = auto_vacuum
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "connections_opened": 0,
+            "transactions": 0,
+            "lock_waits": 0,
+            "lock_wait_seconds": 0.0,
+            "busy_errors": 0,
+            "busy_retries": 0,
+        }
+
+    @classmethod
+    def from_env(cls, db_path: str | Path) -> SQLiteConnectionManager:
+        """Configura el manager con SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS,
+        SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_SIZE_KIB y SQLITE_MMAP_SIZE."""
+        return cls(
+            db_path,
+            journal_mode=os.getenv("SQLITE_JOURNAL_MODE", DEFAULT_JOURNAL_MODE),
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", DEFAULT_SYNCHRONOUS),
+            busy_timeout=float(
+                os.getenv("SQLITE_BUSY_TIMEOUT", str(DEFAULT_BUSY_TIMEOUT_SECONDS))
+            ),
+            cache_size_kib=int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(DEFAULT_CACHE_SIZE_KIB))),
+            mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", str(DEFAULT_MMAP_SIZE_BYTES))),
+        )
+
+    def open(self) -> sqlite3.Connection:
+        """Abre una conexión nueva, no administrada, con los pragmas configurados."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        if self.auto_vacuum is not None:
+            # Debe fijarse antes que WAL: en una base nueva, cambiar el journal
+            # escribe la cabecera y el modo de auto_vacuum ya no se aplica.
+            conn.execute(f"PRAGMA auto_vacuum={self.auto_vacuum}")
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        self._increment("connections_opened")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Conexión persistente del hilo actual (en autocommit fuera de `transaction`)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if conn is not None:
+            _abandoned.append(conn)
+        conn = self._local.conn = self.open()
+        self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+        """Transacción sobre la conexión del hilo: commit al salir, rollback si falla.
+
+        Si el hilo ya está dentro de una transacción, el bloque se suma a ella y
+        el commit queda a cargo de la transacción externa.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        self._begin(conn, "BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+
+    def _begin(self, conn: sqlite3.Connection, statement: str) -> None:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                conn.execute(statement)
+            except sqlite3.OperationalError as exc:
+                message = str(exc).lower()
+                if "locked" not in message and "busy" not in message:
+                    raise
+                self._increment("busy_errors")
+                if attempt >= self.busy_retries:
+                    raise
+                attempt += 1
+                self._increment("busy_retries")
+                time.sleep(_BUSY_RETRY_BACKOFF_SECONDS * attempt)
+                continue
+
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self._stats["transactions"] += 1
+                if waited >= _LOCK_WAIT_THRESHOLD_SECONDS:
+                    self._stats["lock_waits"] += 1
+                    self._stats["lock_wait_seconds"] += waited
+            return
+
+    def close(self) -> None:
+        """Cierra la conexión del hilo actual; se reabre en el siguiente uso."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def _increment(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Conexiones abiertas, transacciones, esperas por el lock y errores de busy."""
+        with self._stats_lock:
+            output = dict(self._stats)
+        output["lock_wait_seconds"] = round(output["lock_wait_seconds"], 6)
+        return output
+
+
+_managers: dict[str, SQLiteConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def connection_manager_for(db_path: str | Path) -> SQLiteConnectionManager:
+    """Manager compartido por ruta (configurado por entorno).
+
+    La cola y `OrderStore` sobre el mismo archivo usan así la misma conexión por
+    hilo, y una escritura de uno puede sumarse a la transacción del otro.
+    """
+    key = str(Path(db_path).resolve())
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = SQLiteConnectionManager.from_env(db_path)
+        return manager